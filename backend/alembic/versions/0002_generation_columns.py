@@ -0,0 +1,62 @@
+"""Columns added since the initial schema; document text stored compressed
+
+create_all never altered existing tables, so databases created before these
+columns existed are missing some or all of them; each is added only if
+absent. documents.content becomes bytea holding zstd frames (CompressedText).
+Existing rows become their UTF-8 bytes, which CompressedText reads back as
+plain text, and are compressed when next written. The type change rewrites
+the table under an exclusive lock, so run it at a quiet moment on large
+databases.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ("documents", "content_hash", "varchar(64)"),
+    ("audio_generations", "fingerprint", "varchar(64)"),
+    ("audio_generations", "batch_id", "uuid"),
+    ("audio_generations", "audio_metadata", "json"),
+    ("audio_generations", "checkpoint", "json"),
+    ("audio_generations", "llm_usage", "json"),
+    ("citations", "end_timestamp", "double precision"),
+]
+
+
+def _content_type_is(data_type: str) -> str:
+    return (
+        "(SELECT data_type FROM information_schema.columns WHERE table_schema = current_schema() "
+        f"AND table_name = 'documents' AND column_name = 'content') = '{data_type}'"
+    )
+
+
+def upgrade() -> None:
+    for table, column, column_type in COLUMNS:
+        op.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type}")
+    op.execute(f"""
+        DO $$ BEGIN
+            IF {_content_type_is('text')} THEN
+                ALTER TABLE documents ALTER COLUMN content TYPE bytea USING convert_to(content, 'UTF8');
+            END IF;
+        END $$
+    """)
+
+
+def downgrade() -> None:
+    # Fails on rows already stored compressed; they can't be turned back into text in SQL
+    op.execute(f"""
+        DO $$ BEGIN
+            IF {_content_type_is('bytea')} THEN
+                ALTER TABLE documents ALTER COLUMN content TYPE text USING convert_from(content, 'UTF8');
+            END IF;
+        END $$
+    """)
+    for table, column, _ in reversed(COLUMNS):
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS {column}")
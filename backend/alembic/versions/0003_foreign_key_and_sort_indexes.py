@@ -0,0 +1,47 @@
+"""Indexes for foreign keys and list sort orders
+
+Built with CREATE INDEX CONCURRENTLY, outside a transaction, so the API can
+keep reading and writing the tables while they build. If a build fails it
+leaves an INVALID index behind that IF NOT EXISTS would skip; drop it and
+run the upgrade again.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    # Keyset pages of a user's projects by last activity; leads with the owner_id foreign key
+    ("ix_projects_owner_activity", "projects", ["owner_id", sa.text("coalesce(updated_at, created_at)"), "id"]),
+    # Keyset pages of a project's documents and generations; lead with project_id
+    ("ix_documents_project_created", "documents", ["project_id", "created_at", "id"]),
+    ("ix_audio_generations_project_created", "audio_generations", ["project_id", "created_at", "id"]),
+    # A document's chunks in order
+    ("ix_document_chunks_document_chunk", "document_chunks", ["document_id", "chunk_index"]),
+    ("ix_personas_user_id", "personas", ["user_id"]),
+    # Citations of a generation by playback position, and of a document
+    ("ix_citations_generation_timestamp", "citations", ["generation_id", "timestamp"]),
+    ("ix_citations_document_id", "citations", ["document_id"]),
+    # Reuse of identical generations and the variants of a batch
+    ("ix_audio_generations_fingerprint", "audio_generations", ["fingerprint"]),
+    ("ix_audio_generations_batch_id", "audio_generations", ["batch_id"]),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,41 @@
+"""Generations carry their project's owner, indexed for listing across projects
+
+Listing a user's generations without a project used to filter on
+project_id IN (the user's projects) and sort every matching row by
+created_at. With owner_id copied onto each generation, a page is one
+range of ix_audio_generations_owner_created. Existing rows are backfilled
+from their project; the index is built concurrently, as in 0003.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE audio_generations ADD COLUMN IF NOT EXISTS owner_id uuid REFERENCES users (id)")
+    op.execute("""
+        UPDATE audio_generations AS a SET owner_id = p.owner_id
+        FROM projects AS p
+        WHERE p.id = a.project_id AND a.owner_id IS NULL
+    """)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_audio_generations_owner_created", "audio_generations", ["owner_id", "created_at", "id"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_audio_generations_owner_created", table_name="audio_generations",
+            postgresql_concurrently=True, if_exists=True
+        )
+    op.execute("ALTER TABLE audio_generations DROP COLUMN IF EXISTS owner_id")
@@ -0,0 +1,36 @@
+"""Transcript edits recorded as revisions of a generation
+
+An edit used to re-record the generation in place. It now creates a new
+generation whose revision_of points at the one edited, which keeps its
+audio. The foreign key is indexed, built concurrently as in 0003.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE audio_generations ADD COLUMN IF NOT EXISTS revision_of uuid REFERENCES audio_generations (id)"
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_audio_generations_revision_of", "audio_generations", ["revision_of"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_audio_generations_revision_of", table_name="audio_generations",
+            postgresql_concurrently=True, if_exists=True
+        )
+    op.execute("ALTER TABLE audio_generations DROP COLUMN IF EXISTS revision_of")
@@ -1,7 +1,10 @@
-from fastapi import Depends, HTTPException, status
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import event, select
 from jose import JWTError, jwt
 
 from .database import get_db
@@ -9,23 +12,139 @@ from .models import User
 from .config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token", auto_error=False)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
-    credentials_exception = HTTPException(
+# Scope of tokens that only open one generation's media URLs
+MEDIA_SCOPE = "media"
+
+
+class PrincipalCache:
+    """Users by the bearer token that authenticated them, bounded and expiring.
+
+    An entry lives for ttl seconds or until its token expires, whichever is
+    sooner, so a hit needs neither jwt.decode nor a users query. The least
+    recently used entry is dropped once max_entries are held. The cache is
+    per process: invalidate() reaches this process only, and other API
+    processes see a change once their entries expire.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[User]:
+        entry = self.entries.get(token)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.time():
+            del self.entries[token]
+            return None
+        self.entries.move_to_end(token)
+        return user
+
+    def put(self, token: str, user: User, token_expires_at: Optional[float] = None) -> None:
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        self.entries[token] = (expires_at, user)
+        self.entries.move_to_end(token)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, user_id) -> None:
+        """Forget every token of a user, so the next request reloads them"""
+        for token in [token for token, (_, user) in self.entries.items() if user.id == user_id]:
+            del self.entries[token]
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+principal_cache = PrincipalCache(settings.auth_cache_max_entries, settings.auth_cache_ttl)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    # ORM flushes only; bulk UPDATE/DELETE statements must call invalidate() themselves
+    principal_cache.invalidate(target.id)
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _decode(token: str) -> dict:
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+
+async def _load_user(db: AsyncSession, email: str) -> User:
     result = await db.execute(select(User).where(User.email == email))
     user = result.scalar_one_or_none()
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        raise _credentials_exception()
+    return user
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return cached
+
+    payload = _decode(token)
+    # A media token opens one generation's audio, not the API
+    if payload.get("scope") == MEDIA_SCOPE:
+        raise _credentials_exception()
+
+    user = await _load_user(db, payload["sub"])
+    # Shared read-only between requests, so it must not stay in this session
+    db.expunge(user)
+    principal_cache.put(token, user, payload.get("exp"))
+    return user
+
+def create_media_token(user: User, generation_id) -> Tuple[str, int]:
+    """A token for one generation's audio and waveform URLs, and when it expires (epoch seconds)"""
+    expires_at = int(time.time()) + settings.media_token_expire_seconds
+    token = jwt.encode(
+        {"sub": user.email, "scope": MEDIA_SCOPE, "generation": str(generation_id), "exp": expires_at},
+        settings.secret_key,
+        algorithm=settings.algorithm
+    )
+    return token, expires_at
+
+
+async def get_current_media_user(
+    generation_id: str,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    media_token: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """get_current_user for a generation's media URLs.
+
+    <audio> elements and range requests from the browser's media stack can't
+    set an Authorization header, so these URLs also take ?media_token= from
+    create_media_token. Query strings end up in access logs and browser
+    history, so that token is short-lived and opens this generation's
+    media only; session tokens are accepted in the header alone.
+    """
+    if token:
+        return await get_current_user(token, db)
+
+    payload = _decode(media_token or "")
+    if payload.get("scope") != MEDIA_SCOPE or payload.get("generation") != generation_id:
+        raise _credentials_exception()
+    return await _load_user(db, payload["sub"])
@@ -1,5 +1,6 @@
+import os
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # Database
@@ -10,21 +11,98 @@ class Settings(BaseSettings):
     
     # AI Services
     anthropic_api_key: Optional[str] = None
+    anthropic_base_url: Optional[str] = None  # defaults to the public API
+    anthropic_prompt_caching: bool = True  # cache the documents and personas shared by every prompt
     elevenlabs_api_key: Optional[str] = None
+    elevenlabs_base_url: str = "https://api.elevenlabs.io"
+    
+    # Provider rate limits, per API key and shared by all workers
+    anthropic_requests_per_minute: int = 50
+    anthropic_tokens_per_minute: int = 40000
+    elevenlabs_requests_per_minute: int = 100
+    elevenlabs_characters_per_minute: int = 100000
+    elevenlabs_max_request_chars: int = 5000  # per text-to-speech request
+    provider_max_retries: int = 5
+    provider_backoff_base: float = 1.0  # seconds
+    provider_backoff_cap: float = 60.0  # seconds
     
     # Security
     secret_key: str = "your-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    # Tokens in audio and waveform URLs, which browsers and proxies log
+    media_token_expire_seconds: int = 900
+    # Authenticated users by token, per API process. A change to a user is
+    # seen at once by the process that made it and within auth_cache_ttl by the rest
+    auth_cache_ttl: float = 60.0  # seconds; 0 disables the cache
+    auth_cache_max_entries: int = 10000
+    # Password hashing runs on a thread pool per API process; logins and
+    # registrations beyond workers + max_queue get a 503 instead of queueing
+    bcrypt_rounds: int = 12  # cost factor; older hashes are upgraded at login
+    password_hash_workers: int = os.cpu_count() or 1
+    password_hash_max_queue: int = 16
+    report_query_counts: bool = False  # add X-DB-Queries to every API response
     
     # File Storage
     upload_dir: str = "./uploads"
     audio_dir: str = "./audio"
     max_file_size: int = 50 * 1024 * 1024  # 50MB
+    # Every podcast is encoded to each of these from a single decode, so
+    # clients can pick the smallest file they can play. The MP3 rendition is
+    # the primary audio_url.
+    audio_renditions: List[Dict[str, str]] = [
+        {"name": "opus_48k", "codec": "libopus", "bitrate": "48k", "format": "ogg",
+         "extension": "opus", "mime_type": "audio/ogg; codecs=opus"},
+        {"name": "aac_64k", "codec": "aac", "bitrate": "64k", "format": "ipod",
+         "extension": "m4a", "mime_type": "audio/mp4"},
+        {"name": "mp3_128k", "codec": "libmp3lame", "bitrate": "128k", "format": "mp3",
+         "extension": "mp3", "mime_type": "audio/mpeg"},
+    ]
+    
+    # Music bed for generations with background_music on; a generated pad is used when no file is set
+    background_music_path: Optional[str] = None
+    background_music_db: float = -20.0
+    background_music_duck_db: float = -32.0  # while anyone is speaking
+    background_music_lead_in_ms: int = 2000
+    
+    # "encode" decodes every clip once and encodes each rendition. "splice"
+    # joins MP3 frames of clips pre-encoded at the primary rendition's
+    # profile, with no re-encode, and produces only that rendition.
+    # Generations with background music always use "encode".
+    audio_assembly_mode: str = "encode"
+    # Played for include_intro/include_outro; a short generated sting when unset
+    intro_audio_path: Optional[str] = None
+    outro_audio_path: Optional[str] = None
+    
+    # Audio decode/mix/encode pool, per API or worker process
+    audio_pool_workers: int = 2
+    audio_pool_max_queue: int = 8  # jobs waiting beyond the running ones
+    # Jobs running at once across every process on the host that shares the
+    # slot directory (by default inside audio_dir, which the API and workers mount)
+    audio_host_workers: int = os.cpu_count() or 1
+    audio_pool_slot_dir: Optional[str] = None
     
     # Generation Settings
     max_concurrent_generations: int = 5
+    concept_context_tokens: int = 8000  # document excerpts sent for concept extraction
+    dialogue_segment_concurrency: int = 4  # outline segments written at once per generation
+    dialogue_sources_per_segment: int = 4  # retrieved chunks grounding each segment
+    max_batch_variants: int = 8  # settings variants per batch request
+    batch_variant_concurrency: int = 3  # variants of a batch generated at once, in one worker slot
     default_generation_timeout: int = 600  # 10 minutes
+    # A whole batch, shared stages and every variant, within one deadline
+    batch_generation_timeout: int = 1800  # 30 minutes
+    generation_stage_timeouts: Dict[str, int] = {  # seconds
+        "concepts": 120,
+        "outline": 120,
+        "dialogue": 180,
+        "synthesis": 480,
+    }
+    cancellation_poll_interval: float = 1.0  # seconds
+    
+    # Background Jobs
+    celery_broker_url: Optional[str] = None  # defaults to redis_url
+    generation_queue: str = "generations"
     
     class Config:
         env_file = ".env"
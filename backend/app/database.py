@@ -1,3 +1,6 @@
+from contextvars import ContextVar
+from typing import List, Optional
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -15,6 +18,20 @@ AsyncSessionLocal = sessionmaker(
 
 Base = declarative_base()
 
+_query_count: ContextVar[Optional[List[int]]] = ContextVar("query_count", default=None)
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+def count_queries() -> List[int]:
+    """Count statements run from this task and tasks it starts; read the total from the list"""
+    counter = [0]
+    _query_count.set(counter)
+    return counter
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
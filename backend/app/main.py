@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 import os
@@ -6,21 +6,21 @@ from typing import List, Optional
 import asyncio
 from contextlib import asynccontextmanager
 
-from .database import engine, Base
+from .database import count_queries
 from .routers import auth, projects, documents, audio, personas
 from .services.document_processor import DocumentProcessor
 from .services.audio_generator import AudioGenerator
+from .services.audio_pool import get_audio_pool
+from .services.password_hashing import get_password_hasher
 from .config import settings
 
-# Create tables on startup
+# The schema is managed by Alembic (alembic upgrade head, once per deploy)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
     yield
     # Shutdown
-    pass
+    get_audio_pool().shutdown()
+    get_password_hasher().shutdown()
 
 app = FastAPI(
     title="Voxy API",
@@ -38,6 +38,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.report_query_counts:
+    @app.middleware("http")
+    async def report_query_count(request: Request, call_next):
+        queries = count_queries()
+        response = await call_next(request)
+        response.headers["X-DB-Queries"] = str(queries[0])
+        return response
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
 app.include_router(projects.router, prefix="/api/projects", tags=["projects"])
@@ -51,7 +59,8 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "version": "1.0.0"}
+    return {"status": "healthy", "version": "1.0.0", "audio_pool": get_audio_pool().metrics(),
+            "password_hasher": get_password_hasher().metrics()}
 
 if __name__ == "__main__":
     import uvicorn
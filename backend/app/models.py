@@ -1,11 +1,62 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Float, ForeignKey, JSON
+from sqlalchemy import event, Column, Integer, String, DateTime, Text, Boolean, Float, ForeignKey, JSON, Index, LargeBinary
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
 import uuid
-from .database import Base
+import zstandard
+from .database import Base, engine
 from pgvector.sqlalchemy import Vector
 
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZSTD_LEVEL = 10  # written once and read rarely, so favour ratio over speed
+
+class CompressedText(TypeDecorator):
+    """Text stored as a zstd frame.
+    
+    Values that aren't zstd frames are read as plain UTF-8, which is how
+    the column's rows were stored before compression. Until migration 0002
+    has turned the column from text into bytea, values are read and written
+    as plain text instead; legacy_text records which the database has.
+    """
+    impl = LargeBinary
+    cache_ok = True
+    legacy_text = False
+    
+    def load_dialect_impl(self, dialect):
+        return dialect.type_descriptor(Text() if self.legacy_text else LargeBinary())
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or self.legacy_text:
+            return value
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(value.encode())
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return value
+        data = bytes(value)
+        if data.startswith(ZSTD_MAGIC):
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return data.decode()
+
+@event.listens_for(engine.sync_engine, "first_connect")
+def _detect_legacy_text(dbapi_connection, connection_record):
+    """Read documents.content as plain text if the database hasn't been migrated yet"""
+    if engine.dialect.name != "postgresql":
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT data_type FROM information_schema.columns WHERE table_schema = current_schema() "
+            "AND table_name = 'documents' AND column_name = 'content'"
+        )
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    CompressedText.legacy_text = row is not None and row[0] == "text"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -31,6 +82,11 @@ class Project(Base):
     owner = relationship("User", back_populates="projects")
     documents = relationship("Document", back_populates="project")
     generations = relationship("AudioGeneration", back_populates="project")
+    
+    # Keyset pages of a user's projects by last activity; updated_at is unset until the first edit
+    __table_args__ = (
+        Index("ix_projects_owner_activity", owner_id, func.coalesce(updated_at, created_at), id),
+    )
 
 class Document(Base):
     __tablename__ = "documents"
@@ -41,13 +97,18 @@ class Document(Base):
     original_filename = Column(String, nullable=False)
     file_type = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)
-    content = Column(Text)
+    # Full extracted text: compressed, and only loaded when asked for
+    content = deferred(Column(CompressedText))
+    content_hash = Column(String(64))  # sha256 of the extracted text
     status = Column(String, default="uploading")  # uploading, processing, ready, error
     upload_progress = Column(Float, default=0.0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     project = relationship("Project", back_populates="documents")
     chunks = relationship("DocumentChunk", back_populates="document")
+    
+    # Keyset pages of a project's documents, newest first
+    __table_args__ = (Index("ix_documents_project_created", "project_id", "created_at", "id"),)
 
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
@@ -57,9 +118,12 @@ class DocumentChunk(Base):
     content = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
     embedding = Column(Vector(384))
-    metadata = Column(JSON)
+    chunk_metadata = Column("metadata", JSON)
     
     document = relationship("Document", back_populates="chunks")
+    
+    # A document's chunks in order; also serves the foreign key
+    __table_args__ = (Index("ix_document_chunks_document_chunk", "document_id", "chunk_index"),)
 
 class Persona(Base):
     __tablename__ = "personas"
@@ -72,7 +136,7 @@ class Persona(Base):
     speaking_style = Column(Text, nullable=False)
     avatar = Column(String, nullable=False)
     is_custom = Column(Boolean, default=False)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class AudioGeneration(Base):
@@ -80,31 +144,48 @@ class AudioGeneration(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"))
-    status = Column(String, default="queued")  # queued, processing, completed, failed
+    owner_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))  # the project's owner, copied for listing
+    status = Column(String, default="queued")  # queued, processing, completed, failed, cancelled
     progress = Column(Float, default=0.0)
     current_step = Column(String, default="Initializing...")
     settings = Column(JSON, nullable=False)
+    fingerprint = Column(String(64), index=True)  # source content + normalized settings
+    batch_id = Column(UUID(as_uuid=True), index=True)  # variants generated together, sharing upstream stages
+    revision_of = Column(UUID(as_uuid=True), ForeignKey("audio_generations.id"), index=True)  # the generation this re-records with an edited transcript
     audio_url = Column(String)
     transcript_url = Column(String)
     duration = Column(Integer)  # in seconds
+    audio_metadata = Column(JSON)  # duration_ms, sample_rate, channels, bitrate, segments, renditions, waveform
     estimated_time = Column(Integer)  # in seconds
     error_message = Column(Text)
+    checkpoint = Column(JSON)  # completed stage outputs: context, concepts, outline, dialogue, segments
+    llm_usage = Column(JSON)  # input, cache write, cache read and output tokens across attempts
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True))
     
     project = relationship("Project", back_populates="generations")
     citations = relationship("Citation", back_populates="generation")
+    
+    # Keyset pages of a project's generations, and of all a user's, newest first
+    __table_args__ = (
+        Index("ix_audio_generations_project_created", "project_id", "created_at", "id"),
+        Index("ix_audio_generations_owner_created", "owner_id", "created_at", "id"),
+    )
 
 class Citation(Base):
     __tablename__ = "citations"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     generation_id = Column(UUID(as_uuid=True), ForeignKey("audio_generations.id"))
-    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"))
-    timestamp = Column(Float, nullable=False)  # in seconds
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), index=True)
+    timestamp = Column(Float, nullable=False)  # in seconds, start of the citing turn
+    end_timestamp = Column(Float)  # in seconds, end of the citing turn
     text = Column(Text, nullable=False)
     source_text = Column(Text, nullable=False)
     page_number = Column(Integer)
     
     generation = relationship("AudioGeneration", back_populates="citations")
     document = relationship("Document")
+    
+    # Lookup by playback position: latest citation starting at or before t
+    __table_args__ = (Index("ix_citations_generation_timestamp", "generation_id", "timestamp"),)
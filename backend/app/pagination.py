@@ -0,0 +1,56 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.sql.elements import ColumnElement
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sort_value: datetime, row_id: uuid.UUID) -> str:
+    """An opaque token for the position just after a row"""
+    payload = json.dumps([sort_value.isoformat(), str(row_id)])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """The sort value and id a cursor points after; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), uuid.UUID(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_page(
+    query: Select,
+    sort_column: ColumnElement,
+    id_column: ColumnElement,
+    cursor: Optional[str],
+    limit: int
+) -> Select:
+    """Newest-first page of query that starts after cursor.
+
+    Rows are ordered by (sort_column, id_column) descending and the page
+    seeks past the cursor with a row comparison, so with a matching index
+    every page costs the same however deep it is. One extra row is
+    fetched to tell whether another page follows.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    return query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def page_items(rows: Sequence[Any], limit: int, sort_key: str = "sort_key") -> Tuple[List[Any], Optional[str]]:
+    """The rows of a keyset_page result that belong to the page, and the next page's cursor"""
+    items = list(rows[:limit])
+    if len(rows) <= limit:
+        return items, None
+    last = items[-1]
+    return items, encode_cursor(getattr(last, sort_key), last.id)
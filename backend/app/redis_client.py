@@ -0,0 +1,21 @@
+import asyncio
+import weakref
+
+import redis.asyncio as redis
+
+from .config import settings
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, redis.Redis]" = weakref.WeakKeyDictionary()
+
+def get_redis() -> redis.Redis:
+    """Async Redis client for coordination state (flags, locks, indexes), one per event loop.
+
+    A client's connections belong to the loop that opened them, and worker
+    threads and scripts each run their own loop, so no client is shared
+    across loops. A loop's client goes away with the loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = redis.from_url(settings.redis_url)
+    return client
@@ -1,34 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, func
+from typing import List, Optional
+import asyncio
 import uuid
+import os
 
 from ..database import get_db
-from ..models import AudioGeneration, Project
-from ..services.audio_generator import AudioGenerator
-from ..schemas import AudioGenerationCreate, AudioGenerationResponse
+from ..models import AudioGeneration, Project, User, Citation
+from ..schemas import (
+    AudioGenerationCreate, AudioGenerationResponse, AudioGenerationBatchCreate, AudioGenerationBatchResponse,
+    AudioGenerationSummary, CitationResponse, DialogueEdit, MediaUrls, Page
+)
+from ..auth import get_current_user, get_current_media_user, create_media_token
+from ..streaming import RangeFileResponse
+from ..services.waveform import read_peaks
+from ..config import settings
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, page_items
+from ..workers.celery_app import enqueue_generation, enqueue_batch
+from ..services.cancellation import request_cancellation, clear_cancellation
+from ..services.generation_reuse import (
+    REUSABLE_STATUSES, generation_fingerprint, find_reusable_generation, claim_fingerprint
+)
 
 router = APIRouter()
-audio_generator = AudioGenerator()
 
 @router.post("/generate", response_model=AudioGenerationResponse)
 async def start_audio_generation(
     generation_data: AudioGenerationCreate,
-    background_tasks: BackgroundTasks,
+    reuse: bool = True,
     db: AsyncSession = Depends(get_db)
 ):
-    """Start audio generation process"""
+    """Start audio generation process.
+    
+    An identical request (same project sources and settings) that is already
+    running or finished is returned instead of starting another pipeline,
+    unless reuse is false.
+    """
     try:
         # Verify project exists
         project = await db.get(Project, generation_data.project_id)
         if not project:
             raise HTTPException(status_code=404, detail="Project not found")
         
+        generation_settings = generation_data.settings.dict()
+        fingerprint = await generation_fingerprint(db, generation_data.project_id, generation_settings)
+        
+        if reuse:
+            existing = await find_reusable_generation(db, fingerprint)
+            if existing:
+                return AudioGenerationResponse.from_orm(existing)
+        
         # Create generation record
         generation = AudioGeneration(
             project_id=generation_data.project_id,
-            settings=generation_data.settings.dict(),
+            owner_id=project.owner_id,
+            settings=generation_settings,
+            fingerprint=fingerprint,
             status="queued"
         )
         
@@ -36,17 +64,101 @@ async def start_audio_generation(
         await db.commit()
         await db.refresh(generation)
         
-        # Start background generation
-        background_tasks.add_task(
-            audio_generator.generate_podcast,
-            str(generation.id)
-        )
+        # Two identical requests can both get this far; the claim picks one
+        # run and the other request attaches to it.
+        holder_id = await claim_fingerprint(fingerprint, str(generation.id))
+        if reuse and holder_id:
+            holder = await db.get(AudioGeneration, uuid.UUID(holder_id))
+            if holder and holder.status in REUSABLE_STATUSES:
+                await db.delete(generation)
+                await db.commit()
+                return AudioGenerationResponse.from_orm(holder)
+        
+        # Queue for the generation workers; sending is a blocking broker round trip
+        await asyncio.to_thread(enqueue_generation, str(generation.id))
         
         return AudioGenerationResponse.from_orm(generation)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/generate/batch", response_model=AudioGenerationBatchResponse)
+async def start_batch_generation(
+    batch_data: AudioGenerationBatchCreate,
+    reuse: bool = True,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Start several variants of one project's podcast as a single job.
+    
+    Document analysis and concept extraction run once for the whole batch;
+    only each variant's outline, dialogue and synthesis are repeated. A
+    variant identical to a running or finished generation (or to an earlier
+    variant in the batch) returns that generation instead, unless reuse is
+    false.
+    """
+    try:
+        if len(batch_data.variants) > settings.max_batch_variants:
+            raise HTTPException(
+                status_code=400,
+                detail=f"A batch can have at most {settings.max_batch_variants} variants"
+            )
+        
+        # Someone else's project is reported as missing, not forbidden
+        project = await db.get(Project, batch_data.project_id)
+        if not project or project.owner_id != current_user.id:
+            raise HTTPException(status_code=404, detail="Project not found")
+        
+        batch_id = uuid.uuid4()
+        generations = []
+        queued_ids = []
+        for variant in batch_data.variants:
+            generation_settings = variant.dict()
+            fingerprint = await generation_fingerprint(db, batch_data.project_id, generation_settings)
+            
+            if reuse:
+                existing = await find_reusable_generation(db, fingerprint)
+                if existing:
+                    generations.append(existing)
+                    continue
+            
+            generation = AudioGeneration(
+                project_id=batch_data.project_id,
+                owner_id=project.owner_id,
+                batch_id=batch_id,
+                settings=generation_settings,
+                fingerprint=fingerprint,
+                status="queued"
+            )
+            db.add(generation)
+            await db.commit()
+            await db.refresh(generation)
+            
+            holder_id = await claim_fingerprint(fingerprint, str(generation.id))
+            if reuse and holder_id:
+                holder = await db.get(AudioGeneration, uuid.UUID(holder_id))
+                if holder and holder.status in REUSABLE_STATUSES:
+                    await db.delete(generation)
+                    await db.commit()
+                    generations.append(holder)
+                    continue
+            
+            generations.append(generation)
+            queued_ids.append(str(generation.id))
+        
+        if queued_ids:
+            await asyncio.to_thread(enqueue_batch, str(batch_id), queued_ids)
+        
+        return AudioGenerationBatchResponse(
+            batch_id=batch_id,
+            generations=[AudioGenerationResponse.from_orm(generation) for generation in generations]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/generations/{generation_id}", response_model=AudioGenerationResponse)
 async def get_generation_status(
     generation_id: str,
@@ -65,21 +177,352 @@ async def get_generation_status(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/generations", response_model=List[AudioGenerationResponse])
+async def _owned_generation(db: AsyncSession, generation_id: str, user: User) -> AudioGeneration:
+    """A generation in one of the user's projects, or the HTTP error to return"""
+    generation = await db.get(AudioGeneration, uuid.UUID(generation_id))
+    if not generation:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    
+    project = await db.get(Project, generation.project_id)
+    if not project or project.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return generation
+
+async def _owned_completed_generation(db: AsyncSession, generation_id: str, user: User) -> AudioGeneration:
+    """A completed generation in one of the user's projects, or the HTTP error to return"""
+    generation = await _owned_generation(db, generation_id, user)
+    if generation.status != "completed" or not generation.audio_url:
+        raise HTTPException(status_code=404, detail="Audio not available")
+    return generation
+
+def _audio_file(path: Optional[str]) -> str:
+    """Resolve a stored path, refusing anything outside the audio directory"""
+    audio_dir = os.path.realpath(settings.audio_dir)
+    resolved = os.path.realpath(path or "")
+    if not path or os.path.commonpath([audio_dir, resolved]) != audio_dir or not os.path.isfile(resolved):
+        raise HTTPException(status_code=404, detail="Audio not available")
+    return resolved
+
+@router.post("/generations/{generation_id}/media-urls", response_model=MediaUrls)
+async def create_generation_media_urls(
+    generation_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Audio and waveform URLs an <audio> element can load without an Authorization header.
+    
+    They carry a short-lived token that opens this generation's media only,
+    never the session token.
+    """
+    try:
+        generation = await _owned_completed_generation(db, generation_id, current_user)
+        token, expires_at = create_media_token(current_user, generation.id)
+        
+        def media_url(route: str) -> str:
+            url = request.url_for(route, generation_id=str(generation.id))
+            return str(url.include_query_params(media_token=token))
+        
+        return MediaUrls(
+            audio_url=media_url("stream_generation_audio"),
+            waveform_url=media_url("get_generation_waveform"),
+            expires_at=expires_at
+        )
+        
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid generation ID")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.api_route("/generations/{generation_id}/audio", methods=["GET", "HEAD"])
+async def stream_generation_audio(
+    generation_id: str,
+    request: Request,
+    rendition: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_media_user)
+):
+    """Stream a generation's audio with Range and conditional request support.
+    
+    rendition picks one of audio_metadata["renditions"] by name; the primary
+    MP3 is served by default.
+    """
+    try:
+        generation = await _owned_completed_generation(db, generation_id, current_user)
+        
+        path, media_type = generation.audio_url, "audio/mpeg"
+        if rendition:
+            renditions = (generation.audio_metadata or {}).get("renditions", [])
+            match = next((r for r in renditions if r["name"] == rendition), None)
+            if not match:
+                raise HTTPException(status_code=404, detail="Rendition not found")
+            path, media_type = match["path"], match["mime_type"]
+        
+        return RangeFileResponse(_audio_file(path), request, media_type)
+        
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid generation ID")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/generations/{generation_id}/waveform")
+async def get_generation_waveform(
+    generation_id: str,
+    request: Request,
+    level: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_media_user)
+):
+    """Precomputed waveform peaks for the player.
+    
+    Without level, returns the binary sidecar with every resolution. With
+    level (0 is the finest), returns that resolution as JSON peaks in
+    [-1, 1], ready for wavesurfer.js.
+    """
+    try:
+        generation = await _owned_completed_generation(db, generation_id, current_user)
+        waveform = (generation.audio_metadata or {}).get("waveform")
+        if not waveform:
+            raise HTTPException(status_code=404, detail="Waveform not available")
+        path = _audio_file(waveform["path"])
+        
+        if level is None:
+            return RangeFileResponse(path, request, "application/octet-stream")
+        
+        if not 0 <= level < len(waveform["levels"]):
+            raise HTTPException(status_code=400, detail=f"level must be between 0 and {len(waveform['levels']) - 1}")
+        return read_peaks(path, level)
+        
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid generation ID")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/generations/{generation_id}/transcript")
+async def get_generation_transcript(
+    generation_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """The full timestamped transcript, with each turn's source chunk ids"""
+    try:
+        generation = await _owned_completed_generation(db, generation_id, current_user)
+        return RangeFileResponse(_audio_file(generation.transcript_url), request, "application/json")
+        
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid generation ID")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/generations/{generation_id}/citations", response_model=List[CitationResponse])
+async def get_generation_citations(
+    generation_id: str,
+    at: Optional[float] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Citations ordered by timestamp, or with at (seconds) only those of the turn playing then.
+    
+    The lookup is a descending scan of the (generation_id, timestamp) index,
+    so it costs O(log n) however long the podcast is.
+    """
+    try:
+        generation = await _owned_completed_generation(db, generation_id, current_user)
+        
+        query = select(Citation).where(Citation.generation_id == generation.id)
+        if at is not None:
+            latest_start = (
+                select(func.max(Citation.timestamp))
+                .where(Citation.generation_id == generation.id, Citation.timestamp <= at)
+                .scalar_subquery()
+            )
+            query = query.where(Citation.timestamp == latest_start, Citation.end_timestamp >= at)
+        
+        result = await db.execute(query.order_by(Citation.timestamp))
+        return [CitationResponse.from_orm(citation) for citation in result.scalars().all()]
+        
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid generation ID")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generations/{generation_id}/cancel", response_model=AudioGenerationResponse)
+async def cancel_generation(
+    generation_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Stop a queued or running generation and free its worker slot"""
+    try:
+        generation = await _owned_generation(db, generation_id, current_user)
+        
+        if generation.status not in ("queued", "processing"):
+            raise HTTPException(status_code=409, detail="Generation is not running")
+        
+        # A queued job sees this status and exits as soon as a worker takes it
+        generation.status = "cancelled"
+        generation.current_step = "Cancelled"
+        generation.error_message = "Cancelled by request"
+        await db.commit()
+        await db.refresh(generation)
+        
+        # A running job is interrupted by its worker's cancellation watcher
+        await request_cancellation(str(generation.id))
+        
+        return AudioGenerationResponse.from_orm(generation)
+        
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid generation ID")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generations/{generation_id}/retry", response_model=AudioGenerationResponse)
+async def retry_generation(
+    generation_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Requeue a failed or cancelled generation; it resumes from its last completed stage"""
+    try:
+        generation = await _owned_generation(db, generation_id, current_user)
+        
+        if generation.status not in ("failed", "cancelled"):
+            raise HTTPException(status_code=409, detail="Only failed or cancelled generations can be retried")
+        
+        generation.status = "queued"
+        generation.error_message = None
+        await db.commit()
+        await db.refresh(generation)
+        
+        await clear_cancellation(str(generation.id))
+        if generation.fingerprint:
+            await claim_fingerprint(generation.fingerprint, str(generation.id))
+        await asyncio.to_thread(enqueue_generation, str(generation.id))
+        
+        return AudioGenerationResponse.from_orm(generation)
+        
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid generation ID")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generations/{generation_id}/dialogue", response_model=AudioGenerationResponse)
+async def edit_generation_dialogue(
+    generation_id: str,
+    edit: DialogueEdit,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Re-record a completed generation from an edited transcript, as a new generation.
+    
+    The turns are diffed against the generation's dialogue and only the
+    changed ones are synthesized again; the rest of the speech is reused.
+    The revision links back through revision_of. The edited generation is
+    left as it was, so its audio, transcript and citations stay available,
+    including to requests it was reused for.
+    
+    Only speech costs follow the size of the edit. In "splice" assembly
+    mode the podcast is re-joined by frame copy; in "encode" mode, and
+    always with background music, the whole podcast is decoded and every
+    rendition encoded again.
+    """
+    try:
+        generation = await _owned_completed_generation(db, generation_id, current_user)
+        checkpoint = generation.checkpoint or {}
+        if "dialogue" not in checkpoint:
+            raise HTTPException(status_code=409, detail="Generation has no stored dialogue to edit")
+        
+        persona_names = {persona["name"] for persona in generation.settings.get("personas", [])}
+        unknown = {turn.speaker for turn in edit.dialogue} - persona_names
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown speakers: {', '.join(sorted(unknown))}")
+        
+        edited = [{"speaker": turn.speaker, "text": turn.text} for turn in edit.dialogue]
+        current = [{"speaker": turn["speaker"], "text": turn["text"]} for turn in checkpoint["dialogue"]]
+        if edited == current:
+            return AudioGenerationResponse.from_orm(generation)
+        
+        # The stages up to the dialogue, and the speech of unchanged turns,
+        # carry over. No fingerprint: the audio no longer follows from the
+        # sources and settings alone, so the revision is never reused.
+        revision = AudioGeneration(
+            project_id=generation.project_id,
+            owner_id=generation.owner_id,
+            revision_of=generation.id,
+            settings=generation.settings,
+            checkpoint={**checkpoint, "edit": edited},
+            status="queued",
+            progress=80.0,
+            current_step="Applying transcript edits..."
+        )
+        db.add(revision)
+        await db.commit()
+        await db.refresh(revision)
+        
+        await asyncio.to_thread(enqueue_generation, str(revision.id))
+        
+        return AudioGenerationResponse.from_orm(revision)
+        
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid generation ID")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/generations", response_model=Page[AudioGenerationSummary])
 async def list_generations(
-    project_id: str = None,
-    db: AsyncSession = Depends(get_db)
+    project_id: Optional[str] = None,
+    batch_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
 ):
-    """List audio generations"""
+    """List the user's audio generations, newest first, a page at a time.
+    
+    Only summary columns are read; metadata, checkpoints and token usage
+    are left to the single-generation endpoint.
+    """
     try:
-        query = select(AudioGeneration)
+        query = select(
+            *(getattr(AudioGeneration, field) for field in AudioGenerationSummary.model_fields),
+            AudioGeneration.created_at.label("sort_key")
+        )
         if project_id:
             query = query.where(AudioGeneration.project_id == uuid.UUID(project_id))
+        if batch_id:
+            query = query.where(AudioGeneration.batch_id == uuid.UUID(batch_id))
+        # owner_id is copied from the project, so the user's generations
+        # across all their projects are one range of an index
+        query = query.where(AudioGeneration.owner_id == current_user.id)
         
-        result = await db.execute(query.order_by(AudioGeneration.created_at.desc()))
-        generations = result.scalars().all()
+        result = await db.execute(
+            keyset_page(query, AudioGeneration.created_at, AudioGeneration.id, cursor, limit)
+        )
+        generations, next_cursor = page_items(result.all(), limit)
         
-        return [AudioGenerationResponse.from_orm(gen) for gen in generations]
+        return Page[AudioGenerationSummary](
+            items=[AudioGenerationSummary.from_orm(gen) for gen in generations],
+            next_cursor=next_cursor
+        )
         
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid ID or cursor")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,27 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose import jwt
 
+from ..auth import get_current_user
 from ..database import get_db
 from ..models import User
 from ..schemas import UserCreate, UserResponse
 from ..config import settings
+from ..services.password_hashing import PasswordHasherBusy, get_password_hasher
 
 router = APIRouter()
 
-# Security setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many logins in progress, try again shortly",
+        headers={"Retry-After": "1"},
+    )
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await get_password_hasher().hash(password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -41,27 +42,13 @@ async def authenticate_user(db: AsyncSession, email: str, password: str):
     user = await get_user_by_email(db, email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await get_password_hasher().verify_and_update(password, user.hashed_password)
+    if not verified:
         return False
-    return user
-
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = await get_user_by_email(db, email=email)
-    if user is None:
-        raise credentials_exception
+    if new_hash:
+        # Stored at an older cost factor
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 @router.post("/register", response_model=UserResponse)
@@ -74,7 +61,7 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Create new user
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash(user.password)
         db_user = User(
             email=user.email,
             name=user.name,
@@ -87,6 +74,8 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
         
         return UserResponse.from_orm(db_user)
         
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     except HTTPException:
         raise
     except Exception as e:
@@ -111,6 +100,8 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSessi
         
         return {"access_token": access_token, "token_type": "bearer"}
         
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     except HTTPException:
         raise
     except Exception as e:
@@ -1,15 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from typing import List, Optional
 import uuid
 import os
 import aiofiles
 
 from ..database import get_db
 from ..models import Document, Project, User
-from ..schemas import DocumentResponse
+from ..schemas import DocumentResponse, Page
 from ..auth import get_current_user
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, page_items
 from ..services.document_processor import DocumentProcessor
 from ..config import settings
 
@@ -141,13 +142,15 @@ async def delete_document(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/project/{project_id}", response_model=List[DocumentResponse])
+@router.get("/project/{project_id}", response_model=Page[DocumentResponse])
 async def list_project_documents(
     project_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List documents in a project"""
+    """List documents in a project, newest first, a page at a time"""
     try:
         # Verify project access
         project = await db.get(Project, uuid.UUID(project_id))
@@ -157,18 +160,22 @@ async def list_project_documents(
         if project.owner_id != current_user.id:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Get documents
-        result = await db.execute(
-            select(Document)
-            .where(Document.project_id == uuid.UUID(project_id))
-            .order_by(Document.created_at.desc())
+        # Get documents, without their extracted text
+        query = select(
+            Document.id, Document.project_id, Document.filename, Document.original_filename,
+            Document.file_type, Document.file_size, Document.status, Document.upload_progress,
+            Document.created_at, Document.created_at.label("sort_key")
+        ).where(Document.project_id == project.id)
+        result = await db.execute(keyset_page(query, Document.created_at, Document.id, cursor, limit))
+        documents, next_cursor = page_items(result.all(), limit)
+        
+        return Page[DocumentResponse](
+            items=[DocumentResponse.from_orm(doc) for doc in documents],
+            next_cursor=next_cursor
         )
-        documents = result.scalars().all()
-        
-        return [DocumentResponse.from_orm(doc) for doc in documents]
         
     except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid project ID")
+        raise HTTPException(status_code=400, detail="Invalid project ID or cursor")
     except HTTPException:
         raise
     except Exception as e:
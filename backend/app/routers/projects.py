@@ -1,13 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, func
+from typing import List, Optional
 import uuid
 
 from ..database import get_db
 from ..models import Project, User
-from ..schemas import ProjectCreate, ProjectResponse
+from ..schemas import ProjectCreate, ProjectResponse, Page
 from ..auth import get_current_user
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, page_items
 
 router = APIRouter()
 
@@ -34,22 +35,31 @@ async def create_project(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[ProjectResponse])
+@router.get("/", response_model=Page[ProjectResponse])
 async def list_projects(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List user's projects"""
+    """List user's projects, most recently active first, a page at a time"""
     try:
-        result = await db.execute(
-            select(Project)
-            .where(Project.owner_id == current_user.id)
-            .order_by(Project.updated_at.desc())
+        # Matches ix_projects_owner_activity
+        last_activity = func.coalesce(Project.updated_at, Project.created_at)
+        query = select(
+            Project.id, Project.name, Project.description, Project.owner_id,
+            Project.created_at, Project.updated_at, last_activity.label("sort_key")
+        ).where(Project.owner_id == current_user.id)
+        result = await db.execute(keyset_page(query, last_activity, Project.id, cursor, limit))
+        projects, next_cursor = page_items(result.all(), limit)
+        
+        return Page[ProjectResponse](
+            items=[ProjectResponse.from_orm(project) for project in projects],
+            next_cursor=next_cursor
         )
-        projects = result.scalars().all()
-        
-        return [ProjectResponse.from_orm(project) for project in projects]
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
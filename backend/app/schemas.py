@@ -1,8 +1,15 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, computed_field
+from typing import Generic, List, Optional, Dict, Any, TypeVar
 from datetime import datetime
 import uuid
 
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    """One page of a list, newest first; pass next_cursor back as cursor for the next"""
+    items: List[T]
+    next_cursor: Optional[str] = None
+
 # User schemas
 class UserBase(BaseModel):
     email: str
@@ -76,22 +83,29 @@ class PersonaResponse(PersonaBase):
 
 # Generation schemas
 class GenerationSettings(BaseModel):
-    duration: str = Field(..., regex="^(5-10|10-15|15-20)$")
+    duration: str = Field(..., pattern="^(5-10|10-15|15-20)$")
     personas: List[Dict[str, Any]]
-    tone: str = Field(..., regex="^(educational|entertaining|balanced|debate)$")
+    tone: str = Field(..., pattern="^(educational|entertaining|balanced|debate)$")
     focus_areas: List[str] = []
     include_intro: bool = True
     include_outro: bool = True
     background_music: bool = False
-    citation_style: str = Field(..., regex="^(inline|endnotes|timestamps)$")
+    citation_style: str = Field(..., pattern="^(inline|endnotes|timestamps)$")
 
 class AudioGenerationCreate(BaseModel):
     project_id: uuid.UUID
     settings: GenerationSettings
 
-class AudioGenerationResponse(BaseModel):
+class AudioGenerationBatchCreate(BaseModel):
+    project_id: uuid.UUID
+    variants: List[GenerationSettings] = Field(..., min_length=1)
+
+class AudioGenerationSummary(BaseModel):
+    """A generation as listed, without its metadata and token usage"""
     id: uuid.UUID
     project_id: uuid.UUID
+    batch_id: Optional[uuid.UUID] = None
+    revision_of: Optional[uuid.UUID] = None
     status: str
     progress: float
     current_step: str
@@ -104,15 +118,52 @@ class AudioGenerationResponse(BaseModel):
     created_at: datetime
     completed_at: Optional[datetime]
     
+    @computed_field
+    @property
+    def stream_url(self) -> Optional[str]:
+        """Where clients play the audio; audio_url is the file's path on the server"""
+        return f"/api/audio/generations/{self.id}/audio" if self.audio_url else None
+    
+    class Config:
+        from_attributes = True
+
+class AudioGenerationResponse(AudioGenerationSummary):
+    audio_metadata: Optional[Dict[str, Any]] = None
+    llm_usage: Optional[Dict[str, int]] = None
+    
+    @computed_field
+    @property
+    def waveform_url(self) -> Optional[str]:
+        """Precomputed peaks, so the player can draw before any audio is fetched"""
+        has_waveform = bool((self.audio_metadata or {}).get("waveform"))
+        return f"/api/audio/generations/{self.id}/waveform" if has_waveform else None
+    
     class Config:
         from_attributes = True
 
+class DialogueTurn(BaseModel):
+    speaker: str
+    text: str = Field(..., min_length=1)
+
+class DialogueEdit(BaseModel):
+    dialogue: List[DialogueTurn] = Field(..., min_length=1)
+
+class AudioGenerationBatchResponse(BaseModel):
+    batch_id: uuid.UUID
+    generations: List[AudioGenerationResponse]  # in variant order; reused runs keep their own batch_id
+
+class MediaUrls(BaseModel):
+    audio_url: str  # add &rendition=<name> for another rendition
+    waveform_url: str
+    expires_at: int  # epoch seconds; fetch new URLs after this
+
 # Citation schemas
 class CitationResponse(BaseModel):
     id: uuid.UUID
     generation_id: uuid.UUID
     document_id: uuid.UUID
     timestamp: float
+    end_timestamp: Optional[float] = None
     text: str
     source_text: str
     page_number: Optional[int]
@@ -0,0 +1,515 @@
+import os
+import queue
+import subprocess
+import threading
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from pydub import AudioSegment
+
+from .audio_metadata import probe_mp3, read_audio_frames
+from .audio_pool import get_audio_pool
+from .mp3_splice import MP3Splicer
+from .waveform import WaveformBuilder, write_peaks
+from .mixing import DuckingMixer, GeneratedPad
+
+# Everything prefixed _job runs inside an audio pool process: arguments and
+# results are plain paths, numbers and dicts, never PCM.
+
+SAMPLE_WIDTH = 2  # 16-bit PCM throughout
+
+# The fixed profile clips are pre-encoded at for splicing: the primary MP3
+# rendition's bitrate at 44.1 kHz mono, which is what ElevenLabs returns by
+# default, so TTS segments normally splice without any conversion.
+SPLICE_SAMPLE_RATE = 44100
+SPLICE_CHANNELS = 1
+STING_MS = 3000
+
+
+def _ffmpeg_command(*args: str) -> List[str]:
+    return [AudioSegment.converter, "-hide_banner", "-loglevel", "error", *args]
+
+
+def _decode_pcm(path: str, sample_rate: int, channels: int) -> bytes:
+    """Decode any audio file to 16-bit PCM at the given rate and channel count"""
+    result = subprocess.run(
+        _ffmpeg_command(
+            "-i", path,
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ar", str(sample_rate), "-ac", str(channels),
+            "-"
+        ),
+        stdin=subprocess.DEVNULL,
+        capture_output=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {path}: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def _decode_chunks(path: str, sample_rate: int, channels: int, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """Decode an audio file to 16-bit PCM a chunk at a time"""
+    process = subprocess.Popen(
+        _ffmpeg_command(
+            "-i", path,
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ar", str(sample_rate), "-ac", str(channels),
+            "-"
+        ),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    try:
+        while True:
+            pcm = process.stdout.read(chunk_size)
+            if not pcm:
+                break
+            yield pcm
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {path}: {stderr.decode(errors='replace').strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def _bitrate_bps(bitrate: str) -> int:
+    return int(bitrate.rstrip("k")) * 1000
+
+
+def primary_rendition(renditions: List[Dict[str, str]]) -> Dict[str, str]:
+    """The MP3 rendition, which every client can play"""
+    for rendition in renditions:
+        if rendition["format"] == "mp3":
+            return rendition
+    raise ValueError("audio_renditions must include an MP3 rendition")
+
+
+def rendition_path(base_path: str, rendition: Dict[str, str]) -> str:
+    return f"{base_path}.{rendition['extension']}"
+
+
+class _Encoder:
+    """An ffmpeg process encoding PCM into one rendition.
+
+    PCM is handed over through a small queue and written to ffmpeg's stdin
+    by a feeder thread, so several encoders consume the same decoded audio
+    in parallel instead of taking turns on a blocking pipe.
+    """
+
+    def __init__(self, path: str, sample_rate: int, channels: int, rendition: Dict[str, str]):
+        self.path = path
+        options = ["-movflags", "+faststart"] if rendition["format"] in ("ipod", "mp4") else []
+        self.process = subprocess.Popen(
+            _ffmpeg_command(
+                "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels),
+                "-i", "-",
+                "-c:a", rendition["codec"], "-b:a", rendition["bitrate"],
+                *options,
+                "-f", rendition["format"],
+                "-y", path
+            ),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        self._chunks: queue.Queue = queue.Queue(maxsize=4)
+        self._error: Optional[BaseException] = None
+        self._feeder = threading.Thread(target=self._feed, daemon=True)
+        self._feeder.start()
+
+    def _feed(self) -> None:
+        while True:
+            pcm = self._chunks.get()
+            if pcm is None:
+                break
+            if self._error is None:
+                try:
+                    self.process.stdin.write(pcm)
+                except OSError as e:
+                    # Keep draining so the producer never blocks on a dead encoder
+                    self._error = e
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+    def write(self, pcm: bytes) -> None:
+        self._chunks.put(pcm)
+
+    def close(self) -> None:
+        self._chunks.put(None)
+        self._feeder.join()
+        stderr = self.process.stderr.read()
+        if self.process.wait() != 0 or self._error is not None:
+            raise RuntimeError(f"ffmpeg failed to encode {self.path}: {stderr.decode(errors='replace').strip() or self._error}")
+
+    def kill(self) -> None:
+        self.process.kill()
+        self._chunks.put(None)
+        self._feeder.join()
+        self.process.wait()
+
+
+def _encode_renditions(
+    outputs: List[Tuple[str, Dict[str, str]]],
+    peaks_path: str,
+    sample_rate: int,
+    channels: int,
+    chunks: Iterable[bytes]
+) -> Dict[str, Any]:
+    """Feed one stream of PCM chunks to an encoder per rendition, all at once.
+
+    Waveform peaks are computed from the same chunks while the encoders run.
+    """
+    encoders = [_Encoder(path, sample_rate, channels, rendition) for path, rendition in outputs]
+    waveform = WaveformBuilder(sample_rate, channels)
+    try:
+        for pcm in chunks:
+            for encoder in encoders:
+                encoder.write(pcm)
+            waveform.feed(pcm)
+        levels = waveform.finish()
+        for encoder in encoders:
+            encoder.close()
+    except BaseException:
+        for encoder in encoders:
+            encoder.kill()
+        raise
+
+    return {
+        "renditions": [
+            {
+                "name": rendition["name"],
+                "mime_type": rendition["mime_type"],
+                "bitrate": _bitrate_bps(rendition["bitrate"]),
+                "size": os.path.getsize(path),
+            }
+            for path, rendition in outputs
+        ],
+        "waveform": {
+            "levels": [samples_per_peak for samples_per_peak, _ in levels],
+            "size": write_peaks(peaks_path, sample_rate, levels),
+        },
+    }
+
+
+def _job_assemble(
+    outputs: List[Tuple[str, Dict[str, str]]],
+    peaks_path: str,
+    segment_paths: List[str],
+    pause_ms: int,
+    music: Optional[Dict[str, Any]] = None,
+    intro_path: Optional[str] = None,
+    outro_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """Decode segments one at a time and stream them, with pauses, into the encoders.
+
+    Only one segment's PCM is held at a time, so memory stays flat however
+    long the podcast is. With music, a bed is mixed under the voices
+    chunk by chunk on the way to the encoders, after a music-only lead-in.
+    The intro, if any, is followed by a pause; the outro follows the last
+    segment's pause.
+    """
+    first = probe_mp3(segment_paths[0]) if segment_paths else None
+    sample_rate = first["sample_rate"] if first else 44100
+    channels = first["channels"] if first else 1
+    frame_bytes = SAMPLE_WIDTH * channels
+    silence = lambda ms: bytes(sample_rate * ms // 1000 * frame_bytes)
+    pause = silence(pause_ms)
+
+    music = dict(music) if music is not None else None
+    lead_in = silence(music.pop("lead_in_ms", 0)) if music is not None else b""
+    mixer = DuckingMixer(sample_rate, channels, **music) if music is not None else None
+
+    spans = []
+    position_frames = len(lead_in) // frame_bytes
+
+    def chunks() -> Iterator[bytes]:
+        nonlocal position_frames
+        if lead_in:
+            yield lead_in
+        if intro_path:
+            pcm = _decode_pcm(intro_path, sample_rate, channels)
+            position_frames += (len(pcm) + len(pause)) // frame_bytes
+            yield pcm
+            yield pause
+        for n, path in enumerate(segment_paths):
+            pcm = _decode_pcm(path, sample_rate, channels)
+            frames = len(pcm) // frame_bytes
+            spans.append((position_frames, position_frames + frames))
+            position_frames += frames + len(pause) // frame_bytes
+            yield pcm
+            yield pause
+        if outro_path:
+            pcm = _decode_pcm(outro_path, sample_rate, channels)
+            position_frames += len(pcm) // frame_bytes
+            yield pcm
+
+    def mixed(stream: Iterator[bytes]) -> Iterator[bytes]:
+        # Look one chunk ahead so the final pause can fade the music out
+        previous = next(stream, None)
+        for pcm in stream:
+            yield mixer.mix(previous)
+            previous = pcm
+        if previous is not None:
+            yield mixer.mix(previous, fade_out=True)
+
+    try:
+        stream = mixed(chunks()) if mixer else chunks()
+        encoded = _encode_renditions(outputs, peaks_path, sample_rate, channels, stream)
+    finally:
+        if mixer:
+            mixer.close()
+
+    to_ms = lambda frames: round(frames * 1000 / sample_rate)
+    return {
+        "duration_ms": to_ms(position_frames),
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "spans_ms": [(to_ms(start), to_ms(end)) for start, end in spans],
+        **encoded,
+    }
+
+
+def _job_tone(
+    outputs: List[Tuple[str, Dict[str, str]]],
+    peaks_path: str,
+    frequency: float,
+    duration_ms: int
+) -> Dict[str, Any]:
+    """Encode a mono sine tone"""
+    sample_rate = 44100
+    t = np.arange(sample_rate * duration_ms // 1000) / sample_rate
+    pcm = (np.sin(2 * np.pi * frequency * t) * 0.5 * 32767).astype("<i2").tobytes()
+
+    encoded = _encode_renditions(outputs, peaks_path, sample_rate, 1, [pcm])
+    return {"duration_ms": duration_ms, "sample_rate": sample_rate, "channels": 1, "spans_ms": [], **encoded}
+
+
+def conformed_path(path: str, rendition: Dict[str, str]) -> str:
+    """Where the copy of a clip encoded to the splice profile is kept"""
+    return f"{os.path.splitext(path)[0]}.{rendition['name']}.mp3"
+
+
+def _conform(path: str, rendition: Dict[str, str]) -> Tuple[str, bool]:
+    """A copy of the clip at the splice profile, encoding one only if needed.
+
+    Returns the path to splice and whether an encode was done. Encoded
+    copies sit next to the source and are reused on later runs.
+    """
+    try:
+        clip = read_audio_frames(path)
+        probe = probe_mp3(path)
+        if (clip["version"], clip["layer"], clip["sample_rate"], clip["channels"], probe["bitrate"]) == \
+                (3, 3, SPLICE_SAMPLE_RATE, SPLICE_CHANNELS, _bitrate_bps(rendition["bitrate"])):
+            return path, False
+    except (ValueError, TypeError):
+        pass  # not MP3 at all; encode it
+
+    copy_path = conformed_path(path, rendition)
+    if os.path.exists(copy_path):
+        return copy_path, False
+    partial_path = f"{copy_path}.part"
+    encoder = _Encoder(partial_path, SPLICE_SAMPLE_RATE, SPLICE_CHANNELS, rendition)
+    try:
+        encoder.write(_decode_pcm(path, SPLICE_SAMPLE_RATE, SPLICE_CHANNELS))
+        encoder.close()
+    except BaseException:
+        encoder.kill()
+        _remove(partial_path)
+        raise
+    os.replace(partial_path, copy_path)
+    return copy_path, True
+
+
+def _job_splice(
+    outputs: List[Tuple[str, Dict[str, str]]],
+    peaks_path: str,
+    segment_paths: List[str],
+    pause_ms: int,
+    intro_path: Optional[str] = None,
+    outro_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """Join clips into the MP3 rendition by copying frames, with no encode.
+
+    Clips not already at the splice profile are encoded to it once and
+    cached. The finished file is decoded once, as a stream, for the
+    waveform; nothing is re-encoded.
+    """
+    (output_path, rendition), = outputs
+    splicer = MP3Splicer(output_path, SPLICE_SAMPLE_RATE, SPLICE_CHANNELS, _bitrate_bps(rendition["bitrate"]))
+    conformed = 0
+
+    def clip(path: str) -> Tuple[int, int]:
+        nonlocal conformed
+        path, encoded = _conform(path, rendition)
+        conformed += encoded
+        return splicer.add_clip(path)
+
+    spans = []
+    try:
+        if intro_path:
+            clip(intro_path)
+            splicer.add_silence(pause_ms)
+        for path in segment_paths:
+            spans.append(clip(path))
+            splicer.add_silence(pause_ms)
+        if outro_path:
+            clip(outro_path)
+        spliced = splicer.finish()
+    except BaseException:
+        splicer.abort()
+        raise
+
+    waveform = WaveformBuilder(SPLICE_SAMPLE_RATE, SPLICE_CHANNELS)
+    for pcm in _decode_chunks(output_path, SPLICE_SAMPLE_RATE, SPLICE_CHANNELS):
+        waveform.feed(pcm)
+    levels = waveform.finish()
+
+    to_ms = lambda samples: round(samples * 1000 / SPLICE_SAMPLE_RATE)
+    return {
+        "duration_ms": to_ms(spliced["samples"]),
+        "sample_rate": SPLICE_SAMPLE_RATE,
+        "channels": SPLICE_CHANNELS,
+        "spans_ms": [(to_ms(start), to_ms(end)) for start, end in spans],
+        "conformed_clips": conformed,
+        "renditions": [{
+            "name": rendition["name"],
+            "mime_type": rendition["mime_type"],
+            "bitrate": _bitrate_bps(rendition["bitrate"]),
+            "size": spliced["size"],
+        }],
+        "waveform": {
+            "levels": [samples_per_peak for samples_per_peak, _ in levels],
+            "size": write_peaks(peaks_path, SPLICE_SAMPLE_RATE, levels),
+        },
+    }
+
+
+def _job_clip(path: str, rendition: Dict[str, str], source_path: Optional[str], duration_ms: int) -> None:
+    """Encode an intro/outro clip at the splice profile.
+
+    The clip is the source file when one is configured, otherwise a short
+    generated sting that swells in and fades away.
+    """
+    if source_path:
+        pcm = _decode_pcm(source_path, SPLICE_SAMPLE_RATE, SPLICE_CHANNELS)
+    else:
+        frames = SPLICE_SAMPLE_RATE * duration_ms // 1000
+        pad = GeneratedPad(SPLICE_SAMPLE_RATE, SPLICE_CHANNELS).read(frames * SAMPLE_WIDTH * SPLICE_CHANNELS)
+        envelope = np.minimum(np.linspace(0, 4, frames), 1) * np.linspace(1, 0, frames) ** 2
+        pcm = (pad * envelope).astype("<i2").tobytes()
+
+    encoder = _Encoder(path, SPLICE_SAMPLE_RATE, SPLICE_CHANNELS, rendition)
+    try:
+        encoder.write(pcm)
+        encoder.close()
+    except BaseException:
+        encoder.kill()
+        raise
+
+
+def _remove(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def _run_to_files(job, base_path: str, renditions: List[Dict[str, str]], *args: Any) -> Dict[str, Any]:
+    """Run a pool job that encodes every rendition, publishing the files only on success.
+
+    The job writes .part files that are renamed here once it has been
+    awaited, so a cancelled or failed generation never leaves a playable but
+    truncated podcast behind. Each returned rendition, and the waveform
+    sidecar, gains its final path.
+    """
+    paths = [rendition_path(base_path, rendition) for rendition in renditions]
+    outputs = [(f"{path}.part", rendition) for path, rendition in zip(paths, renditions)]
+    peaks_path = f"{base_path}.peaks"
+    partial_paths = [partial_path for partial_path, _ in outputs] + [f"{peaks_path}.part"]
+    try:
+        result = await get_audio_pool().run(job, outputs, f"{peaks_path}.part", *args)
+    except BaseException:
+        # The pool only gives up on a job once its process has exited
+        for partial_path in partial_paths:
+            _remove(partial_path)
+        raise
+    for (partial_path, _), path, encoded in zip(outputs, paths, result["renditions"]):
+        os.replace(partial_path, path)
+        encoded["path"] = path
+    os.replace(f"{peaks_path}.part", peaks_path)
+    result["waveform"]["path"] = peaks_path
+    return result
+
+
+async def assemble_podcast(
+    segment_paths: List[str],
+    pause_ms: int,
+    base_path: str,
+    renditions: List[Dict[str, str]],
+    music: Optional[Dict[str, Any]] = None,
+    intro_path: Optional[str] = None,
+    outro_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """Join segment MP3s with pauses between them and encode every rendition in the audio pool.
+
+    music, when given, holds DuckingMixer options plus lead_in_ms. Output
+    files are base_path plus each rendition's extension, and base_path.peaks
+    for the waveform. Returns the duration, sample rate, channels, each
+    segment's (start_ms, end_ms) span, the encoded renditions and the
+    waveform sidecar.
+    """
+    return await _run_to_files(
+        _job_assemble, base_path, renditions, segment_paths, pause_ms, music, intro_path, outro_path
+    )
+
+
+async def splice_podcast(
+    segment_paths: List[str],
+    pause_ms: int,
+    base_path: str,
+    rendition: Dict[str, str],
+    intro_path: Optional[str] = None,
+    outro_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """Join segment MP3s with pauses into the one MP3 rendition by frame copy.
+
+    Returns the same description as assemble_podcast, plus how many clips
+    had to be encoded to the splice profile first.
+    """
+    return await _run_to_files(_job_splice, base_path, [rendition], segment_paths, pause_ms, intro_path, outro_path)
+
+
+async def render_clip(name: str, source_path: Optional[str], clip_dir: str, rendition: Dict[str, str]) -> str:
+    """Path of an intro/outro clip at the splice profile, encoding it on first use.
+
+    Clips are shared by every generation and keyed by their source file's
+    size and modification time, so replacing the file takes effect.
+    """
+    if source_path:
+        stat = os.stat(source_path)
+        key = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    else:
+        key = "generated"
+    path = os.path.join(clip_dir, f"{name}_{rendition['name']}_{key}.mp3")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(clip_dir, exist_ok=True)
+    # Unique per caller, since concurrent generations may render the same clip
+    partial_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        await get_audio_pool().run(_job_clip, partial_path, rendition, source_path, STING_MS)
+    except BaseException:
+        _remove(partial_path)
+        raise
+    os.replace(partial_path, path)
+    return path
+
+
+async def render_tone(frequency: float, duration_ms: int, base_path: str, renditions: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Encode a sine tone to every rendition in the audio pool"""
+    return await _run_to_files(_job_tone, base_path, renditions, frequency, duration_ms)
@@ -1,152 +1,434 @@
 import asyncio
 import os
-from typing import List, Dict, Any, Optional
+import uuid
+from typing import List, Dict, Any, Optional, Set, Tuple, Callable, Awaitable, Union
 import httpx
-from elevenlabs import generate, save, voices
-from pydub import AudioSegment
-import tempfile
-from anthropic import Anthropic
-from ..models import AudioGeneration, Project, Document
+from anthropic import AsyncAnthropic
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from ..models import AudioGeneration, Document
 from ..database import AsyncSessionLocal
 from ..config import settings
 from .document_processor import DocumentProcessor
+from .rate_limiter import RateLimiter
+from .cancellation import CancellationWatcher, GenerationCancelled, stage_deadline
+from .audio_codec import (
+    assemble_podcast, splice_podcast, render_clip, render_tone, primary_rendition, rendition_path, conformed_path
+)
+from .generation_reuse import release_fingerprint
+from .citations import attribute_sources, build_transcript, write_transcript, save_citations
+from .speech_packing import pack_turns, pack_key, turn_spans
+from .transcript_edits import diff_turns, pack_boundaries, carry_over
+from .context_selection import select_context
+from .dialogue_segments import split_outline, segment_word_target, match_speaker, TOKENS_PER_WORD
+from .llm_usage import track_usage, record_usage, merge_usage
+
+CLAUDE_MODEL = "claude-3-sonnet-20240229"
+TTS_MODEL = "eleven_monolingual_v1"
+SOURCE_EXCERPT_CHARS = 1200  # per retrieved chunk in a dialogue prompt
+TURN_PAUSE_MS = 500  # between turns, whether spoken as a break or inserted by assembly
 
 class AudioGenerator:
     def __init__(self):
-        self.anthropic = Anthropic(api_key=settings.anthropic_api_key) if settings.anthropic_api_key else None
+        # Retries are handled by the shared rate limiter, not the SDK
+        self.anthropic = AsyncAnthropic(
+            api_key=settings.anthropic_api_key,
+            base_url=settings.anthropic_base_url,
+            max_retries=0
+        ) if settings.anthropic_api_key else None
+        self.rate_limiter = RateLimiter(shared=True)
         self.document_processor = DocumentProcessor()
     
     async def generate_podcast(self, generation_id: str) -> bool:
-        """Generate a complete podcast from documents"""
+        """Generate a complete podcast from documents.
+        
+        Each stage's output is checkpointed on the generation, so a retry or a
+        redelivered job resumes after the last completed stage. The run is
+        bounded by settings.default_generation_timeout and stops as soon as
+        the generation is cancelled.
+        """
+        track_usage()
         try:
-            async with AsyncSessionLocal() as db:
-                # Get generation details
-                generation = await db.get(AudioGeneration, generation_id)
-                if not generation:
-                    return False
+            async with asyncio.timeout(settings.default_generation_timeout):
+                async with CancellationWatcher(generation_id):
+                    return await self._run_pipeline(generation_id)
                 
-                # Update status
-                generation.status = "processing"
-                generation.progress = 5.0
-                generation.current_step = "Analyzing documents..."
-                await db.commit()
+        except GenerationCancelled:
+            print(f"Generation {generation_id} cancelled")
+            await self._mark_stopped(generation_id, "cancelled", "Cancelled by request")
+            return False
+        except TimeoutError:
+            await self._mark_stopped(
+                generation_id,
+                "failed",
+                f"Generation exceeded its {settings.default_generation_timeout}s deadline"
+            )
+            return False
+        except Exception as e:
+            print(f"Error generating podcast {generation_id}: {e}")
+            await self._mark_stopped(generation_id, "failed", str(e))
+            return False
+    
+    async def generate_batch(self, generation_ids: List[str]) -> List[bool]:
+        """Generate several variants of one project, sharing the stages they have in common.
+        
+        Context selection and concept extraction depend only on the
+        project's documents, so they run once and are checkpointed into
+        every variant. Each variant's outline, dialogue and synthesis then
+        run with at most settings.batch_variant_concurrency variants in
+        flight, so a batch takes one worker slot however many variants it
+        has. The whole batch is bounded by settings.batch_generation_timeout,
+        which the broker's visibility timeout outlasts, so a long batch is
+        never redelivered while it is still running. Returns whether each
+        variant completed.
+        """
+        track_usage()
+        results = dict.fromkeys(generation_ids, False)
+        try:
+            async with asyncio.timeout(settings.batch_generation_timeout):
+                await self._run_shared_stages(generation_ids)
+                semaphore = asyncio.Semaphore(settings.batch_variant_concurrency)
                 
-                # Get project and documents
-                project = await db.get(Project, generation.project_id)
-                documents = project.documents
+                async def run(generation_id: str) -> None:
+                    async with semaphore:
+                        results[generation_id] = await self.generate_podcast(generation_id)
                 
+                await asyncio.gather(*(run(generation_id) for generation_id in generation_ids))
+        except Exception as e:
+            message = (
+                f"Batch exceeded its {settings.batch_generation_timeout}s deadline"
+                if isinstance(e, TimeoutError) else str(e)
+            )
+            print(f"Error generating batch {generation_ids}: {message}")
+            for generation_id in generation_ids:
+                await self._mark_stopped(generation_id, "failed", message, only_pending=True)
+        return [results[generation_id] for generation_id in generation_ids]
+    
+    async def _run_shared_stages(self, generation_ids: List[str]) -> None:
+        """Checkpoint the context and concepts every variant of a batch starts from"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(AudioGeneration).where(
+                    AudioGeneration.id.in_([uuid.UUID(generation_id) for generation_id in generation_ids])
+                )
+            )
+            generations = [
+                generation for generation in result.scalars().all()
+                if generation.status not in ("completed", "cancelled")
+            ]
+            if not generations:
+                return
+            if len({generation.project_id for generation in generations}) > 1:
+                raise ValueError("Batch variants must belong to one project")
+            
+            # A redelivered batch resumes from whichever variant got furthest
+            shared = next(
+                (generation.checkpoint for generation in generations
+                 if {"context", "concepts"} <= set(generation.checkpoint or {})),
+                None
+            )
+            if shared is None:
+                project_id = generations[0].project_id
+                result = await db.execute(select(Document).where(Document.project_id == project_id))
+                documents = result.scalars().all()
                 if not documents:
-                    generation.status = "failed"
-                    generation.error_message = "No documents found"
-                    await db.commit()
-                    return False
+                    # Each variant reports the missing documents itself
+                    return
                 
-                # Step 1: Extract key concepts (20%)
+                for generation in generations:
+                    generation.status = "processing"
+                    generation.progress = 20.0
+                    generation.current_step = "Extracting key concepts..."
+                await db.commit()
+                
+                async with stage_deadline("concepts"):
+                    context = await select_context(db, project_id, documents, settings.concept_context_tokens)
+                    concepts = await self._extract_key_concepts(self._document_prefix(context))
+                shared = {"context": context, "concepts": concepts}
+            
+            for generation in generations:
+                # Assign a new dict; a variant's own checkpoint wins over the batch's
+                generation.checkpoint = {
+                    "context": shared["context"], "concepts": shared["concepts"], **(generation.checkpoint or {})
+                }
+            # The shared stages' tokens are recorded on the first variant
+            generations[0].llm_usage = merge_usage(generations[0].llm_usage)
+            await db.commit()
+    
+    async def _run_pipeline(self, generation_id: str) -> bool:
+        """Run the pipeline stages, skipping any that are already checkpointed"""
+        async with AsyncSessionLocal() as db:
+            # Get generation details
+            generation = await db.get(AudioGeneration, uuid.UUID(generation_id))
+            if not generation:
+                return False
+            
+            # A redelivered job may find the work already done or withdrawn
+            if generation.status == "completed":
+                return True
+            if generation.status == "cancelled":
+                return False
+            
+            # Update status
+            generation.checkpoint = generation.checkpoint or {}
+            generation.status = "processing"
+            generation.error_message = None
+            generation.progress = 5.0
+            generation.current_step = "Analyzing documents..."
+            await db.commit()
+            
+            # Get project documents (relationships can't lazy-load under asyncio)
+            result = await db.execute(
+                select(Document).where(Document.project_id == generation.project_id)
+            )
+            documents = result.scalars().all()
+            
+            if not documents:
+                generation.status = "failed"
+                generation.error_message = "No documents found"
+                await db.commit()
+                return False
+            
+            async def shared_context() -> str:
+                # Selected once and checkpointed, so every stage and retry sends the same prefix
+                if "context" not in generation.checkpoint:
+                    context = await select_context(
+                        db, generation.project_id, documents, settings.concept_context_tokens
+                    )
+                    await self._save_checkpoint(db, generation, context=context)
+                return generation.checkpoint["context"]
+            
+            # Step 1: Extract key concepts (20%)
+            if "concepts" not in generation.checkpoint:
                 generation.progress = 20.0
                 generation.current_step = "Extracting key concepts..."
                 await db.commit()
                 
-                key_concepts = await self._extract_key_concepts(documents)
-                
-                # Step 2: Generate conversation outline (40%)
+                async with stage_deadline("concepts"):
+                    key_concepts = await self._extract_key_concepts(self._document_prefix(await shared_context()))
+                await self._save_checkpoint(db, generation, concepts=key_concepts)
+            key_concepts = generation.checkpoint["concepts"]
+            
+            # Step 2: Generate conversation outline (40%)
+            if "outline" not in generation.checkpoint:
                 generation.progress = 40.0
                 generation.current_step = "Creating conversation outline..."
                 await db.commit()
                 
-                outline = await self._create_conversation_outline(
-                    key_concepts, 
-                    generation.settings
-                )
-                
-                # Step 3: Generate dialogue (60%)
+                async with stage_deadline("outline"):
+                    outline = await self._create_conversation_outline(
+                        key_concepts, 
+                        generation.settings,
+                        self._shared_prefix(await shared_context(), generation.settings)
+                    )
+                await self._save_checkpoint(db, generation, outline=outline)
+            outline = generation.checkpoint["outline"]
+            
+            # Step 3: Generate dialogue (60%)
+            if "dialogue" not in generation.checkpoint:
                 generation.progress = 60.0
                 generation.current_step = "Generating dialogue..."
                 await db.commit()
                 
-                dialogue = await self._generate_dialogue(outline, generation.settings)
-                
-                # Step 4: Synthesize audio (80%)
-                generation.progress = 80.0
-                generation.current_step = "Synthesizing audio..."
-                await db.commit()
-                
-                audio_path = await self._synthesize_audio(dialogue, generation.settings)
-                
-                # Step 5: Finalize (100%)
-                generation.progress = 100.0
-                generation.current_step = "Complete!"
-                generation.status = "completed"
-                generation.audio_url = audio_path
-                generation.duration = await self._get_audio_duration(audio_path)
+                async with stage_deadline("dialogue"):
+                    dialogue = await self._generate_dialogue(
+                        outline, generation.settings, [str(document.id) for document in documents],
+                        self._shared_prefix(await shared_context(), generation.settings)
+                    )
+                    # Tag turns with their source chunks now, so assembly can place citations
+                    dialogue = await attribute_sources(
+                        db, self.document_processor.embedding_model, [document.id for document in documents], dialogue
+                    )
+                await self._save_checkpoint(db, generation, dialogue=dialogue, segments=[], pack_boundaries=[])
+            dialogue = generation.checkpoint["dialogue"]
+            
+            # An edited transcript replaces the dialogue; unchanged turns keep their audio
+            if generation.checkpoint.get("edit") is not None:
+                dialogue = await self._apply_edit(
+                    db, generation, generation.checkpoint["edit"], [document.id for document in documents]
+                )
+            
+            # Step 4: Synthesize audio (80%)
+            generation.progress = 80.0
+            generation.current_step = "Synthesizing audio..."
+            await db.commit()
+            
+            async def record_segment(entry: Dict[str, Any]) -> None:
+                segments = generation.checkpoint.get("segments", []) + [entry]
+                await self._save_checkpoint(db, generation, segments=segments)
+            
+            async with stage_deadline("synthesis"):
+                audio_path, audio_metadata = await self._synthesize_audio(
+                    str(generation.id),
+                    dialogue,
+                    generation.settings,
+                    generation.checkpoint.get("segments", []),
+                    record_segment,
+                    set(generation.checkpoint.get("pack_boundaries", []))
+                )
+            
+            # Step 5: Finalize (100%)
+            # Transcript and citations come from the offsets the assembler recorded
+            transcript = build_transcript(dialogue, audio_metadata["segments"])
+            transcript_path = f"{os.path.splitext(audio_path)[0]}.transcript.json"
+            write_transcript(transcript_path, transcript)
+            await save_citations(db, generation, transcript)
+            
+            generation.progress = 100.0
+            generation.current_step = "Complete!"
+            generation.status = "completed"
+            generation.audio_url = audio_path
+            generation.audio_metadata = audio_metadata
+            generation.transcript_url = transcript_path
+            generation.duration = audio_metadata["duration_ms"] // 1000
+            generation.llm_usage = merge_usage(generation.llm_usage)
+            await db.commit()
+            
+            # Completed runs are found through the fingerprint index from here on
+            await self._release_claim(generation)
+            return True
+    
+    async def _mark_stopped(
+        self,
+        generation_id: str,
+        status: str,
+        message: str,
+        only_pending: bool = False
+    ) -> None:
+        """Record why a generation stopped before completing.
+        
+        With only_pending, a generation that already finished (completed,
+        failed or cancelled) keeps its status.
+        """
+        async with AsyncSessionLocal() as db:
+            generation = await db.get(AudioGeneration, uuid.UUID(generation_id))
+            if generation and not (only_pending and generation.status in ("completed", "failed", "cancelled")):
+                generation.status = status
+                generation.error_message = message
+                generation.llm_usage = merge_usage(generation.llm_usage)
                 await db.commit()
-                
-                return True
-                
-        except Exception as e:
-            print(f"Error generating podcast {generation_id}: {e}")
-            async with AsyncSessionLocal() as db:
-                generation = await db.get(AudioGeneration, generation_id)
-                if generation:
-                    generation.status = "failed"
-                    generation.error_message = str(e)
-                    await db.commit()
-            return False
+                await self._release_claim(generation)
     
-    async def _extract_key_concepts(self, documents: List[Document]) -> List[str]:
-        """Extract key concepts from documents using AI"""
-        if not self.anthropic:
-            return ["Sample concept 1", "Sample concept 2", "Sample concept 3"]
+    async def _release_claim(self, generation: AudioGeneration) -> None:
+        """Free the generation's fingerprint so identical requests start a new run"""
+        if not generation.fingerprint:
+            return
+        try:
+            await release_fingerprint(generation.fingerprint, str(generation.id))
+        except RedisError as e:
+            print(f"Could not release fingerprint for {generation.id}: {e}")
+    
+    async def _save_checkpoint(self, db, generation: AudioGeneration, **stages: Any) -> None:
+        """Persist completed stage outputs, and the tokens spent on them, so a rerun can skip them"""
+        # Assign a new dict; in-place changes to a JSON column aren't tracked
+        generation.checkpoint = {**(generation.checkpoint or {}), **stages}
+        generation.llm_usage = merge_usage(generation.llm_usage)
+        await db.commit()
+    
+    async def _apply_edit(
+        self,
+        db,
+        generation: AudioGeneration,
+        edited: List[Dict[str, str]],
+        document_ids: List[uuid.UUID]
+    ) -> List[Dict[str, Any]]:
+        """Replace the checkpointed dialogue with an edited one.
         
-        # Combine document content
-        combined_content = "\n\n".join([doc.content for doc in documents if doc.content])
+        Turns are diffed against the current dialogue. Unchanged turns keep
+        their sources, and pack boundaries are pinned so their audio is
+        reused; only edited and added turns are attributed and, in
+        synthesis, spoken again.
+        """
+        checkpoint = generation.checkpoint
+        current = checkpoint["dialogue"]
+        origins = diff_turns(current, edited)
+        current_packs = pack_turns(
+            current, self._voice_map(generation.settings), settings.elevenlabs_max_request_chars,
+            TURN_PAUSE_MS, set(checkpoint.get("pack_boundaries", []))
+        )
+        dialogue = carry_over(current, edited, origins)
         
-        # Truncate if too long (Claude has token limits)
-        if len(combined_content) > 50000:
-            combined_content = combined_content[:50000] + "..."
+        changed = [index for index, origin in enumerate(origins) if origin is None]
+        if changed:
+            attributed = await attribute_sources(
+                db, self.document_processor.embedding_model, document_ids,
+                [dialogue[index] for index in changed]
+            )
+            for index, turn in zip(changed, attributed):
+                dialogue[index] = turn
         
-        prompt = f"""
-        Analyze the following documents and extract the 5-10 most important key concepts, themes, or topics that would make for an engaging podcast discussion.
-
-        Documents:
-        {combined_content}
+        await self._save_checkpoint(
+            db, generation,
+            dialogue=dialogue,
+            pack_boundaries=sorted(pack_boundaries(origins, current_packs)),
+            segments=[entry for entry in checkpoint.get("segments", []) if "key" in entry],
+            edit=None
+        )
+        return dialogue
+    
+    def _cacheable(self, text: str) -> Dict[str, Any]:
+        """A text block marking the end of a prompt prefix the provider may cache"""
+        block = {"type": "text", "text": text}
+        if settings.anthropic_prompt_caching:
+            block["cache_control"] = {"type": "ephemeral"}
+        return block
+    
+    def _document_prefix(self, context: str) -> List[Dict[str, Any]]:
+        """The system prompt for stages that only depend on the project's documents"""
+        return [self._cacheable(
+            "You are helping produce a podcast episode about the documents below.\n\n"
+            f"Documents:\n{context}"
+        )]
+    
+    def _shared_prefix(self, context: str, generation_settings: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """The system prompt every persona-aware stage of a generation starts with.
+        
+        It carries the large context the stages have in common, the
+        document excerpts and then the personas, and nothing stage-specific,
+        so after the first request it is read from the prompt cache. The
+        documents end their own cached block, which variants of a project
+        with different personas still share.
+        """
+        persona_descriptions = "\n".join([
+            f"- {p['name']} ({p['role']}): {p['personality']} - Speaking style: {p['speakingStyle']}"
+            for p in generation_settings.get('personas', [])
+        ])
+        return self._document_prefix(context) + [
+            self._cacheable(f"The episode is voiced by these personas:\n{persona_descriptions}")
+        ]
+    
+    async def _extract_key_concepts(self, prefix: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """Extract key concepts from the documents in the shared prefix using AI"""
+        if not self.anthropic:
+            return ["Sample concept 1", "Sample concept 2", "Sample concept 3"]
+        
+        prompt = """
+        Analyze the documents above and extract the 5-10 most important key concepts, themes, or topics that would make for an engaging podcast discussion.
 
         Please provide a list of key concepts, one per line, that capture the essence of these documents.
         """
         
-        try:
-            response = self.anthropic.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            concepts = response.content[0].text.strip().split('\n')
-            return [concept.strip('- ') for concept in concepts if concept.strip()]
-            
-        except Exception as e:
-            print(f"Error extracting concepts: {e}")
-            return ["Document analysis", "Key findings", "Important insights"]
+        response_text = await self._complete(prompt, max_tokens=1000, system=prefix)
+        concepts = response_text.split('\n')
+        return [concept.strip('- ') for concept in concepts if concept.strip()]
     
-    async def _create_conversation_outline(self, concepts: List[str], settings: Dict[str, Any]) -> str:
+    async def _create_conversation_outline(
+        self,
+        concepts: List[str],
+        settings: Dict[str, Any],
+        prefix: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
         """Create a conversation outline"""
         if not self.anthropic:
             return "Sample conversation outline with introduction, main discussion points, and conclusion."
         
-        personas = settings.get('personas', [])
         duration = settings.get('duration', '10-15')
         tone = settings.get('tone', 'balanced')
         
-        persona_descriptions = "\n".join([
-            f"- {p['name']} ({p['role']}): {p['personality']}"
-            for p in personas
-        ])
-        
         concepts_text = "\n".join([f"- {concept}" for concept in concepts])
         
         prompt = f"""
-        Create a detailed conversation outline for a {duration} minute podcast discussion between these personas:
-
-        {persona_descriptions}
+        Create a detailed conversation outline for a {duration} minute podcast discussion between the personas above.
 
         Key concepts to cover:
         {concepts_text}
@@ -162,24 +444,25 @@ class AudioGenerator:
         Make it engaging and ensure each persona has distinct contributions based on their role and personality.
         """
         
-        try:
-            response = self.anthropic.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=2000,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            return response.content[0].text.strip()
-            
-        except Exception as e:
-            print(f"Error creating outline: {e}")
-            return "Sample outline with introduction, discussion, and conclusion."
+        return await self._complete(prompt, max_tokens=2000, system=prefix)
     
-    async def _generate_dialogue(self, outline: str, settings: Dict[str, Any]) -> List[Dict[str, str]]:
-        """Generate actual dialogue from outline"""
+    async def _generate_dialogue(
+        self,
+        outline: str,
+        generation_settings: Dict[str, Any],
+        document_ids: Optional[List[str]] = None,
+        prefix: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, str]]:
+        """Generate actual dialogue from outline.
+        
+        Each top-level outline item is written by its own request, grounded
+        in the chunks most similar to it, with up to
+        settings.dialogue_segment_concurrency requests in flight. The parts
+        are stitched back together in outline order.
+        """
         if not self.anthropic:
             # Return sample dialogue
-            personas = settings.get('personas', [])
+            personas = generation_settings.get('personas', [])
             return [
                 {"speaker": personas[0]['name'], "text": "Welcome to today's discussion! Let's dive into these fascinating topics."},
                 {"speaker": personas[1]['name'], "text": "Absolutely! I'm excited to explore these key insights with you."},
@@ -187,24 +470,80 @@ class AudioGenerator:
                 {"speaker": personas[1]['name'], "text": "That's a great point. What I find particularly interesting is how this connects to broader trends."},
             ]
         
-        personas = settings.get('personas', [])
-        persona_descriptions = "\n".join([
-            f"- {p['name']} ({p['role']}): {p['personality']} - Speaking style: {p['speakingStyle']}"
-            for p in personas
-        ])
+        personas = generation_settings.get('personas', [])
+        segments = split_outline(outline) or [outline]
+        words = segment_word_target(generation_settings.get('duration', '10-15'), len(segments))
+        semaphore = asyncio.Semaphore(settings.dialogue_segment_concurrency)
         
-        prompt = f"""
-        Based on this outline, generate a natural conversation between these personas:
-
-        {persona_descriptions}
+        async def generate(number: int, segment: str) -> List[Dict[str, str]]:
+            async with semaphore:
+                sources = []
+                if document_ids:
+                    sources = await self.document_processor.search_similar_chunks(
+                        segment, document_ids, limit=settings.dialogue_sources_per_segment
+                    )
+                return await self._generate_dialogue_segment(
+                    outline, segments, number, sources, personas, words, prefix
+                )
+        
+        tasks = [asyncio.create_task(generate(number, segment)) for number, segment in enumerate(segments)]
+        try:
+            parts = await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed part cancels the others rather than paying for a dialogue we can't use
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        dialogue = []
+        for number, part in enumerate(parts):
+            dialogue.extend({**turn, "segment": number} for turn in part)
+        return dialogue
+    
+    async def _generate_dialogue_segment(
+        self,
+        outline: str,
+        segments: List[str],
+        number: int,
+        sources: List[Dict[str, Any]],
+        personas: List[Dict[str, Any]],
+        words: int,
+        prefix: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, str]]:
+        """Write the dialogue for one outline segment.
+        
+        The outline and format instructions are the same for every part, so
+        they follow the shared prefix as a second cached block and only the
+        part's own instructions and sources are sent uncached.
+        """
+        source_text = "\n\n".join(
+            f"[{source['document'].original_filename}] {source['chunk'].content[:SOURCE_EXCERPT_CHARS]}"
+            for source in sources
+        ) or "(none)"
+        
+        # Every part is written at once, so agree up front on who opens each one
+        # and only let the first greet and the last sign off
+        opener = personas[number % len(personas)]['name'] if personas else "The host"
+        if len(segments) == 1:
+            position = "This is the whole episode: open with a welcome and close with a sign-off"
+        elif number == 0:
+            position = "This is the start of the episode: open with a welcome, but don't wrap up"
+        elif number == len(segments) - 1:
+            position = "The conversation is already under way: don't greet or re-introduce anyone, and close the episode"
+        else:
+            position = "The conversation is already under way: don't greet, re-introduce anyone or wrap up"
+        
+        shared = f"""
+        Based on this outline, you will write one part of a natural conversation between the personas above.
 
-        Outline:
+        Full outline:
         {outline}
 
         Generate the dialogue in this format:
         SPEAKER_NAME: [dialogue text]
 
-        Requirements:
+        General requirements:
+        - Ground claims in the source material
         - Make it sound natural and conversational
         - Include interruptions, agreements, and disagreements
         - Stay true to each persona's speaking style
@@ -212,104 +551,216 @@ class AudioGenerator:
         - Make it engaging and informative
         """
         
-        try:
-            response = self.anthropic.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4000,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            dialogue_text = response.content[0].text.strip()
-            
-            # Parse dialogue into structured format
-            dialogue = []
-            for line in dialogue_text.split('\n'):
-                if ':' in line:
-                    speaker, text = line.split(':', 1)
+        part = f"""
+        Generate part {number + 1} of {len(segments)}. Write only this part:
+        {segments[number]}
+
+        Source material for this part:
+        {source_text}
+
+        Requirements:
+        - {position}
+        - {opener} speaks first
+        - About {words} words
+        """
+        
+        max_tokens = min(4000, int(words * TOKENS_PER_WORD * 1.5))
+        dialogue_text = await self._complete(
+            [self._cacheable(shared), {"type": "text", "text": part}], max_tokens=max_tokens, system=prefix
+        )
+        return self._parse_dialogue(dialogue_text, [p['name'] for p in personas])
+    
+    def _parse_dialogue(self, dialogue_text: str, persona_names: List[str]) -> List[Dict[str, str]]:
+        """Parse SPEAKER: text lines, keeping only persona turns when personas are known"""
+        dialogue = []
+        for line in dialogue_text.split('\n'):
+            if ':' in line:
+                speaker, text = line.split(':', 1)
+                if persona_names:
+                    speaker = match_speaker(speaker, persona_names)
+                    if not speaker:
+                        continue
+                if text.strip():
                     dialogue.append({
                         "speaker": speaker.strip(),
                         "text": text.strip()
                     })
-            
-            return dialogue
-            
-        except Exception as e:
-            print(f"Error generating dialogue: {e}")
-            return [{"speaker": "Host", "text": "Sample dialogue generated."}]
+        
+        return dialogue
+    
+    async def _complete(
+        self,
+        prompt: Union[str, List[Dict[str, Any]]],
+        max_tokens: int,
+        system: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
+        """Send a single-turn prompt to Claude under the shared rate limit.
+        
+        prompt and system may be lists of text blocks; blocks marked with
+        cache_control end a prefix the provider caches for later requests.
+        The response's token usage is added to the generation's count.
+        """
+        blocks = [{"type": "text", "text": prompt}] if isinstance(prompt, str) else prompt
+        # Rough token estimate: input at ~4 characters per token plus the output cap
+        characters = sum(len(block["text"]) for block in (system or []) + blocks)
+        estimated_tokens = characters // 4 + max_tokens
+        
+        # Cache breakpoints are only accepted by the prompt caching beta in this SDK
+        messages = self.anthropic.beta.prompt_caching.messages if settings.anthropic_prompt_caching \
+            else self.anthropic.messages
+        extra = {"system": system} if system else {}
+        response = await self.rate_limiter.call(
+            "anthropic",
+            settings.anthropic_api_key,
+            estimated_tokens,
+            lambda: messages.create(
+                model=CLAUDE_MODEL,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": blocks}],
+                **extra
+            )
+        )
+        record_usage(response.usage)
+        return response.content[0].text.strip()
+    
+    async def _text_to_speech(self, text: str, voice_id: str) -> bytes:
+        """Synthesize one turn with ElevenLabs under the shared rate limit"""
+        async def request() -> bytes:
+            async with httpx.AsyncClient(base_url=settings.elevenlabs_base_url, timeout=120.0) as client:
+                response = await client.post(
+                    f"/v1/text-to-speech/{voice_id}",
+                    headers={"xi-api-key": settings.elevenlabs_api_key, "Accept": "audio/mpeg"},
+                    json={"text": text, "model_id": TTS_MODEL}
+                )
+                response.raise_for_status()
+                return response.content
+        
+        return await self.rate_limiter.call("elevenlabs", settings.elevenlabs_api_key, len(text), request)
     
-    async def _synthesize_audio(self, dialogue: List[Dict[str, str]], settings: Dict[str, Any]) -> str:
-        """Synthesize audio from dialogue"""
+    async def _synthesize_audio(
+        self,
+        generation_id: str,
+        dialogue: List[Dict[str, str]],
+        generation_settings: Dict[str, Any],
+        completed_segments: List[Dict[str, Any]],
+        on_segment: Callable[[Dict[str, Any]], Awaitable[None]],
+        boundaries: Optional[Set[int]] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Synthesize audio from dialogue, returning the file path and its metadata.
+        
+        Consecutive turns in the same voice are synthesized together, and
+        boundaries start a new request. Each request's audio is kept on disk
+        under a key of its voice and text and reported through on_segment,
+        so requests listed in completed_segments, including those of an
+        earlier version of an edited dialogue, are reused instead of re-sent.
+        """
         if not settings.elevenlabs_api_key:
             # Create a dummy audio file for demo
-            audio_filename = f"demo_audio_{asyncio.current_task().get_name()}.mp3"
-            audio_path = os.path.join(settings.audio_dir, audio_filename)
-            
-            # Create a simple tone as placeholder
-            tone = AudioSegment.sine(440, duration=30000)  # 30 seconds
-            tone.export(audio_path, format="mp3")
-            return audio_path
+            return await self._create_demo_audio(generation_id)
         
-        try:
-            audio_segments = []
-            personas = settings.get('personas', [])
-            
-            # Create voice mapping
-            voice_map = {}
-            for persona in personas:
-                voice_map[persona['name']] = persona.get('voiceId', 'default')
-            
-            for segment in dialogue:
-                speaker = segment['speaker']
-                text = segment['text']
-                voice_id = voice_map.get(speaker, 'default')
-                
-                # Generate audio for this segment
-                audio = generate(
-                    text=text,
-                    voice=voice_id,
-                    model="eleven_monolingual_v1"
-                )
-                
-                # Save to temporary file
-                with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-                    save(audio, temp_file.name)
-                    segment_audio = AudioSegment.from_mp3(temp_file.name)
-                    audio_segments.append(segment_audio)
-                    os.unlink(temp_file.name)
+        segment_paths = []
+        segment_dir = os.path.join(settings.audio_dir, generation_id, "segments")
+        os.makedirs(segment_dir, exist_ok=True)
+        completed = {entry["key"]: entry for entry in completed_segments if "key" in entry}
+        
+        # One request per run of turns in the same voice, up to the provider's limit
+        packs = pack_turns(
+            dialogue, self._voice_map(generation_settings), settings.elevenlabs_max_request_chars,
+            TURN_PAUSE_MS, boundaries
+        )
+        for pack in packs:
+            key = pack_key(pack, TTS_MODEL)
+            entry = completed.get(key)
+            segment_path = entry["path"] if entry else None
+            if not segment_path or not os.path.exists(segment_path):
+                # Generate audio for these turns
+                audio = await self._text_to_speech(pack["text"], pack["voice_id"])
                 
-                # Add pause between speakers
-                pause = AudioSegment.silent(duration=500)  # 0.5 second pause
-                audio_segments.append(pause)
-            
-            # Combine all segments
-            final_audio = sum(audio_segments)
-            
-            # Export final audio
-            audio_filename = f"podcast_{asyncio.current_task().get_name()}.mp3"
-            audio_path = os.path.join(settings.audio_dir, audio_filename)
-            final_audio.export(audio_path, format="mp3")
+                segment_path = os.path.join(segment_dir, f"{key}.mp3")
+                with open(f"{segment_path}.part", 'wb') as f:
+                    f.write(audio)
+                os.replace(f"{segment_path}.part", segment_path)
+                await on_segment({"key": key, "turns": pack["turns"], "path": segment_path})
             
-            return audio_path
-            
-        except Exception as e:
-            print(f"Error synthesizing audio: {e}")
-            # Fallback to demo audio
-            return await self._create_demo_audio()
+            segment_paths.append(segment_path)
+        
+        # Intro and outro clips are encoded once and shared by every generation
+        primary = primary_rendition(settings.audio_renditions)
+        clip_dir = os.path.join(settings.audio_dir, "clips")
+        intro_path = outro_path = None
+        if generation_settings.get('include_intro'):
+            intro_path = await render_clip("intro", settings.intro_audio_path, clip_dir, primary)
+        if generation_settings.get('include_outro'):
+            outro_path = await render_clip("outro", settings.outro_audio_path, clip_dir, primary)
+        
+        # Join packs with the same pause in the audio pool: by MP3 frame copy when
+        # splicing, otherwise decoding once and encoding every rendition
+        base_path = os.path.join(settings.audio_dir, f"podcast_{generation_id}")
+        music = None
+        if generation_settings.get('background_music'):
+            music = {
+                "music_path": settings.background_music_path,
+                "bed_db": settings.background_music_db,
+                "duck_db": settings.background_music_duck_db,
+                "lead_in_ms": settings.background_music_lead_in_ms,
+            }
+        if settings.audio_assembly_mode == "splice" and music is None:
+            assembled = await splice_podcast(segment_paths, TURN_PAUSE_MS, base_path, primary, intro_path, outro_path)
+        else:
+            assembled = await assemble_podcast(
+                segment_paths, TURN_PAUSE_MS, base_path, settings.audio_renditions, music, intro_path, outro_path
+            )
+        
+        # Audio of packs an edit removed is no longer needed; the splice-profile
+        # copies of packs still in use are kept so later splices don't re-encode
+        in_use = set(segment_paths) | {conformed_path(path, primary) for path in segment_paths}
+        for name in os.listdir(segment_dir):
+            if os.path.join(segment_dir, name) not in in_use:
+                os.remove(os.path.join(segment_dir, name))
+        
+        # Record where each turn lands in the final podcast
+        segment_offsets = []
+        for pack, (pack_start, pack_end) in zip(packs, assembled["spans_ms"]):
+            spans = turn_spans(dialogue, pack, pack_start, pack_end, TURN_PAUSE_MS)
+            for index, (start_ms, end_ms) in zip(pack["turns"], spans):
+                segment_offsets.append({
+                    "index": index, "speaker": dialogue[index]["speaker"], "start_ms": start_ms, "end_ms": end_ms
+                })
+        return self._build_audio_metadata(base_path, assembled, segment_offsets)
     
-    async def _create_demo_audio(self) -> str:
+    def _voice_map(self, generation_settings: Dict[str, Any]) -> Dict[str, str]:
+        """Each persona's ElevenLabs voice, by name"""
+        return {
+            persona['name']: persona.get('voiceId', 'default')
+            for persona in generation_settings.get('personas', [])
+        }
+    
+    async def _create_demo_audio(self, generation_id: str) -> Tuple[str, Dict[str, Any]]:
         """Create demo audio file"""
-        audio_filename = f"demo_audio_{asyncio.current_task().get_name()}.mp3"
-        audio_path = os.path.join(settings.audio_dir, audio_filename)
+        base_path = os.path.join(settings.audio_dir, f"demo_audio_{generation_id}")
         
         # Create a simple tone
-        tone = AudioSegment.sine(440, duration=30000)  # 30 seconds
-        tone.export(audio_path, format="mp3")
-        return audio_path
+        tone = await render_tone(440, 30000, base_path, settings.audio_renditions)  # 30 seconds
+        return self._build_audio_metadata(base_path, tone, [])
     
-    async def _get_audio_duration(self, audio_path: str) -> int:
-        """Get audio duration in seconds"""
-        try:
-            audio = AudioSegment.from_mp3(audio_path)
-            return len(audio) // 1000  # Convert to seconds
-        except:
-            return 30  # Default duration
\ No newline at end of file
+    def _build_audio_metadata(
+        self,
+        base_path: str,
+        assembled: Dict[str, Any],
+        segment_offsets: List[Dict[str, Any]]
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Primary file path and a description of the audio from what the encoders were fed.
+        
+        Renditions are listed smallest first so clients can take the first
+        one they can play.
+        """
+        primary = primary_rendition(settings.audio_renditions)
+        return rendition_path(base_path, primary), {
+            "duration_ms": assembled["duration_ms"],
+            "sample_rate": assembled["sample_rate"],
+            "channels": assembled["channels"],
+            "bitrate": int(primary["bitrate"].rstrip("k")) * 1000,
+            "segments": segment_offsets,
+            "renditions": sorted(assembled["renditions"], key=lambda rendition: rendition["size"]),
+            "waveform": assembled["waveform"]
+        }
@@ -0,0 +1,231 @@
+import mmap
+import os
+from typing import Any, Dict, Optional
+
+# Bitrates in kbps indexed by [version_group][layer][index]; version_group is
+# 0 for MPEG-1 and 1 for MPEG-2/2.5.
+_BITRATES = {
+    (0, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (0, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (0, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (1, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (1, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (1, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+# Layer bits in the header are 3 = Layer I, 2 = Layer II, 1 = Layer III
+_LAYERS = {3: 1, 2: 2, 1: 3}
+
+
+def parse_frame_header(header: bytes) -> Optional[Dict[str, int]]:
+    """Decode a 4-byte MPEG audio frame header, or return None if invalid"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = (header[2] >> 4) & 0x0F
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    channel_mode = (header[3] >> 6) & 0x03
+
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    layer = _LAYERS[layer_bits]
+    version_group = 0 if version_bits == 3 else 1
+    bitrate = _BITRATES[(version_group, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][sample_rate_index]
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 3 and version_group == 1:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+    else:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+
+    return {
+        "version": version_bits,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": 1 if channel_mode == 3 else 2,
+        "samples": samples,
+        "length": length,
+    }
+
+
+def _side_info_size(frame: Dict[str, int]) -> int:
+    """Size of the Layer III side information that precedes a Xing/Info tag"""
+    if frame["version"] == 3:
+        return 17 if frame["channels"] == 1 else 32
+    return 9 if frame["channels"] == 1 else 17
+
+
+def _id3v2_size(data) -> int:
+    """Length of a leading ID3v2 tag (header, body and optional footer)"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _read_info_tag(data, offset: int, frame: Dict[str, int]) -> Optional[Dict[str, int]]:
+    """Read the frame count and LAME gapless values from a Xing/Info/VBRI frame"""
+    xing = offset + 4 + _side_info_size(frame)
+    tag = bytes(data[xing:xing + 4])
+    if tag in (b"Xing", b"Info"):
+        flags = int.from_bytes(data[xing + 4:xing + 8], "big")
+        cursor = xing + 8
+        frames = None
+        if flags & 0x1:
+            frames = int.from_bytes(data[cursor:cursor + 4], "big")
+            cursor += 4
+        if flags & 0x2:
+            cursor += 4
+        if flags & 0x4:
+            cursor += 100
+        if flags & 0x8:
+            cursor += 4
+
+        info = {"frames": frames, "vbr": tag == b"Xing", "delay": 0, "padding": 0}
+        # The LAME extension stores encoder delay/padding 21 bytes into the tag
+        if bytes(data[cursor:cursor + 4]) in (b"LAME", b"Lavc", b"Lavf"):
+            gapless = data[cursor + 21:cursor + 24]
+            if len(gapless) == 3:
+                info["delay"] = (gapless[0] << 4) | (gapless[1] >> 4)
+                info["padding"] = ((gapless[1] & 0x0F) << 8) | gapless[2]
+        return info
+
+    vbri = offset + 4 + 32
+    if bytes(data[vbri:vbri + 4]) == b"VBRI":
+        frames = int.from_bytes(data[vbri + 14:vbri + 18], "big")
+        return {"frames": frames, "vbr": True, "delay": 0, "padding": 0}
+
+    return None
+
+
+def _find_first_frame(data, start: int) -> Optional[int]:
+    """Locate the first frame header that is followed by another valid header"""
+    end = len(data) - 4
+    offset = start
+    while offset < end:
+        if data[offset] == 0xFF:
+            frame = parse_frame_header(data[offset:offset + 4])
+            if frame:
+                following = offset + frame["length"]
+                if following >= end or parse_frame_header(data[following:following + 4]):
+                    return offset
+        offset += 1
+    return None
+
+
+def probe_mp3(path: str) -> Optional[Dict[str, Any]]:
+    """Read MP3 stream properties from frame headers without decoding audio.
+
+    Uses the Xing/Info/VBRI frame count when present and otherwise walks the
+    frame headers. Returns None when the file holds no MPEG audio frames.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        first = _find_first_frame(data, _id3v2_size(data))
+        if first is None:
+            return None
+
+        frame = parse_frame_header(data[first:first + 4])
+        info = _read_info_tag(data, first, frame)
+        audio_start = first + frame["length"] if info else first
+        audio_bytes = len(data) - audio_start
+
+        if info and info["frames"]:
+            frames = info["frames"]
+            total_samples = frames * frame["samples"]
+        else:
+            frames = 0
+            total_samples = 0
+            offset = audio_start
+            end = len(data) - 4
+            while offset <= end:
+                header = parse_frame_header(data[offset:offset + 4])
+                if not header:
+                    break
+                frames += 1
+                total_samples += header["samples"]
+                offset += header["length"]
+            audio_bytes = offset - audio_start
+
+    if info:
+        total_samples -= info["delay"] + info["padding"]
+    total_samples = max(total_samples, 0)
+    duration_ms = total_samples * 1000 // frame["sample_rate"]
+
+    if info and info["vbr"] and duration_ms:
+        bitrate = audio_bytes * 8 * 1000 // duration_ms
+    else:
+        bitrate = frame["bitrate"]
+
+    return {
+        "duration_ms": duration_ms,
+        "sample_rate": frame["sample_rate"],
+        "channels": frame["channels"],
+        "bitrate": bitrate,
+        "frames": frames,
+        "encoder_delay": info["delay"] if info else 0,
+        "encoder_padding": info["padding"] if info else 0,
+    }
+
+
+def read_audio_frames(path: str) -> Dict[str, Any]:
+    """Locate the audio frames of an MP3 as one contiguous byte range.
+
+    Tags and the Xing/Info frame are excluded, and so is anything after the
+    last whole frame, so the range can be copied into another stream as is.
+    Raises ValueError if the file has no frames or the stream changes
+    sample rate or channel count part way through.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        first = _find_first_frame(data, _id3v2_size(data))
+        if first is None:
+            raise ValueError(f"{path} holds no MPEG audio frames")
+
+        frame = parse_frame_header(data[first:first + 4])
+        info = _read_info_tag(data, first, frame)
+        start = first + frame["length"] if info else first
+
+        frames = 0
+        offset = start
+        end = len(data) - 4
+        while offset <= end:
+            header = parse_frame_header(data[offset:offset + 4])
+            if not header or offset + header["length"] > len(data):
+                break
+            if (header["version"], header["layer"], header["sample_rate"], header["channels"]) != \
+                    (frame["version"], frame["layer"], frame["sample_rate"], frame["channels"]):
+                raise ValueError(f"{path} changes stream format at byte {offset}")
+            frames += 1
+            offset += header["length"]
+
+    return {
+        "start": start,
+        "end": offset,
+        "frames": frames,
+        "version": frame["version"],
+        "layer": frame["layer"],
+        "sample_rate": frame["sample_rate"],
+        "channels": frame["channels"],
+        "samples_per_frame": frame["samples"],
+        "encoder_delay": info["delay"] if info else 0,
+        "encoder_padding": info["padding"] if info else 0,
+    }
@@ -0,0 +1,263 @@
+import asyncio
+import fcntl
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from ..config import settings
+
+# How long a cancelled job gets to unwind before its process group is killed
+STOP_TIMEOUT = 5.0
+# How often a job waiting for a host-wide slot checks for a free one
+SLOT_POLL_INTERVAL = 0.05
+
+
+class _Stopped(BaseException):
+    """Raised inside a job process when its caller cancels it"""
+
+
+def _stop(signum, frame) -> None:
+    raise _Stopped()
+
+
+def _take_slot(slot_dir: str, slots: int) -> int:
+    """Lock one of the host's job slots, waiting until one is free; returns the locked fd.
+
+    A slot is an flock on a file in slot_dir, so it is freed by the kernel
+    however the job process ends, and is shared by every process on the
+    host, in any container, that mounts the same directory.
+    """
+    os.makedirs(slot_dir, exist_ok=True)
+    while True:
+        for index in range(slots):
+            fd = os.open(os.path.join(slot_dir, f"slot-{index}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        time.sleep(SLOT_POLL_INTERVAL)
+
+
+def _run_job(connection: Connection, fn: Callable, args: Tuple, host_slots: Optional[Tuple[str, int]]) -> None:
+    """Entry point of a job process; sends back when it started, how long it ran and its outcome.
+
+    The process leads its own process group so the ffmpeg processes it
+    starts can be killed along with it. SIGTERM raises inside the job, whose
+    cleanup kills and reaps its ffmpeg processes before the process exits.
+    With host_slots, the job first waits for one of the host's slots.
+    """
+    os.setpgrp()
+    signal.signal(signal.SIGTERM, _stop)
+    slot = None
+    started = time.time()
+    try:
+        if host_slots:
+            slot = _take_slot(*host_slots)
+            started = time.time()
+        outcome = (True, fn(*args))
+    except _Stopped:
+        return
+    except Exception as e:
+        outcome = (False, e)
+    finally:
+        if slot is not None:
+            os.close(slot)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        connection.send((started, time.time() - started, outcome))
+    except Exception:
+        # A result or exception that won't pickle still reaches the caller as text
+        connection.send((started, time.time() - started, (False, RuntimeError(repr(outcome[1])))))
+
+
+def _reap(process: multiprocessing.Process) -> None:
+    """Wait for a terminated job process, then kill whatever is left of its process group.
+
+    Something normally is left only when SIGTERM landed while the job was
+    starting an ffmpeg process it hadn't yet got a handle on, or the job
+    didn't unwind within STOP_TIMEOUT. Returns once the group is gone.
+    """
+    wait([process.sentinel], STOP_TIMEOUT)
+    # Until the process is reaped its pid, and so the group id, can't be reused
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        # SIGTERM arrived before the job had its own group, so it died without starting anything
+        process.kill()
+    process.join()
+
+    deadline = time.monotonic() + STOP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            os.killpg(process.pid, 0)
+        except ProcessLookupError:
+            return
+        time.sleep(0.01)
+
+
+class AudioWorkPool:
+    """Size-capped pool of processes for CPU-bound audio work.
+
+    Decoding, mixing and encoding run in separate processes so they never
+    hold the event loop of the API or a worker. Each job gets a process of
+    its own, so a cancelled or timed-out job can be stopped mid-encode
+    rather than left to finish. At most max_workers jobs run and at most
+    max_queue more wait for one to finish; further callers wait for a slot,
+    which keeps memory bounded when many generations assemble at once.
+
+    Those limits are per pool, and every API and worker process has its own.
+    Given a slot_dir, jobs of all the pools sharing it also take one of
+    host_workers slots before they start, which bounds the audio work on
+    the host however many processes run; the wait counts as queue time.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, slot_dir: Optional[str] = None, host_workers: int = 0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.host_slots = (slot_dir, host_workers) if slot_dir and host_workers > 0 else None
+        self._context: Optional[multiprocessing.context.BaseContext] = None
+        self._processes: Set[multiprocessing.Process] = set()
+        self._slots = asyncio.Semaphore(max_workers + max_queue)
+        self._workers = asyncio.Semaphore(max_workers)
+        self._submitted = 0
+        self._in_flight = 0
+        self._waiting = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._peak_queued = 0
+        self._queue_wait_total = 0.0
+        self._run_total = 0.0
+
+    def _get_context(self, fn: Callable) -> multiprocessing.context.BaseContext:
+        if self._context is None:
+            # forkserver, not fork: the parent has an event loop and client
+            # threads. The server imports the job's module once, so each job
+            # process starts without paying for numpy and friends again.
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload([fn.__module__])
+        return self._context
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """Run a picklable module-level function in a pool process and await its result.
+
+        Cancelling the caller stops the job, running or not: its process is
+        sent SIGTERM, which unwinds the job and kills its ffmpeg processes.
+        The cancellation only propagates once the process has exited, so the
+        caller can then safely remove whatever partial output it wrote.
+        """
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        submitted = time.time()
+        self._submitted += 1
+        self._in_flight += 1
+        self._peak_queued = max(self._peak_queued, self._in_flight - self.max_workers)
+        try:
+            async with self._workers:
+                return await self._run_process(fn, args, submitted)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    async def _run_process(self, fn: Callable, args: Tuple, submitted: float) -> Any:
+        context = self._get_context(fn)
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run_job, args=(sender, fn, args, self.host_slots), daemon=True)
+        try:
+            process.start()
+        finally:
+            sender.close()
+        self._processes.add(process)
+
+        loop = asyncio.get_running_loop()
+        try:
+            readable = loop.create_future()
+            loop.add_reader(receiver.fileno(), lambda: readable.done() or readable.set_result(None))
+            try:
+                await readable
+            finally:
+                loop.remove_reader(receiver.fileno())
+            try:
+                started, run_seconds, (ok, value) = receiver.recv()
+            except EOFError:
+                process.join()
+                self._failed += 1
+                raise RuntimeError(f"Audio job {fn.__name__} exited with code {process.exitcode}")
+            process.join()
+        except asyncio.CancelledError:
+            self._cancelled += 1
+            process.terminate()
+            await self._wait_for(loop.run_in_executor(None, _reap, process))
+            raise
+        finally:
+            receiver.close()
+            self._processes.discard(process)
+
+        if not ok:
+            self._failed += 1
+            raise value
+        self._completed += 1
+        self._queue_wait_total += max(0.0, started - submitted)
+        self._run_total += run_seconds
+        return value
+
+    @staticmethod
+    async def _wait_for(stopped: asyncio.Future) -> None:
+        # Repeated cancellation must not cut this short, or the caller would
+        # clean up after a job that is still writing
+        while not stopped.done():
+            try:
+                await asyncio.shield(stopped)
+            except asyncio.CancelledError:
+                pass
+
+    def metrics(self) -> Dict[str, Any]:
+        """Current queue depth and running totals for this process's pool"""
+        finished = self._completed or 1
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "host_workers": self.host_slots[1] if self.host_slots else None,
+            "running": min(self._in_flight, self.max_workers),
+            "queued": max(0, self._in_flight - self.max_workers),
+            "waiting_for_slot": self._waiting,
+            "peak_queued": self._peak_queued,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "cancelled": self._cancelled,
+            "avg_queue_wait_ms": round(self._queue_wait_total / finished * 1000, 1),
+            "avg_run_ms": round(self._run_total / finished * 1000, 1),
+        }
+
+    def shutdown(self) -> None:
+        """Stop every running job and wait for its processes to exit"""
+        processes = list(self._processes)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            _reap(process)
+        self._processes.clear()
+
+
+_pool: Optional[AudioWorkPool] = None
+
+def get_audio_pool() -> AudioWorkPool:
+    """Shared audio pool for this process"""
+    global _pool
+    if _pool is None:
+        _pool = AudioWorkPool(
+            settings.audio_pool_workers,
+            settings.audio_pool_max_queue,
+            settings.audio_pool_slot_dir or os.path.join(settings.audio_dir, ".pool-slots"),
+            settings.audio_host_workers
+        )
+    return _pool
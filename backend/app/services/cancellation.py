@@ -0,0 +1,87 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from ..config import settings
+from ..redis_client import get_redis
+
+
+class GenerationCancelled(Exception):
+    """Raised inside a pipeline whose generation was cancelled"""
+
+
+class StageTimeout(Exception):
+    """Raised when a single pipeline stage overruns its deadline"""
+
+    def __init__(self, stage: str, seconds: float):
+        super().__init__(f"{stage} stage exceeded its {seconds:g}s deadline")
+        self.stage = stage
+
+
+def _cancel_key(generation_id: str) -> str:
+    return f"voxy:cancel:{generation_id}"
+
+
+async def request_cancellation(generation_id: str) -> None:
+    """Flag a generation so the worker running it stops"""
+    # Expires once no run of this generation could still be alive
+    await get_redis().set(_cancel_key(generation_id), 1, ex=settings.default_generation_timeout * 2)
+
+
+async def clear_cancellation(generation_id: str) -> None:
+    """Drop a stale cancel flag before a generation is requeued"""
+    await get_redis().delete(_cancel_key(generation_id))
+
+
+class CancellationWatcher:
+    """Cancels the enclosing task when its generation is flagged.
+
+    Cancelling the task interrupts whatever it is awaiting, whether that's a
+    provider HTTP call or an encoder subprocess. The CancelledError is turned
+    into GenerationCancelled on exit.
+    """
+
+    def __init__(self, generation_id: str):
+        self.generation_id = generation_id
+        self.triggered = False
+        self._task: Optional[asyncio.Task] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "CancellationWatcher":
+        self._task = asyncio.current_task()
+        self._watcher = asyncio.create_task(self._watch())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        self._watcher.cancel()
+        if self.triggered and exc_type is asyncio.CancelledError:
+            self._task.uncancel()
+            raise GenerationCancelled(f"Generation {self.generation_id} was cancelled")
+        return False
+
+    async def _watch(self) -> None:
+        key = _cancel_key(self.generation_id)
+        while True:
+            await asyncio.sleep(settings.cancellation_poll_interval)
+            try:
+                requested = await get_redis().exists(key)
+            except RedisError as e:
+                print(f"Could not check cancellation for {self.generation_id}: {e}")
+                continue
+            if requested:
+                self.triggered = True
+                self._task.cancel()
+                return
+
+
+@asynccontextmanager
+async def stage_deadline(stage: str):
+    """Bound one pipeline stage by its configured timeout"""
+    seconds = settings.generation_stage_timeouts.get(stage)
+    try:
+        async with asyncio.timeout(seconds):
+            yield
+    except TimeoutError:
+        raise StageTimeout(stage, seconds) from None
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import uuid
+from typing import Any, Dict, List
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import AudioGeneration, Citation, DocumentChunk
+
+# A turn cites up to this many chunks, and only ones at least this similar
+CITATIONS_PER_TURN = 2
+MIN_SIMILARITY = 0.35
+SOURCE_EXCERPT_CHARS = 500
+
+
+async def attribute_sources(
+    db: AsyncSession,
+    embedding_model: Any,
+    document_ids: List[uuid.UUID],
+    dialogue: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Tag each dialogue turn with the ids of the chunks it draws on.
+
+    Only chunks of document_ids, the documents the dialogue was written
+    from, are considered. pgvector ranks them in the database, so each turn
+    reads back CITATIONS_PER_TURN rows however large the documents are.
+    """
+    if not dialogue or not document_ids:
+        return [{**turn, "source_chunk_ids": []} for turn in dialogue]
+
+    # Encoding is CPU-bound; keep it off the event loop
+    turn_vectors = await asyncio.to_thread(embedding_model.encode, [turn["text"] for turn in dialogue])
+
+    attributed = []
+    for turn, vector in zip(dialogue, turn_vectors):
+        distance = DocumentChunk.embedding.cosine_distance(vector)
+        result = await db.execute(
+            select(DocumentChunk.id, distance)
+            .where(DocumentChunk.document_id.in_(document_ids), DocumentChunk.embedding.isnot(None))
+            .order_by(distance)
+            .limit(CITATIONS_PER_TURN)
+        )
+        attributed.append({
+            **turn,
+            "source_chunk_ids": [str(chunk_id) for chunk_id, chunk_distance in result.all()
+                                 if 1 - chunk_distance >= MIN_SIMILARITY]
+        })
+    return attributed
+
+
+def build_transcript(dialogue: List[Dict[str, Any]], segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Join each turn with where the assembler placed it, ordered by start time"""
+    turns = []
+    for segment in segments:
+        turn = dialogue[segment["index"]]
+        turns.append({
+            "index": segment["index"],
+            "speaker": turn["speaker"],
+            "text": turn["text"],
+            "start_ms": segment["start_ms"],
+            "end_ms": segment["end_ms"],
+            "source_chunk_ids": turn.get("source_chunk_ids", []),
+        })
+    return sorted(turns, key=lambda turn: turn["start_ms"])
+
+
+def write_transcript(path: str, turns: List[Dict[str, Any]]) -> None:
+    """Write the transcript sidecar atomically"""
+    partial_path = f"{path}.part"
+    with open(partial_path, "w", encoding="utf-8") as f:
+        json.dump({"turns": turns}, f, ensure_ascii=False)
+    os.replace(partial_path, path)
+
+
+async def save_citations(db: AsyncSession, generation: AudioGeneration, turns: List[Dict[str, Any]]) -> int:
+    """Replace the generation's citations with one row per cited chunk per turn"""
+    await db.execute(delete(Citation).where(Citation.generation_id == generation.id))
+
+    chunk_ids = {uuid.UUID(chunk_id) for turn in turns for chunk_id in turn["source_chunk_ids"]}
+    chunks = {}
+    if chunk_ids:
+        result = await db.execute(
+            select(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.content, DocumentChunk.chunk_metadata)
+            .where(DocumentChunk.id.in_(chunk_ids))
+        )
+        chunks = {str(row.id): row for row in result.all()}
+
+    count = 0
+    for turn in turns:
+        for chunk_id in turn["source_chunk_ids"]:
+            chunk = chunks.get(chunk_id)
+            if not chunk:
+                continue
+            db.add(Citation(
+                generation_id=generation.id,
+                document_id=chunk.document_id,
+                timestamp=turn["start_ms"] / 1000,
+                end_timestamp=turn["end_ms"] / 1000,
+                text=turn["text"],
+                source_text=chunk.content[:SOURCE_EXCERPT_CHARS],
+                page_number=(chunk.chunk_metadata or {}).get("page")
+            ))
+            count += 1
+    return count
@@ -0,0 +1,150 @@
+import asyncio
+import uuid
+from typing import List, Sequence
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Document, DocumentChunk
+
+CHARS_PER_TOKEN = 4  # same rough estimate the rate limiter is charged with
+EXCERPT_TOKENS = 300  # per selected chunk, so the budget covers more topics
+KMEANS_ITERATIONS = 25
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over unit vectors, returning each vector's cluster label.
+
+    Seeded with k-means++ from a fixed seed, so a project's clusters (and
+    the prompt built from them) don't change between runs.
+    """
+    rng = np.random.default_rng(seed)
+    count = len(vectors)
+    centroids = np.empty((k, vectors.shape[1]), dtype=vectors.dtype)
+    centroids[0] = vectors[rng.integers(count)]
+    # Cosine distance to the nearest centroid picked so far
+    distance = 1 - vectors @ centroids[0]
+    for i in range(1, k):
+        weights = np.maximum(distance, 0) ** 2
+        total = weights.sum()
+        choice = rng.choice(count, p=weights / total) if total > 0 else rng.integers(count)
+        centroids[i] = vectors[choice]
+        distance = np.minimum(distance, 1 - vectors @ centroids[i])
+
+    labels = np.full(count, -1)
+    for _ in range(iterations):
+        new_labels = (vectors @ centroids.T).argmax(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        # Sum each cluster's members in one pass; empty clusters keep their centroid
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        occupied = np.bincount(labels, minlength=k) > 0
+        centroids[occupied] = _normalize(sums[occupied])
+    return labels
+
+
+def representatives(vectors: np.ndarray, k: int) -> List[int]:
+    """One vector per cluster, the closest to its centroid, largest clusters first"""
+    vectors = _normalize(vectors)
+    if k >= len(vectors):
+        return list(range(len(vectors)))
+
+    labels = kmeans(vectors, k)
+    picked = []
+    for label in np.argsort(-np.bincount(labels, minlength=k), kind="stable"):
+        members = np.flatnonzero(labels == label)
+        if len(members) == 0:
+            continue
+        centroid = _normalize(vectors[members].sum(axis=0, keepdims=True))[0]
+        picked.append(int(members[np.argmax(vectors[members] @ centroid)]))
+    return picked
+
+
+def _excerpt(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(" ", 1)[0]
+    return f"{cut}..."
+
+
+async def _even_truncation(db: AsyncSession, documents: Sequence[Document], token_budget: int) -> str:
+    """The budget split evenly across documents, for projects without embeddings"""
+    # Content is deferred on Document, so it is only loaded here
+    result = await db.execute(
+        select(Document.id, Document.content).where(Document.id.in_([doc.id for doc in documents]))
+    )
+    by_id = dict(result.all())
+    contents = [by_id[doc.id] for doc in documents if by_id.get(doc.id)]
+    if not contents:
+        return ""
+    per_document = token_budget * CHARS_PER_TOKEN // len(contents)
+    return "\n\n".join(_excerpt(content, per_document) for content in contents)
+
+
+async def select_context(
+    db: AsyncSession,
+    project_id: uuid.UUID,
+    documents: Sequence[Document],
+    token_budget: int
+) -> str:
+    """Representative excerpts of a project's documents that fit in token_budget.
+
+    Chunk embeddings are clustered into as many topics as the budget has
+    room for, and the chunk nearest each topic's centre is used, so every
+    part of a large project is represented rather than just its first
+    documents. Only the chosen chunks' text is loaded.
+    """
+    result = await db.execute(
+        select(DocumentChunk.id, DocumentChunk.embedding)
+        .join(Document)
+        .where(Document.project_id == project_id, Document.status == "ready")
+        .order_by(DocumentChunk.document_id, DocumentChunk.chunk_index)
+    )
+    rows = [(chunk_id, embedding) for chunk_id, embedding in result.all() if embedding is not None]
+    if not rows:
+        return await _even_truncation(db, documents, token_budget)
+
+    k = max(1, token_budget // EXCERPT_TOKENS)
+    vectors = np.array([embedding for _, embedding in rows], dtype=np.float32)
+    # Clustering is CPU-bound; keep it off the event loop
+    picked = await asyncio.to_thread(representatives, vectors, k)
+    picked_ids = [rows[i][0] for i in picked]
+
+    result = await db.execute(
+        select(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.chunk_index, DocumentChunk.content)
+        .where(DocumentChunk.id.in_(picked_ids))
+    )
+    chunks = {row.id: row for row in result.all()}
+
+    # Fill the budget from the largest topics down, then restore reading order
+    selected = []
+    remaining = token_budget * CHARS_PER_TOKEN
+    for chunk_id in picked_ids:
+        chunk = chunks.get(chunk_id)
+        if remaining <= 0:
+            break
+        if not chunk:
+            continue
+        text = _excerpt(chunk.content, min(EXCERPT_TOKENS * CHARS_PER_TOKEN, remaining))
+        selected.append((chunk, text))
+        remaining -= len(text)
+
+    names = {doc.id: doc.original_filename for doc in documents}
+    positions = {doc.id: position for position, doc in enumerate(documents)}
+    reading_order = lambda item: (positions.get(item[0].document_id, len(positions)), item[0].chunk_index)
+    sections = []
+    previous_document = None
+    for chunk, text in sorted(selected, key=reading_order):
+        if chunk.document_id != previous_document:
+            sections.append(f"[{names.get(chunk.document_id, 'Document')}]")
+            previous_document = chunk.document_id
+        sections.append(text)
+    return "\n\n".join(sections)
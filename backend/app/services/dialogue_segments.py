@@ -0,0 +1,49 @@
+import re
+from typing import Dict, List, Optional
+
+# Spoken words per minute, and Claude tokens per English word
+WORDS_PER_MINUTE = 150
+TOKENS_PER_WORD = 1.4
+DURATION_MINUTES = {"5-10": 10, "10-15": 15, "15-20": 20}
+
+_TOP_LEVEL_ITEM = re.compile(r"^(?:\d+[.)]|#+)\s+\S")
+_SPEAKER_MARKUP = re.compile(r"[*_#\[\]]")
+
+
+def split_outline(outline: str) -> List[str]:
+    """Split an outline into its top-level items, each with its sub-points.
+
+    Anything before the first numbered item (usually a title) is dropped.
+    An outline with no numbered items is one segment.
+    """
+    segments: List[List[str]] = []
+    for line in outline.splitlines():
+        if _TOP_LEVEL_ITEM.match(line):
+            segments.append([line.strip()])
+        elif segments and line.strip():
+            segments[-1].append(line.rstrip())
+    if not segments:
+        return [outline.strip()] if outline.strip() else []
+    return ["\n".join(lines) for lines in segments]
+
+
+def segment_word_target(duration: str, segment_count: int) -> int:
+    """Words of dialogue each segment should have for the podcast to run its length"""
+    minutes = DURATION_MINUTES.get(duration, 15)
+    return max(100, minutes * WORDS_PER_MINUTE // max(1, segment_count))
+
+
+def match_speaker(name: str, persona_names: List[str]) -> Optional[str]:
+    """The persona a dialogue label refers to, ignoring case and markdown.
+
+    "**dr. smith**" and "Smith" both match "Dr. Smith". Returns None when
+    the label isn't a persona, such as a section heading the model wrote.
+    """
+    label = _SPEAKER_MARKUP.sub("", name).strip().lower()
+    if not label:
+        return None
+    by_name: Dict[str, str] = {persona.lower(): persona for persona in persona_names}
+    if label in by_name:
+        return by_name[label]
+    partial = [persona for lowered, persona in by_name.items() if label in lowered.split() or lowered in label]
+    return partial[0] if len(partial) == 1 else None
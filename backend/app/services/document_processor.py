@@ -1,4 +1,6 @@
 import asyncio
+import hashlib
+import uuid
 import aiofiles
 from typing import List, Dict, Any
 import PyPDF2
@@ -43,6 +45,7 @@ class DocumentProcessor:
                 
                 # Store extracted content
                 document.content = text_content
+                document.content_hash = hashlib.sha256(text_content.encode()).hexdigest()
                 
                 # Create chunks
                 chunks = self._create_chunks(text_content)
@@ -56,7 +59,7 @@ class DocumentProcessor:
                         content=chunk_text,
                         chunk_index=i,
                         embedding=embedding,
-                        metadata={"chunk_size": len(chunk_text)}
+                        chunk_metadata={"chunk_size": len(chunk_text)}
                     )
                     db.add(chunk)
                 
@@ -152,27 +155,28 @@ class DocumentProcessor:
         return chunks
     
     async def search_similar_chunks(self, query: str, document_ids: List[str], limit: int = 10) -> List[Dict[str, Any]]:
-    """Search for similar chunks using pgvector"""
-    query_embedding = self.embedding_model.encode(query)
+        """Search for similar chunks using pgvector"""
+        # Encoding is CPU-bound; keep it off the event loop
+        query_embedding = await asyncio.to_thread(self.embedding_model.encode, query)
 
-    async with AsyncSessionLocal() as db:
-        # Perform an efficient vector similarity search
-        result = await db.execute(
-            select(DocumentChunk, Document)
-            .join(Document)
-            .where(Document.id.in_(document_ids))
-            .order_by(DocumentChunk.embedding.cosine_distance(query_embedding))
-            .limit(limit)
-        )
+        async with AsyncSessionLocal() as db:
+            # Perform an efficient vector similarity search
+            result = await db.execute(
+                select(DocumentChunk, Document)
+                .join(Document)
+                .where(Document.id.in_([uuid.UUID(str(document_id)) for document_id in document_ids]))
+                .order_by(DocumentChunk.embedding.cosine_distance(query_embedding))
+                .limit(limit)
+            )
         
-        similar_chunks = result.all()
+            similar_chunks = result.all()
 
-        # Formatting the response
-        response = [
-            {
-                "chunk": chunk,
-                "document": doc,
-            }
-            for chunk, doc in similar_chunks
-        ]
-        return response
+            # Formatting the response
+            response = [
+                {
+                    "chunk": chunk,
+                    "document": doc,
+                }
+                for chunk, doc in similar_chunks
+            ]
+            return response
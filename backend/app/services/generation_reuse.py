@@ -0,0 +1,110 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..models import AudioGeneration, Document
+from ..redis_client import get_redis
+from ..schemas import GenerationSettings
+
+# Generations in these states can stand in for an identical new request
+REUSABLE_STATUSES = ("queued", "processing", "completed")
+
+# Release the in-flight claim only if it still belongs to this generation
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Persona fields the pipeline reads; id, avatar and the like don't reach the audio
+PERSONA_FIELDS = ("name", "role", "personality", "speakingStyle", "voiceId")
+
+
+def _collapse(text: Any) -> str:
+    return " ".join(str(text).split())
+
+
+def normalize_settings(generation_settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop differences in settings that can't change the generated podcast.
+
+    Settings are filled in from the schema, so leaving a field out and
+    sending its default match. Choice fields and focus areas ignore case
+    and whitespace, focus areas their order too. Persona text only has its
+    whitespace collapsed: names are spoken as written, voice ids are case
+    sensitive and the first persona opens the show.
+    """
+    values = {
+        key: value.strip().lower() if isinstance(value, str) else value
+        for key, value in generation_settings.items()
+    }
+    normalized = GenerationSettings(**values).dict()
+    normalized["focus_areas"] = sorted({_collapse(area).lower() for area in normalized["focus_areas"] if area.strip()})
+    normalized["personas"] = [
+        {field: _collapse(persona[field]) for field in PERSONA_FIELDS if persona.get(field) is not None}
+        for persona in normalized["personas"]
+    ]
+    return normalized
+
+
+async def generation_fingerprint(db: AsyncSession, project_id: uuid.UUID, generation_settings: Dict[str, Any]) -> str:
+    """Hash everything a generation's output depends on: its sources and its settings"""
+    result = await db.execute(
+        select(Document.id, Document.content_hash)
+        .where(Document.project_id == project_id, Document.status == "ready")
+    )
+    # Rows processed before content hashes existed fall back to their id
+    content_hashes = sorted(content_hash or str(document_id) for document_id, content_hash in result.all())
+
+    payload = json.dumps({
+        "project_id": str(project_id),
+        "documents": content_hashes,
+        "settings": normalize_settings(generation_settings),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def find_reusable_generation(db: AsyncSession, fingerprint: str) -> Optional[AudioGeneration]:
+    """Latest generation with the same fingerprint that is running or finished"""
+    result = await db.execute(
+        select(AudioGeneration)
+        .where(
+            AudioGeneration.fingerprint == fingerprint,
+            AudioGeneration.status.in_(REUSABLE_STATUSES)
+        )
+        .order_by(AudioGeneration.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+def _claim_key(fingerprint: str) -> str:
+    return f"voxy:inflight:{fingerprint}"
+
+
+async def claim_fingerprint(fingerprint: str, generation_id: str) -> Optional[str]:
+    """Atomically make a generation the one run for a fingerprint.
+
+    Returns None when the claim was won, otherwise the id of the generation
+    that already holds it.
+    """
+    key = _claim_key(fingerprint)
+    # Retry once in case the holder's claim expired between SET and GET
+    for _ in range(2):
+        claimed = await get_redis().set(key, generation_id, nx=True, ex=settings.default_generation_timeout * 2)
+        if claimed:
+            return None
+        holder = await get_redis().get(key)
+        if holder:
+            return holder.decode()
+    return None
+
+
+async def release_fingerprint(fingerprint: str, generation_id: str) -> None:
+    """Let new requests start their own run once this one has stopped"""
+    await get_redis().eval(_RELEASE_SCRIPT, 1, _claim_key(fingerprint), generation_id)
@@ -0,0 +1,33 @@
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# Anthropic usage fields: uncached input, input written to the prompt cache,
+# input read from it, and output
+USAGE_FIELDS = ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "output_tokens")
+
+_pending: ContextVar[Optional[Dict[str, int]]] = ContextVar("llm_usage", default=None)
+
+
+def track_usage() -> None:
+    """Start counting token usage in this task and any tasks it starts"""
+    _pending.set(dict.fromkeys(USAGE_FIELDS, 0))
+
+
+def record_usage(usage: Any) -> None:
+    """Add a response's usage to the running count, if one is being kept"""
+    counts = _pending.get()
+    if counts is None or usage is None:
+        return
+    for field in USAGE_FIELDS:
+        counts[field] += getattr(usage, field, None) or 0
+
+
+def merge_usage(recorded: Optional[Dict[str, int]]) -> Dict[str, int]:
+    """recorded plus everything counted since the last merge, which is then reset"""
+    merged = {field: (recorded or {}).get(field, 0) for field in USAGE_FIELDS}
+    counts = _pending.get()
+    if counts:
+        for field in USAGE_FIELDS:
+            merged[field] += counts[field]
+            counts[field] = 0
+    return merged
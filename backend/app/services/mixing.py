@@ -0,0 +1,159 @@
+import subprocess
+from typing import Optional
+
+import numpy as np
+from pydub import AudioSegment
+
+WINDOW_MS = 10  # ducking envelope resolution
+
+
+def _db_to_gain(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+class LoopingMusic:
+    """Endless 16-bit PCM from a music file, decoded on demand.
+
+    ffmpeg loops the file itself and we read only as many bytes as the
+    voice track needs, so memory doesn't depend on either length.
+    """
+
+    def __init__(self, path: str, sample_rate: int, channels: int):
+        self.process = subprocess.Popen(
+            [
+                AudioSegment.converter, "-hide_banner", "-loglevel", "error",
+                "-stream_loop", "-1", "-i", path,
+                "-f", "s16le", "-acodec", "pcm_s16le",
+                "-ar", str(sample_rate), "-ac", str(channels),
+                "-"
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+
+    def read(self, size: int) -> np.ndarray:
+        data = b""
+        while len(data) < size:
+            more = self.process.stdout.read(size - len(data))
+            if not more:
+                raise RuntimeError("Background music could not be decoded")
+            data += more
+        return np.frombuffer(data, dtype="<i2")
+
+    def close(self) -> None:
+        self.process.kill()
+        self.process.wait()
+
+
+class GeneratedPad:
+    """A soft sustained chord, for when no music file is configured"""
+
+    FREQUENCIES = (110.0, 164.81, 220.0, 277.18)  # A2, E3, A3, C#4
+
+    def __init__(self, sample_rate: int, channels: int):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.position = 0
+
+    def read(self, size: int) -> np.ndarray:
+        frames = size // (2 * self.channels)
+        t = (self.position + np.arange(frames)) / self.sample_rate
+        self.position += frames
+        # Slow swell so the bed doesn't sound like a test tone
+        swell = 0.75 + 0.25 * np.sin(2 * np.pi * 0.05 * t)
+        wave = sum(np.sin(2 * np.pi * f * t) for f in self.FREQUENCIES) / len(self.FREQUENCIES)
+        samples = (wave * swell * 32767 * 0.5).astype("<i2")
+        return np.repeat(samples, self.channels)
+
+    def close(self) -> None:
+        pass
+
+
+class DuckingMixer:
+    """Mixes a music bed under streaming voice PCM, ducking it while anyone speaks.
+
+    Each chunk is handled as one vectorized block: a windowed RMS envelope
+    of the voice picks a target music gain per window, the targets are
+    smoothed with attack/release time constants, expanded to per-sample
+    gains and applied. Only the current chunk is ever in memory, so the
+    cost is linear in podcast length and memory is flat.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        channels: int,
+        music_path: Optional[str] = None,
+        bed_db: float = -20.0,
+        duck_db: float = -32.0,
+        threshold_db: float = -45.0,
+        attack_ms: float = 40.0,
+        release_ms: float = 400.0
+    ):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.music = LoopingMusic(music_path, sample_rate, channels) if music_path else GeneratedPad(sample_rate, channels)
+        self.bed_gain = _db_to_gain(bed_db)
+        self.duck_gain = _db_to_gain(duck_db)
+        self.threshold = _db_to_gain(threshold_db) * 32768
+        self.window = max(1, sample_rate * WINDOW_MS // 1000)
+        self.attack = 1 - np.exp(-WINDOW_MS / attack_ms)
+        self.release = 1 - np.exp(-WINDOW_MS / release_ms)
+        # Windows smoothed at once: the decay product over a block stays above e^-300, clear of underflow
+        self.block = max(1, int(300 * min(attack_ms, release_ms) / WINDOW_MS))
+        self.gain = self.bed_gain
+
+    def _window_gains(self, voice: np.ndarray) -> np.ndarray:
+        """Smoothed music gain at the end of each window of the chunk"""
+        frames = len(voice)
+        windows = -(-frames // self.window)
+        padded = np.zeros((windows * self.window, self.channels), dtype=np.float32)
+        padded[:frames] = voice
+        rms = np.sqrt((padded.reshape(windows, -1) ** 2).mean(axis=1))
+        targets = np.where(rms > self.threshold, self.duck_gain, self.bed_gain)
+        return self._smooth(targets).astype(np.float32)
+
+    def _smooth(self, targets: np.ndarray) -> np.ndarray:
+        """One-pole smoothing towards each window's target, faster going down (attack) than back up (release).
+
+        The gain always lies between the bed and duck levels, so the target
+        alone says which way it is heading and which time constant applies.
+        That makes gain[i] = decay[i] * gain[i - 1] + (1 - decay[i]) * target[i]
+        a linear recurrence, solved a block at a time with cumulative
+        products instead of a Python loop per window.
+        """
+        heading_down = targets < max(self.bed_gain, self.duck_gain)
+        decay = np.where(heading_down, 1 - self.attack, 1 - self.release)
+        drive = (1 - decay) * targets
+        gains = np.empty(len(targets))
+        gain = self.gain
+        for start in range(0, len(targets), self.block):
+            block = slice(start, start + self.block)
+            # gain[i] = P[i] * (gain + sum over j <= i of drive[j] / P[j]), P the running product of decay
+            products = np.cumprod(decay[block])
+            gains[block] = products * (gain + np.cumsum(drive[block] / products))
+            gain = gains[block][-1]
+        return gains
+
+    def mix(self, pcm: bytes, fade_out: bool = False) -> bytes:
+        voice = np.frombuffer(pcm, dtype="<i2").reshape(-1, self.channels)
+        frames = len(voice)
+        if frames == 0:
+            return pcm
+
+        gains = self._window_gains(voice)
+        # Interpolate from the previous chunk's last gain so there are no steps at boundaries
+        points = np.concatenate([[self.gain], gains])
+        positions = np.concatenate([[0], np.minimum(np.arange(1, len(gains) + 1) * self.window, frames)])
+        per_sample = np.interp(np.arange(frames), positions, points).astype(np.float32)
+        self.gain = float(gains[-1])
+        if fade_out:
+            per_sample *= np.linspace(1.0, 0.0, frames, dtype=np.float32)
+
+        music = self.music.read(frames * self.channels * 2).reshape(-1, self.channels)
+        mixed = voice.astype(np.float32) + music.astype(np.float32) * per_sample[:, None]
+        return np.clip(mixed, -32768, 32767).astype("<i2").tobytes()
+
+    def close(self) -> None:
+        self.music.close()
@@ -0,0 +1,168 @@
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+from .audio_metadata import _BITRATES, _SAMPLE_RATES, parse_frame_header, read_audio_frames
+
+MPEG1 = 3  # version bits
+COPY_CHUNK = 1024 * 1024
+
+
+def frame_header(sample_rate: int, channels: int, bitrate: int) -> bytes:
+    """An unpadded MPEG-1 Layer III frame header without CRC"""
+    bitrate_index = _BITRATES[(0, 3)].index(bitrate // 1000)
+    sample_rate_index = _SAMPLE_RATES[MPEG1].index(sample_rate)
+    channel_mode = 3 if channels == 1 else 0
+    return bytes([0xFF, 0xFB, (bitrate_index << 4) | (sample_rate_index << 2), channel_mode << 6])
+
+
+def silent_frame(sample_rate: int, channels: int, bitrate: int) -> bytes:
+    """A frame whose side information is all zeros, which decodes to digital silence.
+
+    It has no encoder delay or padding and doesn't borrow from the bit
+    reservoir, so it can sit between frames from any encoder.
+    """
+    header = frame_header(sample_rate, channels, bitrate)
+    return header + bytes(parse_frame_header(header)["length"] - len(header))
+
+
+def _crc16(data: bytes, crc: int = 0) -> int:
+    """CRC-16/ARC, as used by the LAME tag"""
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def info_frame(
+    sample_rate: int,
+    channels: int,
+    bitrate: int,
+    frames: int,
+    total_bytes: int,
+    delay: int,
+    padding: int
+) -> bytes:
+    """A CBR Info frame with a LAME tag carrying the stream's gapless trim.
+
+    Players that honour the tag drop `delay` samples from the start and
+    `padding` from the end; the rest still play it as a silent frame.
+    """
+    header = frame_header(sample_rate, channels, bitrate)
+    length = parse_frame_header(header)["length"]
+    side_info = 17 if channels == 1 else 32
+
+    toc = bytes(i * 256 // 100 for i in range(100))
+    # Frames, bytes, TOC and quality fields present, as LAME writes them
+    xing = b"Info" + struct.pack(">III", 0x0F, frames, total_bytes) + toc + struct.pack(">I", 0)
+    lame = (
+        b"LAME3.100"
+        + bytes([0x01])  # tag revision 0, CBR
+        + bytes([0])  # lowpass unknown
+        + bytes(4 + 2 + 2)  # peak and replay gains unknown
+        + bytes([0])  # encoding flags
+        + bytes([min(bitrate // 1000, 255)])
+        + bytes([delay >> 4, ((delay & 0x0F) << 4) | (padding >> 8), padding & 0xFF])
+        + bytes([0, 0]) + bytes(2)  # misc, MP3 gain, preset
+        + struct.pack(">I", total_bytes)
+        + bytes(2)  # music CRC not computed
+    )
+    frame = bytearray(header + bytes(side_info) + xing + lame)
+    frame += struct.pack(">H", _crc16(bytes(frame)))
+    frame += bytes(length - len(frame))
+    return bytes(frame)
+
+
+class MP3Splicer:
+    """Joins MP3 clips of one profile by copying their frames, with no decode or encode.
+
+    Every clip keeps its own encoder delay and padding, which decode as a
+    few milliseconds of silence. Silence requested between clips is made of
+    silent frames and shortened by those amounts, so gaps come out at the
+    requested length to within half a frame and rounding never accumulates.
+    The first clip's delay and the last clip's padding are written to a
+    LAME tag so gapless players trim them. Positions are in samples,
+    measured from that trimmed start.
+    """
+
+    def __init__(self, path: str, sample_rate: int, channels: int, bitrate: int):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.bitrate = bitrate
+        self.samples_per_frame = 1152
+        self.silence = silent_frame(sample_rate, channels, bitrate)
+        self.frames = 0
+        self.delay: Optional[int] = None
+        self.tail_padding = 0
+        self.pending_silence = 0
+        self.rounding_error = 0
+        self.file = open(path, "wb")
+        # Placeholder until the totals are known
+        self.file.write(bytes(len(self.silence)))
+
+    def _write_silence(self, samples: int, neighbours: int) -> None:
+        # Carry each gap's rounding error into the next so they cancel out
+        wanted = samples - neighbours + self.rounding_error
+        count = max(0, round(wanted / self.samples_per_frame))
+        self.rounding_error = wanted - count * self.samples_per_frame
+        if count:
+            if self.delay is None:
+                self.delay = 0
+            self.file.write(self.silence * count)
+            self.frames += count
+            self.tail_padding = 0
+
+    def add_silence(self, duration_ms: int) -> None:
+        self.pending_silence += self.sample_rate * duration_ms // 1000
+
+    def add_clip(self, path: str) -> Tuple[int, int]:
+        """Append a clip, returning where its audio starts and ends"""
+        clip = read_audio_frames(path)
+        if (clip["version"], clip["layer"], clip["sample_rate"], clip["channels"]) != \
+                (MPEG1, 3, self.sample_rate, self.channels):
+            raise ValueError(f"{path} is not {self.sample_rate} Hz, {self.channels} channel MPEG-1 Layer III")
+
+        delay, padding = clip["encoder_delay"], clip["encoder_padding"]
+        if self.pending_silence:
+            self._write_silence(self.pending_silence, self.tail_padding + delay)
+            self.pending_silence = 0
+        if self.delay is None:
+            self.delay = delay
+
+        raw_start = self.frames * self.samples_per_frame
+        with open(path, "rb") as source:
+            source.seek(clip["start"])
+            remaining = clip["end"] - clip["start"]
+            while remaining > 0:
+                chunk = source.read(min(COPY_CHUNK, remaining))
+                if not chunk:
+                    raise ValueError(f"{path} shrank while being spliced")
+                self.file.write(chunk)
+                remaining -= len(chunk)
+        self.frames += clip["frames"]
+        self.tail_padding = padding
+
+        raw_end = self.frames * self.samples_per_frame - padding
+        return raw_start + delay - self.delay, raw_end - self.delay
+
+    def finish(self) -> Dict[str, Any]:
+        """Write the Info frame and close, returning the playable length in samples"""
+        if self.pending_silence:
+            self._write_silence(self.pending_silence, self.tail_padding)
+            self.pending_silence = 0
+        delay = self.delay or 0
+        total_bytes = self.file.tell()
+        self.file.seek(0)
+        self.file.write(info_frame(
+            self.sample_rate, self.channels, self.bitrate,
+            self.frames, total_bytes, delay, self.tail_padding
+        ))
+        self.file.close()
+        return {
+            "samples": max(0, self.frames * self.samples_per_frame - delay - self.tail_padding),
+            "frames": self.frames,
+            "size": total_bytes,
+        }
+
+    def abort(self) -> None:
+        self.file.close()
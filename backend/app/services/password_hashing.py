@@ -0,0 +1,86 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from ..config import settings
+
+
+class PasswordHasherBusy(Exception):
+    """Every hashing slot is taken; the caller should retry shortly"""
+
+
+class PasswordHasher:
+    """bcrypt on a small thread pool, off the event loop.
+
+    bcrypt releases the GIL while it works, so threads run hashes on as many
+    cores as there are workers while the loop keeps serving other requests.
+    At most max_workers hashes run and max_queue more wait; beyond that
+    callers get PasswordHasherBusy straight away rather than piling up behind
+    seconds of queued work. rounds is the bcrypt cost factor for new hashes;
+    hashes made at a lower cost are flagged for rehashing on their next
+    successful verify.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, rounds: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0
+        self._rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn: Callable, *args: Any) -> Any:
+        if self._in_flight >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise PasswordHasherBusy()
+        self._in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Whether password matches, and a replacement hash if the stored one is below the current cost"""
+        return await self._run(self.context.verify_and_update, password, hashed)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_hasher: Optional[PasswordHasher] = None
+
+def get_password_hasher() -> PasswordHasher:
+    """Shared password hasher for this process"""
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(
+            settings.password_hash_workers,
+            settings.password_hash_max_queue,
+            settings.bcrypt_rounds
+        )
+    return _hasher
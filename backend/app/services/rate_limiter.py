@@ -0,0 +1,276 @@
+import asyncio
+import hashlib
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+from redis.exceptions import NoScriptError, RedisError
+
+from ..config import settings
+from ..redis_client import get_redis
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+# Refill two buckets (requests and tokens/characters) and take from both only
+# if both can cover the call. Returns 0 when granted, otherwise the number of
+# milliseconds until the call could fit. A live cooldown key (set after a 429)
+# blocks every worker sharing the provider key.
+_ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+
+local cooldown = redis.call('PTTL', KEYS[3])
+if cooldown > 0 then
+    return cooldown
+end
+
+local function refill(key, rate, capacity)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    return math.min(capacity, tokens + math.max(0, now - ts) * rate)
+end
+
+local request_rate = tonumber(ARGV[1])
+local request_capacity = tonumber(ARGV[2])
+local unit_rate = tonumber(ARGV[3])
+local unit_capacity = tonumber(ARGV[4])
+local units = math.min(tonumber(ARGV[5]), unit_capacity)
+
+local requests = refill(KEYS[1], request_rate, request_capacity)
+local available = refill(KEYS[2], unit_rate, unit_capacity)
+
+local wait = 0
+if requests < 1 then
+    wait = math.max(wait, math.ceil((1 - requests) / request_rate))
+end
+if available < units then
+    wait = math.max(wait, math.ceil((units - available) / unit_rate))
+end
+if wait == 0 then
+    requests = requests - 1
+    available = available - units
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(requests), 'ts', now)
+redis.call('HSET', KEYS[2], 'tokens', tostring(available), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+redis.call('PEXPIRE', KEYS[2], 120000)
+return wait
+"""
+_ACQUIRE_SHA = hashlib.sha1(_ACQUIRE_SCRIPT.encode()).hexdigest()
+
+
+class ProviderError(Exception):
+    """Raised when a provider call still fails after all retries"""
+
+    def __init__(self, provider: str, message: str, status_code: Optional[int] = None):
+        super().__init__(f"{provider} request failed: {message}")
+        self.provider = provider
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """In-process twin of the Redis script, used when Redis is unreachable"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60000.0  # tokens per millisecond
+        self.tokens = self.capacity
+        self.updated = time.monotonic() * 1000
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def wait_for(self, amount: float) -> int:
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0
+        return int((amount - self.tokens) / self.rate) + 1
+
+
+def provider_limits() -> Dict[str, Tuple[int, int]]:
+    """Requests per minute and tokens/characters per minute for each provider"""
+    return {
+        "anthropic": (settings.anthropic_requests_per_minute, settings.anthropic_tokens_per_minute),
+        "elevenlabs": (settings.elevenlabs_requests_per_minute, settings.elevenlabs_characters_per_minute),
+    }
+
+
+class RateLimiter:
+    """Client-side rate limiting and retries for the AI providers.
+
+    When shared, buckets are kept per provider and API key in Redis so every
+    worker draws from the same budget; otherwise they live in this process.
+    Retryable failures back off with jitter, honour Retry-After, and put the
+    key into a shared cooldown. Redis is reached through the calling event
+    loop's client, so one limiter serves worker threads with loops of their own.
+    """
+
+    def __init__(self, shared: bool = False):
+        self.shared = shared
+        self.limits = provider_limits()
+        self.max_retries = settings.provider_max_retries
+        self._local_buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._local_cooldowns: Dict[str, float] = {}
+
+    def _key(self, provider: str, api_key: str) -> str:
+        fingerprint = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        return f"voxy:ratelimit:{provider}:{fingerprint}"
+
+    async def acquire(self, provider: str, api_key: str, units: int) -> None:
+        """Wait until one request costing `units` tokens/characters fits the budget"""
+        while True:
+            wait_ms = await self._try_acquire(provider, api_key, units)
+            if wait_ms <= 0:
+                return
+            await asyncio.sleep(wait_ms / 1000)
+
+    async def _try_acquire(self, provider: str, api_key: str, units: int) -> int:
+        key = self._key(provider, api_key)
+        requests_per_minute, units_per_minute = self.limits[provider]
+
+        if self.shared:
+            try:
+                return int(await self._run_script(
+                    f"{key}:requests", f"{key}:units", f"{key}:cooldown",
+                    requests_per_minute / 60000.0,
+                    requests_per_minute,
+                    units_per_minute / 60000.0,
+                    units_per_minute,
+                    units,
+                ))
+            except RedisError as e:
+                print(f"Rate limiter falling back to local buckets: {e}")
+
+        now = time.monotonic() * 1000
+        cooldown_until = self._local_cooldowns.get(key, 0)
+        if cooldown_until > now:
+            return int(cooldown_until - now)
+
+        if key not in self._local_buckets:
+            self._local_buckets[key] = (TokenBucket(requests_per_minute), TokenBucket(units_per_minute))
+        request_bucket, unit_bucket = self._local_buckets[key]
+        request_bucket.refill(now)
+        unit_bucket.refill(now)
+
+        wait_ms = max(request_bucket.wait_for(1), unit_bucket.wait_for(units))
+        if wait_ms == 0:
+            request_bucket.tokens -= 1
+            unit_bucket.tokens -= min(units, unit_bucket.capacity)
+        return wait_ms
+
+    @staticmethod
+    async def _run_script(*keys_and_args: Any) -> Any:
+        client = get_redis()
+        try:
+            return await client.evalsha(_ACQUIRE_SHA, 3, *keys_and_args)
+        except NoScriptError:
+            # First call since Redis started or flushed its script cache; EVAL caches it again
+            return await client.eval(_ACQUIRE_SCRIPT, 3, *keys_and_args)
+
+    async def cooldown(self, provider: str, api_key: str, seconds: float) -> None:
+        """Pause all calls for a provider key, across workers"""
+        key = self._key(provider, api_key)
+        milliseconds = max(1, int(seconds * 1000))
+        self._local_cooldowns[key] = time.monotonic() * 1000 + milliseconds
+
+        if self.shared:
+            try:
+                # Only ever extend an existing cooldown
+                client = get_redis()
+                current = await client.pttl(f"{key}:cooldown")
+                if current < milliseconds:
+                    await client.set(f"{key}:cooldown", 1, px=milliseconds)
+            except RedisError as e:
+                print(f"Could not share provider cooldown: {e}")
+
+    async def backpressure(self) -> float:
+        """Seconds until the most throttled configured provider accepts calls again"""
+        api_keys = {
+            "anthropic": settings.anthropic_api_key,
+            "elevenlabs": settings.elevenlabs_api_key,
+        }
+        longest = 0.0
+        for provider, api_key in api_keys.items():
+            if not api_key:
+                continue
+            key = self._key(provider, api_key)
+            remaining = self._local_cooldowns.get(key, 0) - time.monotonic() * 1000
+            if self.shared:
+                try:
+                    remaining = max(remaining, await get_redis().pttl(f"{key}:cooldown"))
+                except RedisError:
+                    pass
+            longest = max(longest, remaining / 1000)
+        return longest
+
+    async def call(
+        self,
+        provider: str,
+        api_key: str,
+        units: int,
+        request: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Run a provider request under the rate limit, retrying transient failures"""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(provider, api_key, units)
+            try:
+                return await request()
+            except Exception as e:
+                status_code = _status_code(e)
+                retryable = status_code in RETRYABLE_STATUS_CODES or _is_transport_error(e)
+                if not retryable:
+                    raise ProviderError(provider, str(e), status_code) from e
+                if attempt == self.max_retries:
+                    raise ProviderError(provider, f"gave up after {attempt + 1} attempts: {e}", status_code) from e
+
+                retry_after = _retry_after(e)
+                # Full jitter keeps workers that failed together from retrying together
+                delay = random.uniform(0, min(settings.provider_backoff_cap, settings.provider_backoff_base * 2 ** attempt))
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if status_code == 429:
+                    await self.cooldown(provider, api_key, delay)
+
+                print(f"{provider} call failed ({status_code or type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+def _response(error: Exception) -> Optional[httpx.Response]:
+    response = getattr(error, "response", None)
+    return response if isinstance(response, httpx.Response) else None
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status_code = getattr(error, "status_code", None)
+    if status_code is None and _response(error) is not None:
+        status_code = _response(error).status_code
+    return status_code
+
+
+def _is_transport_error(error: Exception) -> bool:
+    if isinstance(error, httpx.TransportError):
+        return True
+    # The Anthropic SDK wraps transport failures in its own exception types
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = _response(error)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
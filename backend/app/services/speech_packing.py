@@ -0,0 +1,68 @@
+import hashlib
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+def break_marker(pause_ms: int) -> str:
+    """An ElevenLabs break tag, spoken as a pause of that length"""
+    return f' <break time="{pause_ms / 1000:g}s" /> '
+
+
+def pack_turns(
+    dialogue: List[Dict[str, Any]],
+    voice_map: Dict[str, str],
+    max_chars: int,
+    pause_ms: int,
+    boundaries: Optional[Set[int]] = None
+) -> List[Dict[str, Any]]:
+    """Group consecutive turns that share a voice into as few TTS requests as fit.
+
+    Each pack is {"voice_id", "turns": [dialogue indexes], "text"}. Its
+    turns are joined with break markers, so the pause between them is
+    spoken by the provider instead of inserted by assembly, and the
+    podcast keeps the same timing. A pack grows until the next turn would
+    take it past max_chars or is one of boundaries, which always start a
+    pack; a single turn longer than max_chars is sent alone.
+    """
+    marker = break_marker(pause_ms)
+    boundaries = boundaries or set()
+    packs: List[Dict[str, Any]] = []
+    for index, turn in enumerate(dialogue):
+        voice_id = voice_map.get(turn["speaker"], "default")
+        last = packs[-1] if packs else None
+        joinable = last and last["voice_id"] == voice_id and index not in boundaries
+        if joinable and len(last["text"]) + len(marker) + len(turn["text"]) <= max_chars:
+            last["turns"].append(index)
+            last["text"] += marker + turn["text"]
+        else:
+            packs.append({"voice_id": voice_id, "turns": [index], "text": turn["text"]})
+    return packs
+
+
+def pack_key(pack: Dict[str, Any], model: str) -> str:
+    """Names a pack's audio by what is spoken and how, so it is reused wherever the pack recurs"""
+    return hashlib.sha256(f"{model}\0{pack['voice_id']}\0{pack['text']}".encode()).hexdigest()[:32]
+
+
+def turn_spans(
+    dialogue: List[Dict[str, Any]],
+    pack: Dict[str, Any],
+    start_ms: int,
+    end_ms: int,
+    pause_ms: int
+) -> List[Tuple[int, int]]:
+    """Estimate where each turn of a pack falls within the pack's audio.
+
+    The breaks are taken out and the remaining speech time is shared
+    between the turns by character count.
+    """
+    lengths = [len(dialogue[index]["text"]) for index in pack["turns"]]
+    speech_ms = max(0, end_ms - start_ms - pause_ms * (len(lengths) - 1))
+    total = sum(lengths)
+
+    spans = []
+    position = float(start_ms)
+    for length in lengths:
+        duration = speech_ms * length / total if total else speech_ms / len(lengths)
+        spans.append((round(position), round(position + duration)))
+        position += duration + pause_ms
+    return spans
@@ -0,0 +1,43 @@
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Set
+
+
+def _turn(turn: Dict[str, Any]) -> tuple:
+    return turn["speaker"], turn["text"]
+
+
+def diff_turns(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Optional[int]]:
+    """For each turn of new, the index of the unchanged old turn it keeps, or None if edited or added"""
+    matcher = SequenceMatcher(a=[_turn(turn) for turn in old], b=[_turn(turn) for turn in new], autojunk=False)
+    origins: List[Optional[int]] = [None] * len(new)
+    for block in matcher.get_matching_blocks():
+        for offset in range(block.size):
+            origins[block.b + offset] = block.a + offset
+    return origins
+
+
+def pack_boundaries(origins: List[Optional[int]], old_packs: List[Dict[str, Any]]) -> Set[int]:
+    """Turns of an edited dialogue that must start a TTS pack.
+
+    An old pack whose turns all survive, still adjacent, is fenced off at
+    both ends, so packing rebuilds it with the same text and its audio is
+    reused. Edited and added turns are packed among themselves in the gaps
+    between, so only they are synthesized again.
+    """
+    new_index = {old: new for new, old in enumerate(origins) if old is not None}
+    boundaries = set()
+    for pack in old_packs:
+        kept = [new_index.get(index) for index in pack["turns"]]
+        if None in kept or kept != list(range(kept[0], kept[0] + len(kept))):
+            continue
+        boundaries.update((kept[0], kept[-1] + 1))
+    boundaries.discard(len(origins))
+    return boundaries
+
+
+def carry_over(old: List[Dict[str, Any]], new: List[Dict[str, Any]], origins: List[Optional[int]]) -> List[Dict[str, Any]]:
+    """The edited dialogue, with unchanged turns keeping their segment and source attribution"""
+    return [
+        {**old[origin], **turn} if origin is not None else dict(turn)
+        for turn, origin in zip(new, origins)
+    ]
@@ -0,0 +1,111 @@
+import struct
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Sidecar layout, little-endian:
+#   b"VXPK", version u16, level count u16, sample rate u32
+#   per level: samples_per_peak u32, peak count u32
+#   per level, in the same order: peak count (min, max) int8 pairs
+# The finest level is built from the PCM; each coarser one is folded from
+# the level before it, so the whole file is written in one pass.
+MAGIC = b"VXPK"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHI")
+_LEVEL = struct.Struct("<II")
+
+SAMPLES_PER_PEAK = 512  # finest level, about 86 peaks per second at 44.1 kHz
+LEVEL_FACTOR = 4
+LEVEL_COUNT = 4
+
+
+class WaveformBuilder:
+    """Min/max peaks over 16-bit PCM fed in arbitrary-sized chunks"""
+
+    def __init__(self, sample_rate: int, channels: int, samples_per_peak: int = SAMPLES_PER_PEAK):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.samples_per_peak = samples_per_peak
+        self._carry = np.empty((0, channels), dtype=np.int16)
+        self._mins: List[np.ndarray] = []
+        self._maxs: List[np.ndarray] = []
+
+    def feed(self, pcm: bytes) -> None:
+        samples = np.frombuffer(pcm, dtype="<i2").reshape(-1, self.channels)
+        if len(self._carry):
+            samples = np.concatenate([self._carry, samples])
+        whole = len(samples) // self.samples_per_peak * self.samples_per_peak
+        if whole:
+            # (blocks, samples_per_peak * channels): one min/max per block across all channels
+            blocks = samples[:whole].reshape(-1, self.samples_per_peak * self.channels)
+            self._mins.append(blocks.min(axis=1))
+            self._maxs.append(blocks.max(axis=1))
+        self._carry = samples[whole:].copy()
+
+    def finish(self) -> List[Tuple[int, np.ndarray]]:
+        """(samples_per_peak, interleaved int8 min/max) for each level, finest first"""
+        if len(self._carry):
+            self._mins.append(np.array([self._carry.min()], dtype=np.int16))
+            self._maxs.append(np.array([self._carry.max()], dtype=np.int16))
+            self._carry = self._carry[:0]
+        mins = np.concatenate(self._mins) if self._mins else np.empty(0, dtype=np.int16)
+        maxs = np.concatenate(self._maxs) if self._maxs else np.empty(0, dtype=np.int16)
+
+        levels = []
+        samples_per_peak = self.samples_per_peak
+        for _ in range(LEVEL_COUNT):
+            levels.append((samples_per_peak, _interleave(mins, maxs)))
+            # Pad to a whole number of groups with values that can't win
+            pad = -len(mins) % LEVEL_FACTOR
+            mins = np.concatenate([mins, np.full(pad, np.iinfo(np.int16).max, dtype=np.int16)])
+            maxs = np.concatenate([maxs, np.full(pad, np.iinfo(np.int16).min, dtype=np.int16)])
+            mins = mins.reshape(-1, LEVEL_FACTOR).min(axis=1)
+            maxs = maxs.reshape(-1, LEVEL_FACTOR).max(axis=1)
+            samples_per_peak *= LEVEL_FACTOR
+        return levels
+
+
+def _interleave(mins: np.ndarray, maxs: np.ndarray) -> np.ndarray:
+    # 16-bit to 8-bit, rounding away from zero so quiet but non-silent audio still shows
+    peaks = np.empty(len(mins) * 2, dtype=np.int8)
+    peaks[0::2] = np.floor(mins / 256).astype(np.int8)
+    peaks[1::2] = np.ceil(maxs / 256.0).clip(-128, 127).astype(np.int8)
+    return peaks
+
+
+def write_peaks(path: str, sample_rate: int, levels: List[Tuple[int, np.ndarray]]) -> int:
+    """Write the sidecar, returning its size in bytes"""
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(levels), sample_rate))
+        for samples_per_peak, peaks in levels:
+            f.write(_LEVEL.pack(samples_per_peak, len(peaks) // 2))
+        for _, peaks in levels:
+            f.write(peaks.tobytes())
+        return f.tell()
+
+
+def read_peaks(path: str, level: int) -> Dict[str, Any]:
+    """One level of a sidecar, normalized to [-1, 1] as wavesurfer.js expects.
+
+    Seeks straight to the level, so reading the coarse overview of a long
+    podcast doesn't touch the fine levels.
+    """
+    with open(path, "rb") as f:
+        magic, version, level_count, sample_rate = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a waveform sidecar")
+        if not 0 <= level < level_count:
+            raise ValueError(f"Waveform level must be between 0 and {level_count - 1}")
+        table = [_LEVEL.unpack(f.read(_LEVEL.size)) for _ in range(level_count)]
+
+        offset = _HEADER.size + _LEVEL.size * level_count + sum(count * 2 for _, count in table[:level])
+        samples_per_peak, count = table[level]
+        f.seek(offset)
+        peaks = np.frombuffer(f.read(count * 2), dtype=np.int8)
+
+    return {
+        "sample_rate": sample_rate,
+        "samples_per_peak": samples_per_peak,
+        "levels": [spp for spp, _ in table],
+        "peaks": np.round(peaks / 128.0, 3).tolist(),
+    }
@@ -0,0 +1,47 @@
+from typing import List
+
+from celery import Celery
+
+from ..config import settings
+
+GENERATE_PODCAST_TASK = "voxy.generate_podcast"
+GENERATE_BATCH_TASK = "voxy.generate_batch"
+
+celery_app = Celery(
+    "voxy",
+    broker=settings.celery_broker_url or settings.redis_url,
+    include=["app.workers.tasks"]
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    task_default_queue=settings.generation_queue,
+    task_ignore_result=True,
+    # Acknowledge only after the pipeline finishes so a crashed or killed
+    # worker hands the generation back to the queue instead of losing it.
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    # Each worker process holds at most one generation it isn't running yet
+    worker_prefetch_multiplier=1,
+    worker_concurrency=settings.max_concurrent_generations,
+    # Unacked messages are redelivered after this long, so it must outlast
+    # the slowest job, a single generation or a whole batch, or long runs
+    # get picked up twice.
+    broker_transport_options={
+        "visibility_timeout": max(settings.default_generation_timeout, settings.batch_generation_timeout) * 2
+    },
+    broker_connection_retry_on_startup=True,
+)
+
+def enqueue_generation(generation_id: str) -> None:
+    """Hand a generation to the worker queue.
+
+    Sent by name so the API process never imports the pipeline itself; the
+    task id mirrors the generation id.
+    """
+    celery_app.send_task(GENERATE_PODCAST_TASK, args=[generation_id], task_id=generation_id)
+
+def enqueue_batch(batch_id: str, generation_ids: List[str]) -> None:
+    """Hand a batch's variants to the worker queue as one job, so they share its stages and slot"""
+    celery_app.send_task(GENERATE_BATCH_TASK, args=[generation_ids], task_id=batch_id)
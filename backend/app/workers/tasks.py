@@ -0,0 +1,41 @@
+import asyncio
+import threading
+from typing import Any, Coroutine, List
+
+from .celery_app import celery_app, GENERATE_PODCAST_TASK, GENERATE_BATCH_TASK
+from ..services.audio_generator import AudioGenerator
+
+audio_generator = AudioGenerator()
+
+# Each worker process (or thread, for the solo/threads pools) keeps one event
+# loop for its lifetime so database connections pooled by the async engine
+# stay bound to the loop that created them.
+_loop_state = threading.local()
+
+def run_async(coro: Coroutine[Any, Any, Any]) -> Any:
+    """Run a coroutine on this worker's long-lived event loop"""
+    loop = getattr(_loop_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _loop_state.loop = loop
+    return loop.run_until_complete(coro)
+
+@celery_app.task(name=GENERATE_PODCAST_TASK, bind=True, max_retries=None)
+def generate_podcast_task(self, generation_id: str) -> bool:
+    """Run the podcast pipeline for a queued generation"""
+    # While a provider is throttling us, leave the job queued rather than
+    # starting a pipeline that would only sit in the rate limiter.
+    backoff = run_async(audio_generator.rate_limiter.backpressure())
+    if backoff > 0:
+        raise self.retry(countdown=backoff)
+    
+    return run_async(audio_generator.generate_podcast(generation_id))
+
+@celery_app.task(name=GENERATE_BATCH_TASK, bind=True, max_retries=None)
+def generate_batch_task(self, generation_ids: List[str]) -> List[bool]:
+    """Run a batch of variants, computing their shared stages once"""
+    backoff = run_async(audio_generator.rate_limiter.backpressure())
+    if backoff > 0:
+        raise self.retry(countdown=backoff)
+    
+    return run_async(audio_generator.generate_batch(generation_ids))
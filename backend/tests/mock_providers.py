@@ -0,0 +1,264 @@
+"""
+Offline stand-ins for the Anthropic Messages and ElevenLabs text-to-speech APIs.
+
+Responses are derived from a hash of the request, so the same prompt always
+gets the same reply, and latency and error rates are configurable. Prompt
+caching is simulated: prefixes ending at a cache_control block are
+remembered for five minutes and reported as cache reads. Point
+ANTHROPIC_BASE_URL and ELEVENLABS_BASE_URL at a running MockProviderServer to
+exercise the real pipeline code paths without API keys.
+"""
+
+import asyncio
+import hashlib
+import math
+import random
+import re
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono. A frame whose side information
+# is all zeros decodes to silence, so repeating it gives a valid MP3 of any
+# length in the format ElevenLabs returns by default (mp3_44100_128).
+SILENT_MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC0]) + bytes(413)
+SAMPLES_PER_FRAME = 1152
+SAMPLE_RATE = 44100
+BREAK_TAG = re.compile(r'\s*<break time="([\d.]+)s"\s*/>\s*')
+CACHE_TTL = 300.0  # seconds
+CACHE_MIN_TOKENS = 1024  # shorter prefixes aren't cached
+
+WORDS = (
+    "research evidence model system data insight trend result method analysis "
+    "approach question finding impact context theory practice example detail "
+    "pattern signal framework decision outcome measure risk benefit"
+).split()
+
+
+class MockBehaviour:
+    """Latency and failure settings for one mocked provider"""
+
+    def __init__(
+        self,
+        latency_ms: float = 50.0,
+        jitter_ms: float = 10.0,
+        per_unit_ms: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int = 0,
+        per_input_unit_ms: float = 0.0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_unit_ms = per_unit_ms  # per output token or per character
+        self.per_input_unit_ms = per_input_unit_ms  # per input token not read from the cache
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    async def delay(self, units: int, input_units: int = 0) -> None:
+        jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        processing = self.per_unit_ms * units + self.per_input_unit_ms * input_units
+        await asyncio.sleep(max(0.0, self.latency_ms + jitter + processing) / 1000)
+
+    def failure(self) -> Optional[int]:
+        """Status code of an injected failure, or None to answer normally"""
+        self.requests += 1
+        if self.random.random() >= self.error_rate:
+            return None
+        self.errors += 1
+        return self.random.choice([429, 429, 500, 529])
+
+
+def _seeded_words(seed_text: str, count: int) -> List[str]:
+    rng = random.Random(hashlib.sha256(seed_text.encode()).hexdigest())
+    return [rng.choice(WORDS) for _ in range(count)]
+
+
+def _prompt_blocks(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """System and message content as one list of blocks, in prompt order"""
+    system = body.get("system")
+    blocks = list(system) if isinstance(system, list) else [{"text": system or ""}]
+    for message in body.get("messages", []):
+        content = message.get("content")
+        blocks += content if isinstance(content, list) else [{"text": content or ""}]
+    return [block if isinstance(block, dict) else {"text": str(block)} for block in blocks]
+
+
+def _prompt_text(body: Dict[str, Any]) -> str:
+    """Flatten system and user content blocks into one string"""
+    return "\n".join(block.get("text", "") for block in _prompt_blocks(body))
+
+
+class PromptCache:
+    """Prompt prefixes ending at cache_control breakpoints, by hash, with expiry"""
+
+    def __init__(self, ttl: float = CACHE_TTL, min_tokens: int = CACHE_MIN_TOKENS):
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.expiry: Dict[str, float] = {}
+
+    def usage(self, body: Dict[str, Any]) -> Dict[str, int]:
+        """Split a request's input tokens into uncached, written and read, updating the cache"""
+        now = time.monotonic()
+        digest = hashlib.sha256(str(body.get("model")).encode())
+        tokens = 0
+        breakpoints = []
+        for block in _prompt_blocks(body):
+            text = block.get("text", "")
+            digest.update(text.encode())
+            tokens += len(text) // 4
+            if block.get("cache_control") and tokens >= self.min_tokens:
+                breakpoints.append((digest.hexdigest(), tokens))
+
+        # The longest prefix still cached is read; later breakpoints are written
+        read = 0
+        for key, prefix_tokens in breakpoints:
+            if self.expiry.get(key, 0) > now:
+                read = prefix_tokens
+        written = read
+        for key, prefix_tokens in breakpoints:
+            if prefix_tokens >= read:
+                self.expiry[key] = now + self.ttl
+                written = prefix_tokens
+        return {
+            "input_tokens": tokens - written,
+            "cache_creation_input_tokens": written - read,
+            "cache_read_input_tokens": read,
+        }
+
+
+def _reply_for(prompt: str, max_tokens: int, request: str = None) -> str:
+    """Plausible, deterministic output for each pipeline prompt.
+
+    The stage is recognised from request, the user message (the whole
+    prompt if not given), since the system prompt is shared by every stage.
+    """
+    request = prompt if request is None else request
+    speakers = re.findall(r"^\s*- ([^(\n]+?) \(", prompt, flags=re.MULTILINE) or ["Host", "Guest"]
+
+    if "key concepts" in request and "Documents:" in prompt:
+        return "\n".join(
+            f"- {' '.join(_seeded_words(f'{prompt}:{i}', 3)).title()}" for i in range(8)
+        )
+
+    if "SPEAKER_NAME" not in request:
+        sections = ["Opening introduction"] + [
+            f"Segment {i}: {' '.join(_seeded_words(f'{prompt}:{i}', 4))}" for i in range(1, 5)
+        ] + ["Closing summary"]
+        return "\n".join(f"{i + 1}. {section}" for i, section in enumerate(sections))
+
+    # Dialogue: roughly 60 tokens per turn, mostly alternating speakers. As
+    # in real replies, a speaker sometimes carries on over several lines
+    turns = max(2, min(max_tokens // 60, 60))
+    lines = []
+    speaker = 0
+    for i in range(turns):
+        if i and i % 3 != 2:
+            speaker += 1
+        length = 6 + (i * 7) % 18
+        sentence = " ".join(_seeded_words(f"{prompt}:{i}", length)).capitalize()
+        lines.append(f"{speakers[speaker % len(speakers)].strip()}: {sentence}.")
+    return "\n".join(lines)
+
+
+def create_mock_app(anthropic: MockBehaviour, elevenlabs: MockBehaviour) -> FastAPI:
+    app = FastAPI(title="Mock AI providers")
+    cache = PromptCache()
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        status_code = anthropic.failure()
+        if status_code:
+            await anthropic.delay(0)
+            error_type = "rate_limit_error" if status_code == 429 else "overloaded_error"
+            return JSONResponse(
+                {"type": "error", "error": {"type": error_type, "message": "Injected failure"}},
+                status_code=status_code,
+                headers={"retry-after": str(anthropic.retry_after)} if status_code == 429 else None
+            )
+
+        prompt = _prompt_text(body)
+        request_text = _prompt_text({"messages": body.get("messages", [])})
+        text = _reply_for(prompt, body.get("max_tokens", 1024), request_text)
+        output_tokens = len(text) // 4
+        usage = cache.usage(body)
+        # Cache reads skip prompt processing; writes cost as much as uncached input
+        await anthropic.delay(
+            output_tokens, usage["input_tokens"] + usage["cache_creation_input_tokens"]
+        )
+
+        return {
+            "id": f"msg_{hashlib.sha256(prompt.encode()).hexdigest()[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {**usage, "output_tokens": output_tokens},
+        }
+
+    @app.post("/v1/text-to-speech/{voice_id}")
+    async def text_to_speech(voice_id: str, request: Request):
+        body = await request.json()
+        text = body.get("text", "")
+        status_code = elevenlabs.failure()
+        if status_code:
+            await elevenlabs.delay(0)
+            return JSONResponse(
+                {"detail": {"status": "injected_failure", "message": "Injected failure"}},
+                status_code=status_code,
+                headers={"retry-after": str(elevenlabs.retry_after)} if status_code == 429 else None
+            )
+
+        await elevenlabs.delay(len(text))
+        # About 15 characters of speech per second, plus any break tags
+        breaks = [float(seconds) for seconds in BREAK_TAG.findall(text)]
+        spoken = BREAK_TAG.sub("", text)
+        seconds = max(0.5, len(spoken) / 15) + sum(breaks)
+        frames = math.ceil(seconds * SAMPLE_RATE / SAMPLES_PER_FRAME)
+        return Response(SILENT_MP3_FRAME * frames, media_type="audio/mpeg")
+
+    return app
+
+
+class MockProviderServer:
+    """Runs the mock providers with uvicorn on a background thread"""
+
+    def __init__(self, anthropic: MockBehaviour = None, elevenlabs: MockBehaviour = None):
+        self.anthropic = anthropic or MockBehaviour()
+        self.elevenlabs = elevenlabs or MockBehaviour()
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        config = uvicorn.Config(
+            create_mock_app(self.anthropic, self.elevenlabs),
+            host="127.0.0.1",
+            port=self.port,
+            log_level="warning"
+        )
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "MockProviderServer":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.should_exit = True
+        self.thread.join()
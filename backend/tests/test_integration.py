@@ -103,7 +103,7 @@ class TestIntegration:
         response = await self.client.get("/api/projects/", headers=headers)
         assert response.status_code == 200
         
-        projects = response.json()
+        projects = response.json()["items"]
         assert len(projects) >= 1
         assert any(p["id"] == self.test_project_id for p in projects)
         print("✅ Project listing successful")
@@ -203,7 +203,7 @@ class TestIntegration:
             response = await self.client.get(f"/api/documents/project/{self.test_project_id}", headers=headers)
             assert response.status_code == 200
             
-            documents = response.json()
+            documents = response.json()["items"]
             assert len(documents) >= 1
             assert any(d["id"] == self.test_document_id for d in documents)
             print("✅ Document listing successful")
@@ -324,7 +324,7 @@ class TestIntegration:
         response = await self.client.get(f"/api/audio/generations?project_id={self.test_project_id}", headers=headers)
         assert response.status_code == 200
         
-        generations = response.json()
+        generations = response.json()["items"]
         assert len(generations) >= 1
         assert any(g["id"] == self.test_generation_id for g in generations)
         print("✅ Generation listing successful")
@@ -1,11 +1,46 @@
 import pytest
 import asyncio
-from unittest.mock import Mock, patch
+import httpx
+from fastapi import HTTPException
+from anthropic import AsyncAnthropic
+from unittest.mock import Mock, MagicMock, AsyncMock, patch
 import tempfile
+import time
 import os
+import uuid
 
 from app.services.document_processor import DocumentProcessor
-from app.services.audio_generator import AudioGenerator
+from app.services.audio_generator import AudioGenerator, TTS_MODEL
+from app.services.audio_metadata import parse_frame_header, probe_mp3
+from app.services.mp3_splice import MP3Splicer, silent_frame
+from app.services.audio_pool import AudioWorkPool
+from app.services import audio_codec
+from app.services.rate_limiter import RateLimiter, ProviderError
+from app.services.cancellation import CancellationWatcher, GenerationCancelled, StageTimeout, stage_deadline
+from app.config import settings
+from app.services.generation_reuse import generation_fingerprint, claim_fingerprint
+from app.redis_client import get_redis
+from app.workers.celery_app import celery_app, enqueue_generation
+from app.workers import tasks
+from tests.mock_providers import MockBehaviour, create_mock_app
+from app.streaming import RangeFileResponse
+from app.services.waveform import WaveformBuilder, write_peaks, read_peaks
+from app.services.citations import attribute_sources, build_transcript
+from app.services.mixing import DuckingMixer
+from app.services.speech_packing import pack_turns, pack_key
+from app.services.transcript_edits import diff_turns, pack_boundaries, carry_over
+from app.services.context_selection import select_context
+from app.services.dialogue_segments import split_outline, match_speaker
+from app.services.llm_usage import track_usage, merge_usage
+from app.pagination import encode_cursor, decode_cursor, keyset_page, page_items
+from app.models import AudioGeneration, CompressedText, Document, User
+from app import auth
+from app.auth import PrincipalCache, get_current_user, principal_cache
+from app.services.password_hashing import PasswordHasher, PasswordHasherBusy
+from jose import jwt
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql
+from datetime import datetime, timezone
 
 class TestDocumentProcessor:
     """Unit tests for document processing"""
@@ -38,22 +73,41 @@ class TestDocumentProcessor:
             print("✅ Text extraction works correctly")
         finally:
             os.unlink(temp_path)
+    
+    def test_content_compression(self):
+        """Test document text is stored compressed, and rows stored before compression still read"""
+        column = CompressedText()
+        text = "Sleep consolidates memory. " * 2000
+        
+        stored = column.process_bind_param(text, None)
+        assert len(stored) < len(text) // 20
+        assert column.process_result_value(stored, None) == text
+        assert column.process_result_value("Plain legacy text".encode(), None) == "Plain legacy text"
+        
+        # Before migration 0002 the column is still text and values pass through as they are
+        assert column.process_result_value("Unmigrated text", None) == "Unmigrated text"
+        with patch.object(CompressedText, "legacy_text", True):
+            assert column.process_bind_param(text, None) == text
+        assert "content" not in [attr.key for attr in Document.__mapper__.column_attrs if not attr.deferred]
+        print("✅ Document content compression works correctly")
 
 class TestAudioGenerator:
     """Unit tests for audio generation"""
     
+    PERSONAS = [{"name": "Dr. Smith", "voiceId": "voice_1"}, {"name": "Alex", "voiceId": "voice_2"}]
+    
     def setup_method(self):
         self.generator = AudioGenerator()
     
     async def test_concept_extraction(self):
         """Test key concept extraction"""
-        # Mock documents
-        mock_docs = [
-            Mock(content="This document discusses artificial intelligence and machine learning."),
-            Mock(content="The research focuses on natural language processing and deep learning.")
-        ]
+        prefix = self.generator._shared_prefix(
+            "This document discusses artificial intelligence and machine learning.\n\n"
+            "The research focuses on natural language processing and deep learning.",
+            {'personas': []}
+        )
         
-        concepts = await self.generator._extract_key_concepts(mock_docs)
+        concepts = await self.generator._extract_key_concepts(prefix)
         
         assert isinstance(concepts, list)
         assert len(concepts) > 0
@@ -75,6 +129,1315 @@ class TestAudioGenerator:
         assert len(dialogue) > 0
         assert all('speaker' in item and 'text' in item for item in dialogue)
         print("✅ Dialogue generation works correctly")
+    
+    async def test_dialogue_segments_in_parallel(self):
+        """Test outline segments are written concurrently, within the bound, and stitched in order"""
+        outline = "Episode plan\n" + "\n".join(f"{i}. Topic {i}\n   - detail {i}" for i in range(1, 6))
+        personas = [
+            {'name': 'Dr. Smith', 'role': 'Expert', 'personality': 'Academic', 'speakingStyle': 'Formal'},
+            {'name': 'Alex', 'role': 'Student', 'personality': 'Curious', 'speakingStyle': 'Casual'}
+        ]
+        in_flight = []
+        peak = 0
+        
+        async def complete(prompt, max_tokens, system=None):
+            nonlocal peak
+            # The outline block is shared by every part; only the last block differs
+            assert "cache_control" in prompt[0] and "cache_control" not in prompt[-1]
+            number = prompt[-1]["text"].split("Generate part ")[1].split(" ")[0]
+            in_flight.append(number)
+            peak = max(peak, len(in_flight))
+            await asyncio.sleep(0.01 * (6 - int(number)))
+            in_flight.remove(number)
+            return f"Part {number} heading: ignored\n**Dr. Smith**: Point {number}.\nalex: Reply {number}."
+        
+        search = AsyncMock(return_value=[])
+        with patch("app.services.audio_generator.settings") as mock_settings, \
+             patch.object(self.generator, "anthropic", Mock()), \
+             patch.object(self.generator, "_complete", complete), \
+             patch.object(self.generator.document_processor, "search_similar_chunks", search):
+            mock_settings.dialogue_segment_concurrency = 2
+            mock_settings.dialogue_sources_per_segment = 3
+            dialogue = await self.generator._generate_dialogue(
+                outline, {'personas': personas, 'duration': '10-15'}, ["document-1"]
+            )
+        
+        assert peak == 2
+        assert search.call_count == 5 and search.call_args.kwargs["limit"] == 3
+        assert [turn["text"] for turn in dialogue[:4]] == ["Point 1.", "Reply 1.", "Point 2.", "Reply 2."]
+        assert {turn["speaker"] for turn in dialogue} == {"Dr. Smith", "Alex"}
+        assert [turn["segment"] for turn in dialogue] == [0, 0, 1, 1, 2, 2, 3, 3, 4, 4]
+        print("✅ Parallel dialogue generation works correctly")
+    
+    def test_outline_and_speaker_parsing(self):
+        """Test outlines split on top-level items and speaker labels resolve to personas"""
+        outline = "Podcast outline\n1. Intro\n   - hook\n2) Evidence\n\n3. Wrap-up"
+        
+        assert split_outline(outline) == ["1. Intro\n   - hook", "2) Evidence", "3. Wrap-up"]
+        assert split_outline("Just talk") == ["Just talk"]
+        assert match_speaker("**dr. smith**", ["Dr. Smith", "Alex"]) == "Dr. Smith"
+        assert match_speaker("Smith", ["Dr. Smith", "Alex"]) == "Dr. Smith"
+        assert match_speaker("Segment 2", ["Dr. Smith", "Alex"]) is None
+        print("✅ Outline and speaker parsing works correctly")
+    
+    async def test_synthesis_resumes_from_checkpoint(self):
+        """Test checkpointed segments are reused instead of re-synthesized"""
+        dialogue = [
+            {"speaker": "Dr. Smith", "text": "Welcome back."},
+            {"speaker": "Alex", "text": "Glad to be here."}
+        ]
+        assembled = {
+            "duration_ms": 3000, "sample_rate": 44100, "channels": 1, "spans_ms": [(0, 1000), (1500, 2500)],
+            "renditions": [{"name": "mp3_128k", "size": 48000}, {"name": "opus_48k", "size": 18000}],
+            "waveform": {"path": "podcast_generation-1.peaks", "levels": [512], "size": 100}
+        }
+        
+        with tempfile.TemporaryDirectory() as audio_dir:
+            completed_path = os.path.join(audio_dir, "generation-1", "segments", "welcome.mp3")
+            os.makedirs(os.path.dirname(completed_path))
+            open(completed_path, 'wb').close()
+            completed_key = pack_key({"voice_id": "voice_1", "text": "Welcome back."}, TTS_MODEL)
+            recorded = []
+            
+            async def record_segment(entry):
+                recorded.append(entry)
+            
+            with patch("app.services.audio_generator.settings") as mock_settings, \
+                 patch.object(self.generator, "_text_to_speech", return_value=b"audio") as mock_tts, \
+                 patch("app.services.audio_generator.assemble_podcast", AsyncMock(return_value=assembled)) as mock_assemble:
+                mock_settings.elevenlabs_api_key = "test-key"
+                mock_settings.audio_dir = audio_dir
+                mock_settings.audio_renditions = settings.audio_renditions
+                mock_settings.elevenlabs_max_request_chars = 5000
+                
+                audio_path, metadata = await self.generator._synthesize_audio(
+                    "generation-1", dialogue, {"personas": self.PERSONAS},
+                    [{"key": completed_key, "turns": [0], "path": completed_path}], record_segment
+                )
+        
+        assert mock_tts.call_count == 1
+        assert [entry["turns"] for entry in recorded] == [[1]]
+        assert mock_assemble.call_args.args[0][0] == completed_path
+        assert [s["start_ms"] for s in metadata["segments"]] == [0, 1500]
+        assert [s["speaker"] for s in metadata["segments"]] == ["Dr. Smith", "Alex"]
+        assert audio_path.endswith("podcast_generation-1.mp3")
+        assert [r["name"] for r in metadata["renditions"]] == ["opus_48k", "mp3_128k"]
+        print("✅ Synthesis resumes from checkpoint correctly")
+    
+    async def test_edit_resynthesizes_changed_turns(self):
+        """Test an edited transcript re-synthesizes only its changed turns, however they were packed"""
+        dialogue = [
+            {"speaker": "Dr. Smith", "text": "Welcome back.", "source_chunk_ids": ["a"]},
+            {"speaker": "Dr. Smith", "text": "Today: sleep.", "source_chunk_ids": []},
+            {"speaker": "Alex", "text": "Great.", "source_chunk_ids": ["b"]},
+            {"speaker": "Dr. Smith", "text": "First, a study.", "source_chunk_ids": []},
+            {"speaker": "Dr. Smith", "text": "Then a review.", "source_chunk_ids": ["c"]},
+        ]
+        edited = [{"speaker": turn["speaker"], "text": turn["text"]} for turn in dialogue]
+        edited[3]["text"] = "First, a trial."
+        edited.insert(5, {"speaker": "Alex", "text": "Thanks!"})
+        
+        origins = diff_turns(dialogue, edited)
+        assert origins == [0, 1, 2, None, 4, None]
+        voice_map = {"Dr. Smith": "voice_1", "Alex": "voice_2"}
+        before = pack_turns(dialogue, voice_map, 5000, 500)
+        assert [pack["turns"] for pack in before] == [[0, 1], [2], [3, 4]]
+        boundaries = pack_boundaries(origins, before)
+        after = pack_turns(edited, voice_map, 5000, 500, boundaries)
+        assert [pack["turns"] for pack in after] == [[0, 1], [2], [3, 4], [5]]
+        merged = carry_over(dialogue, edited, origins)
+        assert merged[4]["source_chunk_ids"] == ["c"] and "source_chunk_ids" not in merged[3]
+        
+        assembled = {
+            "duration_ms": 9000, "sample_rate": 44100, "channels": 1,
+            "spans_ms": [(0, 2000), (2500, 3000), (3500, 6000), (6500, 7000)],
+            "renditions": [{"name": "mp3_128k", "size": 48000}],
+            "waveform": {"path": "podcast_generation-1.peaks", "levels": [512], "size": 100}
+        }
+        with tempfile.TemporaryDirectory() as audio_dir:
+            segments = []
+            
+            async def record_segment(entry):
+                segments.append(entry)
+            
+            with patch("app.services.audio_generator.settings") as mock_settings, \
+                 patch.object(self.generator, "_text_to_speech", return_value=b"audio") as mock_tts, \
+                 patch("app.services.audio_generator.assemble_podcast", AsyncMock(return_value=assembled)):
+                mock_settings.elevenlabs_api_key = "test-key"
+                mock_settings.audio_dir = audio_dir
+                mock_settings.audio_renditions = settings.audio_renditions
+                mock_settings.elevenlabs_max_request_chars = 5000
+                
+                await self.generator._synthesize_audio(
+                    "generation-1", dialogue, {"personas": self.PERSONAS}, [], record_segment
+                )
+                assert mock_tts.call_count == 3
+                await self.generator._synthesize_audio(
+                    "generation-1", merged, {"personas": self.PERSONAS}, list(segments), record_segment, boundaries
+                )
+                spoken = [call.args[0] for call in mock_tts.call_args_list[3:]]
+                remaining = os.listdir(os.path.join(audio_dir, "generation-1", "segments"))
+        
+        # The pack holding the edited turn and the added turn; the replaced pack's audio is dropped
+        assert spoken == ['First, a trial. <break time="0.5s" /> Then a review.', "Thanks!"]
+        assert len(remaining) == 4
+        print("✅ Transcript edits re-synthesize only changed turns")
+    
+    async def test_splice_reuses_conformed_segments(self):
+        """Test segments encoded to the splice profile are kept and not encoded again on the next run"""
+        pool = AudioWorkPool(max_workers=1, max_queue=4)
+        dialogue = [
+            {"speaker": "Dr. Smith", "text": "Welcome back."},
+            {"speaker": "Alex", "text": "Glad to be here."}
+        ]
+        runs = []
+        
+        async def spy_splice(*args):
+            runs.append(await audio_codec.splice_podcast(*args))
+            return runs[-1]
+        
+        with tempfile.TemporaryDirectory() as audio_dir, \
+             patch.object(audio_codec, "get_audio_pool", return_value=pool):
+            # Speech at 64k, which the 128k splice profile has to re-encode
+            primary = audio_codec.primary_rendition(settings.audio_renditions)
+            speech = await audio_codec.render_tone(
+                440, 600, os.path.join(audio_dir, "speech"), [{**primary, "name": "mp3_64k", "bitrate": "64k"}]
+            )
+            with open(speech["renditions"][0]["path"], "rb") as f:
+                audio = f.read()
+            segments = []
+            
+            async def record_segment(entry):
+                segments.append(entry)
+            
+            with patch("app.services.audio_generator.settings") as mock_settings, \
+                 patch.object(self.generator, "_text_to_speech", return_value=audio), \
+                 patch("app.services.audio_generator.splice_podcast", spy_splice):
+                mock_settings.elevenlabs_api_key = "test-key"
+                mock_settings.audio_dir = audio_dir
+                mock_settings.audio_renditions = settings.audio_renditions
+                mock_settings.audio_assembly_mode = "splice"
+                mock_settings.elevenlabs_max_request_chars = 5000
+                
+                for _ in range(2):
+                    await self.generator._synthesize_audio(
+                        "generation-1", dialogue, {"personas": self.PERSONAS}, list(segments), record_segment
+                    )
+            pool.shutdown()
+            remaining = os.listdir(os.path.join(audio_dir, "generation-1", "segments"))
+        
+        assert [run["conformed_clips"] for run in runs] == [2, 0]
+        assert len(remaining) == 4
+        print("✅ Spliced assembly reuses conformed segments")
+    
+    async def test_edit_records_a_revision(self):
+        """Test a transcript edit queues a new generation and leaves the edited one playable"""
+        from app.routers.audio import edit_generation_dialogue
+        from app.schemas import DialogueEdit
+        
+        owner = Mock(id=uuid.uuid4())
+        dialogue = [{"speaker": "Dr. Smith", "text": "Welcome back.", "source_chunk_ids": ["a"]}]
+        generation = AudioGeneration(
+            id=uuid.uuid4(), project_id=uuid.uuid4(), owner_id=owner.id, status="completed", progress=100.0,
+            current_step="Complete!", settings={"personas": self.PERSONAS}, fingerprint="f" * 64,
+            audio_url="podcast.mp3", checkpoint={"outline": "Outline", "dialogue": dialogue, "segments": []}
+        )
+        original = {column: getattr(generation, column) for column in ("status", "audio_url", "fingerprint", "checkpoint")}
+        added = []
+        
+        async def refresh(revision):
+            revision.id = uuid.uuid4()
+            revision.created_at = datetime.now(timezone.utc)
+        
+        db = Mock(get=AsyncMock(side_effect=[generation, Mock(owner_id=owner.id)]), add=added.append,
+                  commit=AsyncMock(), refresh=AsyncMock(side_effect=refresh))
+        edit = DialogueEdit(dialogue=[{"speaker": "Dr. Smith", "text": "Welcome, everyone."}])
+        with patch("app.routers.audio.enqueue_generation") as enqueue:
+            response = await edit_generation_dialogue(str(generation.id), edit, db, owner)
+        
+        [revision] = added
+        assert response.id == revision.id != generation.id and response.revision_of == generation.id
+        assert revision.status == "queued" and revision.fingerprint is None
+        assert revision.checkpoint["edit"] == [{"speaker": "Dr. Smith", "text": "Welcome, everyone."}]
+        assert revision.checkpoint["dialogue"] == dialogue
+        enqueue.assert_called_once_with(str(revision.id))
+        assert {column: getattr(generation, column) for column in original} == original
+        print("✅ Transcript edits create revisions correctly")
+    
+    async def test_batch_shares_upstream_stages(self):
+        """Test a batch extracts concepts once, seeds each variant, and bounds the variants in flight"""
+        project_id = uuid.uuid4()
+        variants = [
+            Mock(id=uuid.uuid4(), project_id=project_id, status=status, checkpoint=None, llm_usage=None)
+            for status in ("queued", "queued", "completed")
+        ]
+        variants[1].checkpoint = {"outline": "Kept"}
+        generations = Mock()
+        generations.scalars.return_value.all.return_value = variants
+        documents = Mock()
+        documents.scalars.return_value.all.return_value = [Mock()]
+        db = Mock(execute=AsyncMock(side_effect=[generations, documents]), commit=AsyncMock())
+        session = MagicMock(__aenter__=AsyncMock(return_value=db), __aexit__=AsyncMock(return_value=False))
+        
+        in_flight = 0
+        peak = 0
+        
+        async def generate_podcast(generation_id):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return True
+        
+        extract = AsyncMock(return_value=["Concept"])
+        with patch("app.services.audio_generator.AsyncSessionLocal", return_value=session), \
+             patch("app.services.audio_generator.select_context", AsyncMock(return_value="Excerpts")), \
+             patch.object(settings, "batch_variant_concurrency", 2), \
+             patch.object(self.generator, "_extract_key_concepts", extract), \
+             patch.object(self.generator, "generate_podcast", generate_podcast):
+            results = await self.generator.generate_batch([str(variant.id) for variant in variants])
+        
+        assert results == [True, True, True] and peak == 2
+        extract.assert_awaited_once()
+        assert "Excerpts" in extract.await_args.args[0][0]["text"]
+        assert variants[0].checkpoint == {"context": "Excerpts", "concepts": ["Concept"]}
+        assert variants[1].checkpoint == {"context": "Excerpts", "concepts": ["Concept"], "outline": "Kept"}
+        assert variants[2].checkpoint is None
+        print("✅ Batch generation shares upstream stages correctly")
+    
+    async def test_batch_deadline_covers_variants(self):
+        """Test one deadline bounds the whole batch, within the broker's visibility timeout"""
+        ids = [str(uuid.uuid4()) for _ in range(3)]
+        
+        async def generate_podcast(generation_id):
+            await asyncio.sleep(0 if generation_id == ids[0] else 10)
+            return True
+        
+        mark_stopped = AsyncMock()
+        with patch.object(settings, "batch_generation_timeout", 0.05), \
+             patch.object(self.generator, "_run_shared_stages", AsyncMock()), \
+             patch.object(self.generator, "generate_podcast", generate_podcast), \
+             patch.object(self.generator, "_mark_stopped", mark_stopped):
+            results = await self.generator.generate_batch(ids)
+        
+        assert results == [True, False, False]
+        assert all(call.kwargs == {"only_pending": True} for call in mark_stopped.await_args_list)
+        assert [call.args[0] for call in mark_stopped.await_args_list] == ids
+        visibility = celery_app.conf.broker_transport_options["visibility_timeout"]
+        assert visibility > settings.batch_generation_timeout
+        print("✅ Batch deadline works correctly")
+    
+    async def test_turns_packed_by_voice(self):
+        """Test consecutive same-voice turns share a request and keep their own offsets"""
+        dialogue = [
+            {"speaker": "Dr. Smith", "text": "Welcome back to the show."},
+            {"speaker": "Dr. Smith", "text": "Today we look at sleep."},
+            {"speaker": "Alex", "text": "Great."},
+            {"speaker": "Dr. Smith", "text": "x" * 60},
+            {"speaker": "Dr. Smith", "text": "y" * 60},
+        ]
+        packs = pack_turns(dialogue, {"Dr. Smith": "voice_1", "Alex": "voice_2"}, 100, 500)
+        assert [pack["turns"] for pack in packs] == [[0, 1], [2], [3], [4]]
+        assert packs[0]["text"] == 'Welcome back to the show. <break time="0.5s" /> Today we look at sleep.'
+        
+        assembled = {
+            "duration_ms": 9000, "sample_rate": 44100, "channels": 1,
+            "spans_ms": [(0, 3500), (4000, 4500), (5000, 6000), (6500, 7500)],
+            "renditions": [{"name": "mp3_128k", "size": 48000}],
+            "waveform": {"path": "podcast_generation-1.peaks", "levels": [512], "size": 100}
+        }
+        with tempfile.TemporaryDirectory() as audio_dir:
+            recorded = []
+            
+            async def record_segment(entry):
+                recorded.append(entry)
+            
+            with patch("app.services.audio_generator.settings") as mock_settings, \
+                 patch.object(self.generator, "_text_to_speech", return_value=b"audio") as mock_tts, \
+                 patch("app.services.audio_generator.assemble_podcast", AsyncMock(return_value=assembled)):
+                mock_settings.elevenlabs_api_key = "test-key"
+                mock_settings.audio_dir = audio_dir
+                mock_settings.audio_renditions = settings.audio_renditions
+                mock_settings.elevenlabs_max_request_chars = 100
+                
+                _, metadata = await self.generator._synthesize_audio(
+                    "generation-1", dialogue, {"personas": self.PERSONAS}, [], record_segment
+                )
+        
+        assert mock_tts.call_count == 4
+        assert [entry["turns"] for entry in recorded] == [[0, 1], [2], [3], [4]]
+        # The pack's speech time is shared by character count around the break
+        turns = metadata["segments"]
+        assert [(t["start_ms"], t["end_ms"]) for t in turns[:2]] == [(0, 1562), (2062, 3500)]
+        assert [t["index"] for t in turns] == [0, 1, 2, 3, 4]
+        assert turns[2]["speaker"] == "Alex" and turns[2]["start_ms"] == 4000
+        print("✅ TTS request packing works correctly")
+
+class TestAudioMetadata:
+    """Unit tests for MP3 header scanning"""
+    
+    # MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono
+    FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC0])
+    
+    def test_frame_header_parsing(self):
+        """Test decoding of a single frame header"""
+        frame = parse_frame_header(self.FRAME_HEADER)
+        
+        assert frame["bitrate"] == 128000
+        assert frame["sample_rate"] == 44100
+        assert frame["channels"] == 1
+        assert frame["length"] == 417
+        assert parse_frame_header(b"\x00\x00\x00\x00") is None
+        print("✅ Frame header parsing works correctly")
+    
+    def test_probe_without_decoding(self):
+        """Test duration and bitrate are read from frame headers"""
+        frame = self.FRAME_HEADER + bytes(417 - 4)
+        
+        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
+            f.write(b"ID3\x03\x00\x00\x00\x00\x00\x0a" + bytes(10))
+            f.write(frame * 100)
+            temp_path = f.name
+        
+        try:
+            metadata = probe_mp3(temp_path)
+            assert metadata["frames"] == 100
+            assert metadata["duration_ms"] == 100 * 1152 * 1000 // 44100
+            assert metadata["bitrate"] == 128000
+            assert metadata["sample_rate"] == 44100
+            print("✅ MP3 probing works correctly")
+        finally:
+            os.unlink(temp_path)
+    
+    def test_splicer_gapless_tag(self):
+        """Test spliced gaps are compensated and the trim is readable from the Info frame"""
+        with tempfile.TemporaryDirectory() as audio_dir:
+            clip_path = os.path.join(audio_dir, "clip.mp3")
+            with open(clip_path, "wb") as f:
+                f.write(silent_frame(44100, 1, 128000) * 10)
+            
+            output_path = os.path.join(audio_dir, "spliced.mp3")
+            splicer = MP3Splicer(output_path, 44100, 1, 128000)
+            first = splicer.add_clip(clip_path)
+            splicer.add_silence(500)
+            second = splicer.add_clip(clip_path)
+            spliced = splicer.finish()
+            metadata = probe_mp3(output_path)
+        
+        assert first == (0, 11520)
+        assert abs(second[0] - first[1] - 22050) <= 576
+        assert metadata["frames"] == spliced["frames"] == 20 + round(22050 / 1152)
+        assert metadata["duration_ms"] == spliced["samples"] * 1000 // 44100
+        assert spliced["size"] == 417 * (spliced["frames"] + 1)
+        print("✅ MP3 splicing works correctly")
+
+class TestAudioPool:
+    """Unit tests for the audio process pool"""
+    
+    MP3_ONLY = [{"name": "mp3_64k", "codec": "libmp3lame", "bitrate": "64k", "format": "mp3",
+                 "extension": "mp3", "mime_type": "audio/mpeg"}]
+    
+    async def test_encodes_off_the_event_loop(self):
+        """Test pool jobs produce audio and are counted in the metrics"""
+        pool = AudioWorkPool(max_workers=1, max_queue=1)
+        
+        with tempfile.TemporaryDirectory() as audio_dir, \
+             patch.object(audio_codec, "get_audio_pool", return_value=pool):
+            bases = [os.path.join(audio_dir, f"tone_{i}") for i in range(3)]
+            results = await asyncio.gather(*(audio_codec.render_tone(440, 1000, base, self.MP3_ONLY) for base in bases))
+            paths = [result["renditions"][0]["path"] for result in results]
+            joined = await audio_codec.assemble_podcast(paths, 500, os.path.join(audio_dir, "joined"), self.MP3_ONLY)
+            
+            assert all(result["duration_ms"] == 1000 for result in results)
+            assert joined["spans_ms"][1][0] - joined["spans_ms"][0][1] == 500
+            assert abs(probe_mp3(os.path.join(audio_dir, "joined.mp3"))["duration_ms"] - joined["duration_ms"]) < 100
+            assert not any(name.endswith(".part") for name in os.listdir(audio_dir))
+        
+        metrics = pool.metrics()
+        pool.shutdown()
+        assert metrics["completed"] == 4 and metrics["failed"] == 0
+        # Three jobs for one worker with one queue slot: one had to wait for a slot
+        assert metrics["peak_queued"] == 1
+        print("✅ Audio pool works correctly")
+    
+    async def test_cancelled_job_leaves_no_output(self):
+        """Test cancelling a running encode stops it and frees its slot"""
+        pool = AudioWorkPool(max_workers=1, max_queue=0)
+        
+        def encoders_writing(audio_dir):
+            # ffmpeg processes, wherever they ended up, still writing into audio_dir
+            found = []
+            for pid in filter(str.isdigit, os.listdir("/proc")):
+                try:
+                    with open(f"/proc/{pid}/cmdline", "rb") as f:
+                        if audio_dir.encode() in f.read():
+                            found.append(pid)
+                except OSError:
+                    pass
+            return found
+        
+        with tempfile.TemporaryDirectory() as audio_dir, \
+             patch.object(audio_codec, "get_audio_pool", return_value=pool):
+            task = asyncio.create_task(audio_codec.render_tone(440, 120000, os.path.join(audio_dir, "tone"), self.MP3_ONLY))
+            deadline = time.monotonic() + 10
+            while not encoders_writing(audio_dir):
+                if task.done():
+                    task.result()  # the job failed before ffmpeg started; report why
+                if time.monotonic() > deadline:
+                    task.cancel()
+                    pytest.fail("ffmpeg never started writing into the audio directory")
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            
+            # The job was stopped, not left to finish, before its files were removed
+            assert encoders_writing(audio_dir) == []
+            assert os.listdir(audio_dir) == []
+            assert pool.metrics()["running"] == 0
+            
+            # Its slot is free for the next job straight away
+            result = await asyncio.wait_for(audio_codec.render_tone(440, 500, os.path.join(audio_dir, "next"), self.MP3_ONLY), 10)
+            assert result["duration_ms"] == 500
+        
+        metrics = pool.metrics()
+        pool.shutdown()
+        assert metrics["cancelled"] == 1 and metrics["completed"] == 1
+        print("✅ Audio pool cancellation works correctly")
+    
+    async def test_host_slots_shared_across_pools(self):
+        """Test pools sharing a slot directory, as processes on one host do, run no more jobs than it has slots"""
+        with tempfile.TemporaryDirectory() as slot_dir:
+            async def run_both(host_workers):
+                pools = [AudioWorkPool(max_workers=1, max_queue=0, slot_dir=slot_dir, host_workers=host_workers)
+                         for _ in range(2)]
+                started = time.monotonic()
+                await asyncio.gather(*(pool.run(time.sleep, 0.5) for pool in pools))
+                elapsed = time.monotonic() - started
+                waits = sorted(pool.metrics()["avg_queue_wait_ms"] for pool in pools)
+                for pool in pools:
+                    pool.shutdown()
+                return elapsed, waits
+            
+            serial, waits = await run_both(1)
+            parallel, _ = await run_both(2)
+        
+        # One slot: the second job waited for the first to finish, and that wait is queue time
+        assert serial >= 1.0 and waits[1] >= 400
+        assert parallel < 1.0
+        print("✅ Host-wide audio slots work correctly")
+    
+    async def test_renditions_from_one_decode(self):
+        """Test every configured rendition is encoded and published"""
+        pool = AudioWorkPool(max_workers=1, max_queue=0)
+        
+        with tempfile.TemporaryDirectory() as audio_dir, \
+             patch.object(audio_codec, "get_audio_pool", return_value=pool):
+            base = os.path.join(audio_dir, "podcast")
+            result = await audio_codec.render_tone(440, 5000, base, settings.audio_renditions)
+            pool.shutdown()
+            
+            sizes = {r["name"]: r["size"] for r in result["renditions"]}
+            assert sorted(os.listdir(audio_dir)) == ["podcast.m4a", "podcast.mp3", "podcast.opus", "podcast.peaks"]
+            assert result["waveform"]["path"] == base + ".peaks"
+            assert all(os.path.getsize(r["path"]) == r["size"] > 0 for r in result["renditions"])
+            assert sizes["opus_48k"] < sizes["mp3_128k"] and sizes["aac_64k"] < sizes["mp3_128k"]
+            assert abs(probe_mp3(base + ".mp3")["duration_ms"] - 5000) < 100
+        print("✅ Rendition encoding works correctly")
+    
+    async def test_splice_matches_encoded_timing(self):
+        """Test frame-copy assembly places turns where a full encode does"""
+        pool = AudioWorkPool(max_workers=1, max_queue=4)
+        primary = audio_codec.primary_rendition(settings.audio_renditions)
+        
+        with tempfile.TemporaryDirectory() as audio_dir, \
+             patch.object(audio_codec, "get_audio_pool", return_value=pool):
+            paths = []
+            for i, rendition in enumerate([primary, primary, {**primary, "name": "mp3_64k", "bitrate": "64k"}]):
+                tone = await audio_codec.render_tone(300 + 100 * i, 700 + 300 * i, os.path.join(audio_dir, f"turn_{i}"), [rendition])
+                paths.append(tone["renditions"][0]["path"])
+            clip_dir = os.path.join(audio_dir, "clips")
+            intro = await audio_codec.render_clip("intro", None, clip_dir, primary)
+            assert await audio_codec.render_clip("intro", None, clip_dir, primary) == intro
+            
+            spliced = await audio_codec.splice_podcast(paths, 500, os.path.join(audio_dir, "spliced"), primary, intro, intro)
+            encoded = await audio_codec.assemble_podcast(paths, 500, os.path.join(audio_dir, "encoded"), [primary], None, intro, intro)
+            pool.shutdown()
+            
+            # Only the 64k turn needed encoding to the splice profile
+            assert spliced["conformed_clips"] == 1
+            assert all(abs(a - b) <= 30 for span, other in zip(spliced["spans_ms"], encoded["spans_ms"]) for a, b in zip(span, other))
+            assert abs(spliced["duration_ms"] - encoded["duration_ms"]) <= 30
+            assert abs(probe_mp3(os.path.join(audio_dir, "spliced.mp3"))["duration_ms"] - spliced["duration_ms"]) <= 1
+            assert os.path.exists(os.path.join(audio_dir, "spliced.peaks"))
+            assert not any(name.endswith(".part") for name in os.listdir(audio_dir) + os.listdir(clip_dir))
+        print("✅ Spliced assembly works correctly")
+
+class TestMixing:
+    """Unit tests for background music ducking"""
+    
+    def _music_level(self, mixed, voice, start, end):
+        import numpy as np
+        
+        music = np.frombuffer(mixed, dtype="<i2")[start:end].astype(float) - np.frombuffer(voice, dtype="<i2")[start:end]
+        return np.sqrt((music ** 2).mean())
+    
+    def test_music_ducks_under_speech(self):
+        """Test the bed drops while the voice is active and recovers after"""
+        import numpy as np
+        
+        rate = 44100
+        t = np.arange(rate) / rate
+        speech = (np.sin(2 * np.pi * 300 * t) * 12000).astype("<i2").tobytes()
+        quiet = bytes(rate * 2)
+        mixer = DuckingMixer(rate, 1, bed_db=-20, duck_db=-40)
+        
+        # Uneven chunks, as segments arrive
+        chunks = [quiet, speech[:30000], speech[30000:], quiet]
+        mixed = [mixer.mix(chunk) for chunk in chunks]
+        mixer.close()
+        
+        bed = self._music_level(mixed[0], chunks[0], 0, rate)
+        ducked = self._music_level(mixed[2], chunks[2], 10000, 20000)
+        recovered = self._music_level(mixed[3], chunks[3], rate // 2, rate)
+        assert ducked < bed / 5
+        assert recovered > bed * 0.8
+        print("✅ Music ducking works correctly")
+    
+    def test_smoothing_matches_per_window_loop(self):
+        """Test the vectorized attack/release smoothing equals stepping window by window"""
+        import numpy as np
+        
+        mixer = DuckingMixer(44100, 1, bed_db=-20, duck_db=-40)
+        mixer.close()
+        rng = np.random.default_rng(0)
+        # Ten minutes of windows in runs of speech and silence, longer than one block
+        runs = rng.integers(1, 300, size=200)
+        targets = np.repeat(np.resize([mixer.duck_gain, mixer.bed_gain], len(runs)), runs)
+        mixer.gain = (mixer.bed_gain + mixer.duck_gain) / 2
+        
+        expected = []
+        gain = mixer.gain
+        for target in targets:
+            gain += (target - gain) * (mixer.attack if target < gain else mixer.release)
+            expected.append(gain)
+        
+        assert len(targets) > mixer.block
+        assert np.allclose(mixer._smooth(targets), expected, rtol=1e-9, atol=1e-12)
+        print("✅ Ducking smoothing works correctly")
+    
+    def test_music_file_loops(self):
+        """Test a bed shorter than the podcast loops instead of running out"""
+        import numpy as np
+        
+        with tempfile.TemporaryDirectory() as audio_dir:
+            renditions = [("bed.mp3", TestAudioPool.MP3_ONLY[0])]
+            audio_codec._job_tone([(os.path.join(audio_dir, path), r) for path, r in renditions],
+                                  os.path.join(audio_dir, "bed.peaks"), 440, 500)
+            
+            mixer = DuckingMixer(44100, 1, music_path=os.path.join(audio_dir, "bed.mp3"))
+            voice = bytes(44100 * 2 * 3)  # three seconds of silence
+            mixed = mixer.mix(voice)
+            mixer.close()
+        
+        tail = np.frombuffer(mixed, dtype="<i2")[-44100:]
+        assert len(mixed) == len(voice) and np.abs(tail).max() > 0
+        print("✅ Music looping works correctly")
+
+class TestWaveform:
+    """Unit tests for waveform peak sidecars"""
+    
+    def test_peaks_match_naive_computation(self):
+        """Test chunked, vectorized peaks equal a per-block min/max at every level"""
+        import numpy as np
+        
+        rng = np.random.default_rng(0)
+        samples = (rng.standard_normal(44100 * 3) * 8000).clip(-32768, 32767).astype("<i2")
+        builder = WaveformBuilder(44100, 1, samples_per_peak=512)
+        
+        # Feed in uneven chunks, as segment decodes arrive
+        position = 0
+        for size in rng.integers(100, 20000, size=1000):
+            builder.feed(samples[position:position + size].tobytes())
+            position += size
+            if position >= len(samples):
+                break
+        levels = builder.finish()
+        
+        for samples_per_peak, peaks in levels:
+            expected = [
+                (samples[i:i + samples_per_peak].min(), samples[i:i + samples_per_peak].max())
+                for i in range(0, len(samples), samples_per_peak)
+            ]
+            assert len(peaks) == 2 * len(expected)
+            assert all(peaks[2 * j] == np.floor(lo / 256) and peaks[2 * j + 1] == min(127, np.ceil(hi / 256))
+                       for j, (lo, hi) in enumerate(expected))
+        assert [samples_per_peak for samples_per_peak, _ in levels] == [512, 2048, 8192, 32768]
+        print("✅ Waveform peaks work correctly")
+    
+    def test_sidecar_round_trip(self):
+        """Test each level can be read back on its own"""
+        import numpy as np
+        
+        builder = WaveformBuilder(44100, 2)
+        builder.feed((np.ones(44100 * 2, dtype="<i2") * 16384).tobytes())
+        levels = builder.finish()
+        
+        with tempfile.NamedTemporaryFile(suffix='.peaks', delete=False) as f:
+            temp_path = f.name
+        try:
+            size = write_peaks(temp_path, 44100, levels)
+            assert size == os.path.getsize(temp_path)
+            coarse = read_peaks(temp_path, 3)
+            assert coarse["samples_per_peak"] == 512 * 64
+            assert coarse["peaks"][:2] == [0.5, 0.5]
+            assert len(read_peaks(temp_path, 0)["peaks"]) == len(levels[0][1])
+        finally:
+            os.unlink(temp_path)
+        print("✅ Waveform sidecar works correctly")
+
+class TestCitations:
+    """Unit tests for source attribution and the transcript index"""
+    
+    async def test_turns_cite_similar_chunks(self):
+        """Test each turn is tagged with its closest chunks above the threshold, ranked by pgvector"""
+        import numpy as np
+        
+        chunk_a, chunk_b = uuid.uuid4(), uuid.uuid4()
+        document_ids = [uuid.uuid4()]
+        nearest = [[(chunk_a, 0.05), (chunk_b, 0.9)], [(chunk_b, 0.8)]]
+        queries = []
+        
+        async def execute(query):
+            queries.append(str(query.compile(dialect=postgresql.dialect())))
+            result = Mock()
+            result.all.return_value = nearest[len(queries) - 1]
+            return result
+        
+        db = Mock()
+        db.execute = execute
+        model = Mock()
+        model.encode.return_value = np.array([[0.9, 0.1, 0.0], [0.0, 0.0, 1.0]])
+        dialogue = [{"speaker": "Alex", "text": "About A"}, {"speaker": "Sam", "text": "Unrelated"}]
+        
+        attributed = await attribute_sources(db, model, document_ids, dialogue)
+        
+        assert attributed[0]["source_chunk_ids"] == [str(chunk_a)]
+        assert attributed[1]["source_chunk_ids"] == []
+        model.encode.assert_called_once_with(["About A", "Unrelated"])
+        # One nearest-neighbour query per turn, over the given documents only
+        assert len(queries) == 2
+        assert all("document_chunks.document_id IN" in sql and "ORDER BY document_chunks.embedding <=>" in sql
+                   and "LIMIT" in sql for sql in queries)
+        assert await attribute_sources(db, model, [], dialogue) == [{**turn, "source_chunk_ids": []} for turn in dialogue]
+        assert len(queries) == 2
+        print("✅ Source attribution works correctly")
+    
+    def test_transcript_uses_assembled_offsets(self):
+        """Test transcript turns carry the assembler's offsets, sorted by time"""
+        dialogue = [
+            {"speaker": "Alex", "text": "First", "source_chunk_ids": ["c1"]},
+            {"speaker": "Sam", "text": "Second", "source_chunk_ids": []}
+        ]
+        segments = [
+            {"index": 1, "speaker": "Sam", "start_ms": 1500, "end_ms": 2500},
+            {"index": 0, "speaker": "Alex", "start_ms": 0, "end_ms": 1000}
+        ]
+        
+        turns = build_transcript(dialogue, segments)
+        
+        assert [turn["text"] for turn in turns] == ["First", "Second"]
+        assert turns[0]["source_chunk_ids"] == ["c1"] and turns[1]["start_ms"] == 1500
+        print("✅ Transcript building works correctly")
+
+class TestContextSelection:
+    """Unit tests for choosing document excerpts for concept extraction"""
+    
+    async def test_every_document_is_covered(self):
+        """Test a small document's topic is selected even when a large one dominates"""
+        import numpy as np
+        from types import SimpleNamespace
+        
+        rng = np.random.default_rng(1)
+        documents = [SimpleNamespace(id=uuid.uuid4(), original_filename=f"doc_{i}.pdf", content="") for i in range(3)]
+        chunks = []
+        # 60 chunks on one topic in the first document, 4 each on other topics in the rest
+        for position, (document, count) in enumerate(zip(documents, [60, 4, 4])):
+            topic = np.eye(16)[position]
+            for index in range(count):
+                chunks.append(SimpleNamespace(
+                    id=uuid.uuid4(), document_id=document.id, chunk_index=index,
+                    content=f"{document.original_filename} chunk {index} " + "word " * 400,
+                    embedding=topic + rng.normal(0, 0.05, 16)
+                ))
+        
+        async def execute(query):
+            result = Mock()
+            if query.selected_columns[0].table.name == "documents":
+                result.all.return_value = [(document.id, document.content) for document in documents]
+            elif len(query.selected_columns) == 2:
+                result.all.return_value = [(chunk.id, chunk.embedding) for chunk in chunks]
+            else:
+                result.all.return_value = chunks
+            return result
+        
+        db = Mock()
+        db.execute = execute
+        context = await select_context(db, uuid.uuid4(), documents, token_budget=900)
+        
+        assert all(f"[doc_{i}.pdf]" in context for i in range(3))
+        assert len(context) <= 900 * 4 + 100
+        # Without embeddings the budget is shared evenly instead
+        chunks.clear()
+        for document in documents:
+            document.content = "text " * 5000
+        parts = (await select_context(db, uuid.uuid4(), documents, token_budget=1200)).split("\n\n")
+        assert len(parts) == 3 and all(len(part) <= 1600 + 3 for part in parts)
+        print("✅ Context selection works correctly")
+
+class TestPagination:
+    """Unit tests for keyset pagination"""
+    
+    def test_cursor_round_trip(self):
+        """Test cursors decode to the row they were made from and bad ones are rejected"""
+        created_at, row_id = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc), uuid.uuid4()
+        assert decode_cursor(encode_cursor(created_at, row_id)) == (created_at, row_id)
+        for cursor in ("garbage", encode_cursor(created_at, row_id)[:-4]):
+            with pytest.raises(ValueError):
+                decode_cursor(cursor)
+        print("✅ Pagination cursors work correctly")
+    
+    def test_page_seeks_past_cursor(self):
+        """Test pages seek with a row comparison on the index order and report the next cursor"""
+        cursor = encode_cursor(datetime(2026, 1, 1, tzinfo=timezone.utc), uuid.uuid4())
+        query = keyset_page(
+            select(AudioGeneration.id).where(AudioGeneration.project_id == uuid.uuid4()),
+            AudioGeneration.created_at, AudioGeneration.id, cursor, 20
+        )
+        sql = str(query.compile(dialect=postgresql.dialect()))
+        assert "(audio_generations.created_at, audio_generations.id) < (" in sql
+        assert "ORDER BY audio_generations.created_at DESC, audio_generations.id DESC" in sql
+        assert "LIMIT" in sql
+        
+        rows = [Mock(id=uuid.uuid4(), sort_key=datetime(2026, 1, 1, tzinfo=timezone.utc)) for _ in range(3)]
+        items, next_cursor = page_items(rows, 2)
+        assert items == rows[:2] and decode_cursor(next_cursor)[1] == rows[1].id
+        assert page_items(rows, 3) == (rows, None)
+        print("✅ Keyset pages work correctly")
+
+class TestAuthCache:
+    """Unit tests for the authenticated user cache"""
+    
+    def setup_method(self):
+        principal_cache.clear()
+    
+    def _db(self, user):
+        db = Mock()
+        result = Mock()
+        result.scalar_one_or_none.return_value = user
+        db.execute = AsyncMock(return_value=result)
+        return db
+    
+    async def test_repeat_requests_skip_lookup(self):
+        """Test a token is decoded and its user loaded once, until the user changes"""
+        user = User(id=uuid.uuid4(), email="cache@example.com", name="Cache", hashed_password="x")
+        token = jwt.encode({"sub": user.email, "exp": int(time.time()) + 600}, settings.secret_key, algorithm=settings.algorithm)
+        db = self._db(user)
+        
+        assert await get_current_user(token, db) is user
+        assert await get_current_user(token, db) is user
+        assert db.execute.await_count == 1
+        db.expunge.assert_called_once_with(user)
+        
+        # An ORM update of the user drops its tokens
+        assert event.contains(User, "after_update", auth._invalidate_changed_user)
+        auth._invalidate_changed_user(User.__mapper__, None, user)
+        await get_current_user(token, db)
+        assert db.execute.await_count == 2
+        print("✅ Auth cache lookups work correctly")
+    
+    def test_entries_expire_and_are_bounded(self):
+        """Test entries end with their token and the least recently used are evicted"""
+        cache = PrincipalCache(max_entries=2, ttl=60)
+        users = [Mock(id=uuid.uuid4()) for _ in range(3)]
+        cache.put("expired", users[0], token_expires_at=time.time() - 1)
+        assert cache.get("expired") is None
+        
+        cache.put("a", users[0])
+        cache.put("b", users[1])
+        cache.get("a")
+        cache.put("c", users[2])
+        assert cache.get("a") is users[0] and cache.get("b") is None and cache.get("c") is users[2]
+        print("✅ Auth cache expiry works correctly")
+
+class TestPasswordHasher:
+    """Unit tests for pooled password hashing"""
+    
+    async def test_hashes_upgrade_to_current_cost(self):
+        """Test hashes verify off the event loop and older costs are flagged for rehashing"""
+        hasher = PasswordHasher(max_workers=2, max_queue=0, rounds=4)
+        hashed = await hasher.hash("correct horse")
+        assert hashed.startswith("$2b$04$")
+        assert await hasher.verify_and_update("correct horse", hashed) == (True, None)
+        assert (await hasher.verify_and_update("wrong", hashed))[0] is False
+        
+        stronger = PasswordHasher(max_workers=1, max_queue=0, rounds=5)
+        verified, new_hash = await stronger.verify_and_update("correct horse", hashed)
+        assert verified and new_hash.startswith("$2b$05$")
+        hasher.shutdown()
+        stronger.shutdown()
+        print("✅ Password hash cost upgrade works correctly")
+    
+    async def test_rejects_beyond_queue(self):
+        """Test callers past workers + max_queue are turned away instead of queueing"""
+        hasher = PasswordHasher(max_workers=1, max_queue=1, rounds=4)
+        results = await asyncio.gather(*(hasher.hash("pw") for _ in range(3)), return_exceptions=True)
+        assert sum(isinstance(result, PasswordHasherBusy) for result in results) == 1
+        assert hasher.metrics()["rejected"] == 1 and hasher.metrics()["in_flight"] == 0
+        hasher.shutdown()
+        print("✅ Password hasher limit works correctly")
+
+class TestAudioStreaming:
+    """Unit tests for range-aware file serving"""
+    
+    def setup_method(self):
+        from fastapi import FastAPI, Request
+        
+        self.data = bytes(range(256)) * 40
+        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
+            f.write(self.data)
+            self.path = f.name
+        
+        app = FastAPI()
+        
+        @app.api_route("/audio", methods=["GET", "HEAD"])
+        async def audio(request: Request):
+            return RangeFileResponse(self.path, request, "audio/mpeg")
+        
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    
+    def teardown_method(self):
+        os.unlink(self.path)
+    
+    async def test_range_requests(self):
+        """Test seeking transfers only the requested bytes"""
+        full = await self.client.get("/audio")
+        assert full.status_code == 200 and full.content == self.data
+        assert full.headers["accept-ranges"] == "bytes"
+        
+        partial = await self.client.get("/audio", headers={"Range": "bytes=100-199"})
+        assert partial.status_code == 206
+        assert partial.content == self.data[100:200]
+        assert partial.headers["content-range"] == f"bytes 100-199/{len(self.data)}"
+        
+        suffix = await self.client.get("/audio", headers={"Range": "bytes=-10"})
+        assert suffix.content == self.data[-10:]
+        
+        unsatisfiable = await self.client.get("/audio", headers={"Range": f"bytes={len(self.data)}-"})
+        assert unsatisfiable.status_code == 416
+        assert unsatisfiable.headers["content-range"] == f"bytes */{len(self.data)}"
+        
+        head = await self.client.head("/audio")
+        assert head.content == b"" and head.headers["content-length"] == str(len(self.data))
+        print("✅ Range requests work correctly")
+    
+    async def test_conditional_requests(self):
+        """Test repeat plays revalidate instead of re-downloading"""
+        first = await self.client.get("/audio")
+        etag = first.headers["etag"]
+        assert "max-age" in first.headers["cache-control"]
+        
+        cached = await self.client.get("/audio", headers={"If-None-Match": etag})
+        assert cached.status_code == 304 and cached.content == b""
+        
+        # A stale If-Range means the client's bytes are from an older file
+        stale = await self.client.get("/audio", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        assert stale.status_code == 200 and stale.content == self.data
+        print("✅ Conditional requests work correctly")
+    
+    async def test_media_urls_carry_a_scoped_token(self):
+        """Test media URLs play without the session token, and their token opens nothing else"""
+        from fastapi import FastAPI
+        from app.database import get_db
+        from app.routers import audio
+        
+        owner = User(id=uuid.uuid4(), email="media@example.com", name="Media", hashed_password="x")
+        generation = AudioGeneration(
+            id=uuid.uuid4(), project_id=uuid.uuid4(), status="completed", audio_url=self.path,
+            audio_metadata={"waveform": {"path": self.path, "levels": [1]}}
+        )
+        other = AudioGeneration(id=uuid.uuid4(), project_id=generation.project_id, status="completed", audio_url=self.path)
+        found = Mock()
+        found.scalar_one_or_none.return_value = owner
+        db = Mock(execute=AsyncMock(return_value=found), expunge=Mock())
+        db.get = AsyncMock(side_effect=lambda model, key: {
+            generation.id: generation, other.id: other
+        }.get(key, Mock(owner_id=owner.id)))
+        
+        async def fake_db():
+            yield db
+        
+        app = FastAPI()
+        app.include_router(audio.router, prefix="/api/audio")
+        app.dependency_overrides[get_db] = fake_db
+        session_token = jwt.encode(
+            {"sub": owner.email, "exp": int(time.time()) + 600}, settings.secret_key, algorithm=settings.algorithm
+        )
+        principal_cache.clear()
+        
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+        with patch.object(settings, "audio_dir", os.path.dirname(self.path)):
+            urls = (await client.post(
+                f"/api/audio/generations/{generation.id}/media-urls",
+                headers={"Authorization": f"Bearer {session_token}"}
+            )).json()
+            media_token = httpx.URL(urls["audio_url"]).params["media_token"]
+            
+            played = await client.get(urls["audio_url"], headers={"Range": "bytes=0-9"})
+            assert played.status_code == 206 and played.content == self.data[:10]
+            assert (await client.get(urls["waveform_url"])).status_code == 200
+            assert urls["expires_at"] <= time.time() + settings.media_token_expire_seconds
+            
+            # Not another generation's audio, not the rest of the API, and no session tokens in URLs
+            assert (await client.get(f"/api/audio/generations/{other.id}/audio",
+                                     params={"media_token": media_token})).status_code == 401
+            assert (await client.get(f"/api/audio/generations/{generation.id}/citations",
+                                     headers={"Authorization": f"Bearer {media_token}"})).status_code == 401
+            assert (await client.get(f"/api/audio/generations/{generation.id}/audio",
+                                     params={"media_token": session_token})).status_code == 401
+        print("✅ Scoped media URLs work correctly")
+
+class TestRateLimiter:
+    """Unit tests for provider rate limiting and retries"""
+    
+    def setup_method(self):
+        # Not shared: exercise the in-process buckets
+        self.limiter = RateLimiter()
+        self.limiter.limits["elevenlabs"] = (600, 600)  # 10 per second
+    
+    async def test_bucket_limits_characters(self):
+        """Test a request waits when the character budget is spent"""
+        assert await self.limiter._try_acquire("elevenlabs", "test-key", 600) == 0
+        
+        wait_ms = await self.limiter._try_acquire("elevenlabs", "test-key", 60)
+        assert 5000 < wait_ms <= 6100
+        
+        # Buckets are per API key
+        assert await self.limiter._try_acquire("elevenlabs", "other-key", 60) == 0
+        print("✅ Rate limiter buckets work correctly")
+    
+    async def test_retries_honour_retry_after(self):
+        """Test throttled calls are retried and other errors surface"""
+        attempts = []
+        
+        async def throttled_once():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise httpx.HTTPStatusError(
+                    "Too Many Requests",
+                    request=httpx.Request("POST", "http://tts.test"),
+                    response=httpx.Response(429, headers={"retry-after": "0.05"})
+                )
+            return "audio"
+        
+        async def unauthorized():
+            raise httpx.HTTPStatusError(
+                "Unauthorized",
+                request=httpx.Request("POST", "http://tts.test"),
+                response=httpx.Response(401)
+            )
+        
+        with patch.object(settings, "provider_backoff_base", 0.01):
+            assert await self.limiter.call("elevenlabs", "test-key", 10, throttled_once) == "audio"
+            assert len(attempts) == 2
+            
+            with pytest.raises(ProviderError):
+                await self.limiter.call("elevenlabs", "test-key", 10, unauthorized)
+        print("✅ Provider retries work correctly")
+    
+    async def test_shared_buckets_use_the_loops_client(self):
+        """Test shared buckets run the script by hash on the calling loop's client, reloading it if missing"""
+        from redis.exceptions import NoScriptError
+        
+        class FakeRedis:
+            def __init__(self):
+                self.loaded = False
+                self.calls = []
+            
+            async def evalsha(self, sha, numkeys, *keys_and_args):
+                self.calls.append("evalsha")
+                if not self.loaded:
+                    raise NoScriptError("NOSCRIPT")
+                return 0
+            
+            async def eval(self, script, numkeys, *keys_and_args):
+                self.calls.append("eval")
+                self.loaded = True
+                return 0
+        
+        client = FakeRedis()
+        limiter = RateLimiter(shared=True)
+        with patch("app.services.rate_limiter.get_redis", return_value=client) as get_client:
+            assert await limiter._try_acquire("elevenlabs", "test-key", 10) == 0
+            assert await limiter._try_acquire("elevenlabs", "test-key", 10) == 0
+        assert client.calls == ["evalsha", "eval", "evalsha"]
+        assert get_client.call_count == 2
+        print("✅ Shared rate limiter buckets work correctly")
+
+class TestCancellation:
+    """Unit tests for generation cancellation and deadlines"""
+    
+    async def test_watcher_interrupts_running_work(self):
+        """Test a cancel flag interrupts whatever the pipeline is awaiting"""
+        flags = set()
+        
+        class FakeRedis:
+            async def exists(self, key):
+                return key in flags
+        
+        async def cancel_soon():
+            await asyncio.sleep(0.05)
+            flags.add("voxy:cancel:generation-1")
+        
+        with patch("app.services.cancellation.get_redis", return_value=FakeRedis()), \
+             patch.object(settings, "cancellation_poll_interval", 0.01):
+            canceller = asyncio.create_task(cancel_soon())
+            with pytest.raises(GenerationCancelled):
+                async with CancellationWatcher("generation-1"):
+                    await asyncio.sleep(5)
+            await canceller
+        print("✅ Cancellation interrupts running work correctly")
+    
+    async def test_stage_deadline(self):
+        """Test a stage that overruns its deadline is stopped"""
+        with patch.dict(settings.generation_stage_timeouts, {"outline": 0.01}):
+            with pytest.raises(StageTimeout):
+                async with stage_deadline("outline"):
+                    await asyncio.sleep(1)
+        print("✅ Stage deadlines work correctly")
+    
+    async def test_cancel_requires_owner(self):
+        """Test only the project's owner can cancel a generation"""
+        from app.routers.audio import cancel_generation
+        
+        generation = Mock(id=uuid.uuid4(), project_id=uuid.uuid4(), status="processing")
+        db = Mock(get=AsyncMock(side_effect=[generation, Mock(owner_id=uuid.uuid4())]), commit=AsyncMock())
+        with patch("app.routers.audio.request_cancellation", AsyncMock()) as request:
+            with pytest.raises(HTTPException) as error:
+                await cancel_generation(str(generation.id), db, Mock(id=uuid.uuid4()))
+        assert error.value.status_code == 403
+        assert generation.status == "processing"
+        request.assert_not_awaited()
+        db.commit.assert_not_awaited()
+        print("✅ Cancellation ownership check works correctly")
+    
+    async def test_retry_requires_owner(self):
+        """Test only the project's owner can requeue a failed generation"""
+        from app.routers.audio import retry_generation
+        
+        generation = Mock(id=uuid.uuid4(), project_id=uuid.uuid4(), status="failed")
+        db = Mock(get=AsyncMock(side_effect=[generation, Mock(owner_id=uuid.uuid4())]), commit=AsyncMock())
+        with patch("app.routers.audio.enqueue_generation") as enqueue:
+            with pytest.raises(HTTPException) as error:
+                await retry_generation(str(generation.id), db, Mock(id=uuid.uuid4()))
+        assert error.value.status_code == 403
+        assert generation.status == "failed"
+        enqueue.assert_not_called()
+        print("✅ Retry ownership check works correctly")
+
+class TestGenerationReuse:
+    """Unit tests for generation fingerprinting and coalescing"""
+    
+    def setup_method(self):
+        self.project_id = uuid.uuid4()
+        result = Mock()
+        result.all.return_value = [(uuid.uuid4(), "a" * 64), (uuid.uuid4(), "b" * 64)]
+        self.db = Mock()
+        self.db.execute = AsyncMock(return_value=result)
+        self.settings = {
+            "duration": "10-15",
+            "personas": [{"name": "Dr. Smith"}, {"name": "Alex"}],
+            "tone": "balanced",
+            "focus_areas": ["Ethics", "history"],
+            "citation_style": "inline"
+        }
+    
+    async def test_fingerprint_ignores_cosmetic_differences(self):
+        """Test equivalent settings share a fingerprint and real changes don't"""
+        original = await generation_fingerprint(self.db, self.project_id, self.settings)
+        reordered = await generation_fingerprint(
+            self.db, self.project_id, {**self.settings, "focus_areas": ["History", "ethics"]}
+        )
+        restyled = await generation_fingerprint(self.db, self.project_id, {
+            **self.settings,
+            "tone": " Balanced ",
+            "citation_style": "INLINE",
+            "personas": [{"name": " Dr.  Smith", "id": "host", "avatar": "a.png"}, {"name": "Alex "}],
+            "include_intro": True,
+            "include_outro": True,
+            "background_music": False
+        })
+        retoned = await generation_fingerprint(
+            self.db, self.project_id, {**self.settings, "tone": "debate"}
+        )
+        swapped = await generation_fingerprint(
+            self.db, self.project_id, {**self.settings, "personas": [{"name": "Alex"}, {"name": "Dr. Smith"}]}
+        )
+        revoiced = await generation_fingerprint(self.db, self.project_id, {
+            **self.settings, "personas": [{"name": "Dr. Smith", "voiceId": "AbC"}, {"name": "Alex"}]
+        })
+        
+        assert original == reordered == restyled
+        assert original != retoned
+        assert original != swapped
+        assert revoiced != await generation_fingerprint(self.db, self.project_id, {
+            **self.settings, "personas": [{"name": "Dr. Smith", "voiceId": "abc"}, {"name": "Alex"}]
+        })
+        print("✅ Generation fingerprints work correctly")
+    
+    async def test_redis_client_per_event_loop(self):
+        """Test each event loop gets its own Redis client and keeps it"""
+        async def client():
+            return get_redis()
+        
+        first = get_redis()
+        other = await asyncio.to_thread(asyncio.run, client())
+        
+        assert get_redis() is first
+        assert other is not first
+        print("✅ Per-loop Redis clients work correctly")
+    
+    async def test_claim_collapses_duplicates(self):
+        """Test only the first of two identical requests claims the run"""
+        store = {}
+        
+        class FakeRedis:
+            async def set(self, key, value, nx=False, ex=None):
+                if nx and key in store:
+                    return None
+                store[key] = value.encode()
+                return True
+            
+            async def get(self, key):
+                return store.get(key)
+        
+        with patch("app.services.generation_reuse.get_redis", return_value=FakeRedis()):
+            assert await claim_fingerprint("fingerprint", "generation-1") is None
+            assert await claim_fingerprint("fingerprint", "generation-2") == "generation-1"
+        print("✅ Duplicate generations collapse correctly")
+    
+    async def test_batch_requires_owner(self):
+        """Test a batch can only be started on the caller's own project"""
+        from app.routers.audio import start_batch_generation
+        from app.schemas import AudioGenerationBatchCreate
+        
+        batch = AudioGenerationBatchCreate(project_id=self.project_id, variants=[self.settings])
+        self.db.get = AsyncMock(return_value=Mock(owner_id=uuid.uuid4()))
+        self.db.add = Mock()
+        with patch("app.routers.audio.enqueue_batch") as enqueue:
+            with pytest.raises(HTTPException) as error:
+                await start_batch_generation(batch, True, Mock(id=uuid.uuid4()), self.db)
+        assert error.value.status_code == 404
+        self.db.add.assert_not_called()
+        enqueue.assert_not_called()
+        print("✅ Batch ownership check works correctly")
+
+class TestGenerationWorker:
+    """Unit tests for the generation worker queue"""
+    
+    def test_worker_consumes_queue(self):
+        """Test enqueued generations are picked up by a worker"""
+        from celery.contrib.testing.worker import start_worker
+        
+        processed = []
+        
+        async def fake_generate(generation_id):
+            processed.append(generation_id)
+            return True
+        
+        # Use a local Redis when provided, otherwise Celery's in-process broker;
+        # the app's settings and connections are put back for later tests
+        broker_url = os.environ.get("TEST_BROKER_URL", "memory://")
+        original_broker_url = celery_app.conf.broker_url
+        celery_app.conf.broker_url = broker_url
+        try:
+            with patch.object(tasks.audio_generator, "generate_podcast", fake_generate), \
+                 start_worker(celery_app, pool="solo", perform_ping_check=False):
+                enqueue_generation("generation-1")
+                enqueue_generation("generation-2")
+                
+                for _ in range(50):
+                    if len(processed) == 2:
+                        break
+                    time.sleep(0.1)
+        finally:
+            celery_app.conf.broker_url = original_broker_url
+            celery_app.close()
+        
+        assert processed == ["generation-1", "generation-2"]
+        print("✅ Generation worker consumes the queue correctly")
+
+class TestMockProviders:
+    """Unit tests for the offline provider mocks used by the benchmark"""
+    
+    def setup_method(self):
+        self.anthropic = MockBehaviour(latency_ms=0, jitter_ms=0)
+        self.elevenlabs = MockBehaviour(latency_ms=0, jitter_ms=0)
+        transport = httpx.ASGITransport(app=create_mock_app(self.anthropic, self.elevenlabs))
+        self.client = httpx.AsyncClient(transport=transport, base_url="http://mock")
+    
+    async def test_messages_follow_pipeline_prompts(self):
+        """Test dialogue prompts get speaker-labelled lines"""
+        prompt = "Personas:\n- Alice (Host): curious\n- Bob (Expert): precise\nFormat: SPEAKER_NAME: dialogue"
+        response = await self.client.post("/v1/messages", json={
+            "model": "claude-3-sonnet-20240229",
+            "max_tokens": 600,
+            "messages": [{"role": "user", "content": prompt}]
+        })
+        
+        assert response.status_code == 200
+        lines = response.json()["content"][0]["text"].splitlines()
+        assert lines[0].startswith("Alice: ") and lines[1].startswith("Bob: ")
+        assert response.json()["usage"]["output_tokens"] > 0
+        print("✅ Mock Anthropic replies work correctly")
+    
+    async def test_speech_and_injected_errors(self):
+        """Test TTS returns playable MP3 sized to the text, and failures can be injected"""
+        response = await self.client.post("/v1/text-to-speech/voice_1", json={"text": "x" * 150})
+        
+        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
+            f.write(response.content)
+            temp_path = f.name
+        try:
+            assert abs(probe_mp3(temp_path)["duration_ms"] - 10000) < 100
+        finally:
+            os.unlink(temp_path)
+        
+        self.elevenlabs.error_rate = 1.0
+        response = await self.client.post("/v1/text-to-speech/voice_1", json={"text": "hello"})
+        assert response.status_code in (429, 500, 529)
+        assert self.elevenlabs.errors == 1
+        print("✅ Mock ElevenLabs replies work correctly")
+    
+    async def test_prompt_cache_usage_recorded(self):
+        """Test stages sharing a prefix read it from the mock's cache, and usage is counted"""
+        generator = AudioGenerator()
+        generator.anthropic = AsyncAnthropic(api_key="mock", base_url="http://mock", http_client=self.client)
+        prefix = generator._shared_prefix("Findings about model evidence. " * 300, {'personas': []})
+        
+        track_usage()
+        with patch.object(settings, "anthropic_api_key", "mock"):
+            await generator._complete("List the key concepts.", max_tokens=100, system=prefix)
+            first = merge_usage(None)
+            await generator._complete("Create an outline.", max_tokens=100, system=prefix)
+            usage = merge_usage(first)
+        
+        assert first["cache_creation_input_tokens"] > 1024 and first["cache_read_input_tokens"] == 0
+        assert usage["cache_read_input_tokens"] == first["cache_creation_input_tokens"]
+        assert usage["input_tokens"] < 50 and usage["output_tokens"] > 0
+        assert merge_usage(usage) == usage
+        print("✅ Prompt cache usage works correctly")
 
 async def run_unit_tests():
     """Run all unit tests"""
@@ -86,12 +1449,113 @@ async def run_unit_tests():
     doc_tests.setup_method()
     doc_tests.test_chunk_creation()
     await doc_tests.test_pdf_extraction()
+    doc_tests.test_content_compression()
     
     # Test audio generator
     audio_tests = TestAudioGenerator()
     audio_tests.setup_method()
     await audio_tests.test_concept_extraction()
     await audio_tests.test_dialogue_generation()
+    await audio_tests.test_dialogue_segments_in_parallel()
+    audio_tests.test_outline_and_speaker_parsing()
+    await audio_tests.test_synthesis_resumes_from_checkpoint()
+    await audio_tests.test_batch_shares_upstream_stages()
+    await audio_tests.test_batch_deadline_covers_variants()
+    await audio_tests.test_edit_resynthesizes_changed_turns()
+    await audio_tests.test_splice_reuses_conformed_segments()
+    await audio_tests.test_edit_records_a_revision()
+    await audio_tests.test_turns_packed_by_voice()
+    
+    # Test audio metadata
+    metadata_tests = TestAudioMetadata()
+    metadata_tests.test_frame_header_parsing()
+    metadata_tests.test_probe_without_decoding()
+    metadata_tests.test_splicer_gapless_tag()
+    
+    # Test audio pool
+    pool_tests = TestAudioPool()
+    await pool_tests.test_encodes_off_the_event_loop()
+    await pool_tests.test_cancelled_job_leaves_no_output()
+    await pool_tests.test_host_slots_shared_across_pools()
+    await pool_tests.test_renditions_from_one_decode()
+    await pool_tests.test_splice_matches_encoded_timing()
+    
+    # Test background music
+    mixing_tests = TestMixing()
+    mixing_tests.test_music_ducks_under_speech()
+    mixing_tests.test_smoothing_matches_per_window_loop()
+    mixing_tests.test_music_file_loops()
+    
+    # Test waveform peaks
+    waveform_tests = TestWaveform()
+    waveform_tests.test_peaks_match_naive_computation()
+    waveform_tests.test_sidecar_round_trip()
+    
+    # Test citations
+    citation_tests = TestCitations()
+    await citation_tests.test_turns_cite_similar_chunks()
+    citation_tests.test_transcript_uses_assembled_offsets()
+    
+    # Test context selection
+    context_tests = TestContextSelection()
+    await context_tests.test_every_document_is_covered()
+    
+    # Test pagination
+    pagination_tests = TestPagination()
+    pagination_tests.test_cursor_round_trip()
+    pagination_tests.test_page_seeks_past_cursor()
+    
+    # Test auth cache
+    auth_tests = TestAuthCache()
+    auth_tests.setup_method()
+    await auth_tests.test_repeat_requests_skip_lookup()
+    auth_tests.test_entries_expire_and_are_bounded()
+    
+    # Test password hashing
+    hasher_tests = TestPasswordHasher()
+    await hasher_tests.test_hashes_upgrade_to_current_cost()
+    await hasher_tests.test_rejects_beyond_queue()
+    
+    # Test audio streaming
+    streaming_tests = TestAudioStreaming()
+    streaming_tests.setup_method()
+    await streaming_tests.test_range_requests()
+    await streaming_tests.test_conditional_requests()
+    await streaming_tests.test_media_urls_carry_a_scoped_token()
+    streaming_tests.teardown_method()
+    
+    # Test rate limiter
+    limiter_tests = TestRateLimiter()
+    limiter_tests.setup_method()
+    await limiter_tests.test_bucket_limits_characters()
+    await limiter_tests.test_retries_honour_retry_after()
+    await limiter_tests.test_shared_buckets_use_the_loops_client()
+    
+    # Test cancellation
+    cancellation_tests = TestCancellation()
+    await cancellation_tests.test_watcher_interrupts_running_work()
+    await cancellation_tests.test_stage_deadline()
+    await cancellation_tests.test_cancel_requires_owner()
+    await cancellation_tests.test_retry_requires_owner()
+    
+    # Test generation reuse
+    reuse_tests = TestGenerationReuse()
+    reuse_tests.setup_method()
+    await reuse_tests.test_fingerprint_ignores_cosmetic_differences()
+    await reuse_tests.test_claim_collapses_duplicates()
+    await reuse_tests.test_redis_client_per_event_loop()
+    await reuse_tests.test_batch_requires_owner()
+    
+    # Test generation worker
+    worker_tests = TestGenerationWorker()
+    worker_tests.test_worker_consumes_queue()
+    
+    # Test provider mocks
+    mock_tests = TestMockProviders()
+    mock_tests.setup_method()
+    await mock_tests.test_messages_follow_pipeline_prompts()
+    await mock_tests.test_speech_and_injected_errors()
+    await mock_tests.test_prompt_cache_usage_recorded()
     
     print("\n✅ All unit tests passed!")
 
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Login load test for the Voxy API.
+
+Starts the API with uvicorn once per password hashing pool size, fires
+concurrent logins at /api/auth/token and, at the same time, polls /health
+to show how responsive the rest of the API stays while bcrypt is busy.
+Reports logins/second, login latency, /health latency and how many logins
+were turned away with 503 at each pool size. Throughput should grow with
+the pool up to the number of cores. The database at DATABASE_URL must be up
+(docker-compose up -d postgres); the test registers its own user and
+deletes it afterwards.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).parent / "backend"
+sys.path.append(str(BACKEND))
+
+PASSWORD = "load-test-password"
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_api(workers: int, args) -> subprocess.Popen:
+    """One uvicorn process with a hashing pool of workers threads; returns once it answers"""
+    env = {
+        **os.environ,
+        "PASSWORD_HASH_WORKERS": str(workers),
+        "PASSWORD_HASH_MAX_QUEUE": str(args.max_queue),
+        "BCRYPT_ROUNDS": str(args.rounds),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND, env=env
+    )
+    async with httpx.AsyncClient(base_url=args.url) as client:
+        for _ in range(300):
+            if process.poll() is not None:
+                raise RuntimeError("API exited during startup")
+            try:
+                await client.get("/health")
+                return process
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("API did not start")
+
+
+async def run_level(workers: int, email: str, args) -> dict:
+    process = await start_api(workers, args)
+    try:
+        async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+            await client.post("/api/auth/register", json={"email": email, "name": "Load Test", "password": PASSWORD})
+
+            login_latencies, health_latencies = [], []
+            rejected = 0
+            remaining = args.logins
+            done = asyncio.Event()
+
+            async def log_in():
+                nonlocal rejected, remaining
+                while remaining > 0:
+                    remaining -= 1
+                    started = time.perf_counter()
+                    response = await client.post("/api/auth/token", data={"username": email, "password": PASSWORD})
+                    if response.status_code == 503:
+                        rejected += 1
+                    else:
+                        response.raise_for_status()
+                        login_latencies.append(time.perf_counter() - started)
+
+            async def poll_health():
+                while not done.is_set():
+                    started = time.perf_counter()
+                    (await client.get("/health")).raise_for_status()
+                    health_latencies.append(time.perf_counter() - started)
+                    await asyncio.sleep(args.health_interval_ms / 1000)
+
+            poller = asyncio.create_task(poll_health())
+            started = time.perf_counter()
+            await asyncio.gather(*(log_in() for _ in range(args.concurrency)))
+            wall_seconds = time.perf_counter() - started
+            done.set()
+            await poller
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {
+        "workers": workers,
+        "logins": len(login_latencies),
+        "rejected": rejected,
+        "wall_seconds": wall_seconds,
+        "logins_per_second": len(login_latencies) / wall_seconds,
+        "login_p50": percentile(login_latencies, 0.5),
+        "login_p95": percentile(login_latencies, 0.95),
+        "health_p50": percentile(health_latencies, 0.5),
+        "health_p95": percentile(health_latencies, 0.95),
+        "health_max": max(health_latencies, default=0.0),
+    }
+
+
+async def delete_user(email: str) -> None:
+    from sqlalchemy import delete
+    from app.database import engine, AsyncSessionLocal
+    from app.models import User
+
+    engine.echo = False
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(User).where(User.email == email))
+        await db.commit()
+
+
+def print_report(levels, args):
+    print("\n" + "=" * 60)
+    print(f"📊 LOGIN LOAD TEST REPORT (bcrypt cost {args.rounds}, {os.cpu_count()} cores)")
+    print("=" * 60)
+    for level in levels:
+        print(f"\nHash workers {level['workers']}: {level['logins']} logins in {level['wall_seconds']:.1f}s, "
+              f"{level['rejected']} rejected with 503")
+        print(f"  Throughput: {level['logins_per_second']:.1f} logins/second")
+        print(f"  Login       p50 {level['login_p50'] * 1000:8.0f} ms   p95 {level['login_p95'] * 1000:8.0f} ms")
+        print(f"  /health     p50 {level['health_p50'] * 1000:8.1f} ms   p95 {level['health_p95'] * 1000:8.1f} ms"
+              f"   max {level['health_max'] * 1000:8.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test /api/auth/token at several hashing pool sizes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=16, help="logins in flight at once")
+    parser.add_argument("--logins", type=int, default=64, help="logins per pool size")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--max-queue", type=int, default=16, help="PASSWORD_HASH_MAX_QUEUE for the API")
+    parser.add_argument("--health-interval-ms", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=0, help="defaults to a free port")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+    args.url = f"http://127.0.0.1:{args.port or free_port()}"
+    args.port = int(args.url.rsplit(":", 1)[1])
+
+    print("🚀 VOXY LOGIN LOAD TEST")
+    print("=" * 60)
+
+    email = f"load-test-{uuid.uuid4().hex[:8]}@example.com"
+    levels = []
+    try:
+        for workers in args.workers:
+            print(f"⏳ {args.logins} logins, {args.concurrency} at a time, with {workers} hash workers...")
+            levels.append(await run_level(workers, email, args))
+    finally:
+        await delete_user(email)
+
+    print_report(levels, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"arguments": vars(args), "levels": levels}, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Offline throughput benchmark for the Voxy podcast pipeline.
+
+Runs AudioGenerator.generate_podcast end to end against the mock Anthropic
+and ElevenLabs servers in backend/tests/mock_providers.py, and reports
+podcasts/hour, p50/p95 stage latencies, peak memory and LLM input tokens
+(uncached, written to and read from the prompt cache) at each concurrency
+level. No API keys are needed. The database at DATABASE_URL must be up
+(docker-compose up -d postgres redis); the benchmark seeds its own user and
+project there and deletes them afterwards. Audio is written to a temporary
+directory. ffmpeg must be on PATH. If Redis is unreachable the rate limiter
+falls back to in-process buckets.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / "backend"))
+
+from tests.mock_providers import MockBehaviour, MockProviderServer
+
+STAGES = {
+    "concepts": "_extract_key_concepts",
+    "outline": "_create_conversation_outline",
+    "dialogue": "_generate_dialogue",
+    "synthesis": "_synthesize_audio",
+}
+
+PERSONAS = [
+    {"name": "Dr. Sarah Chen", "role": "Subject Matter Expert", "voiceId": "voice_1",
+     "personality": "Thoughtful and precise", "speakingStyle": "Academic but accessible"},
+    {"name": "Marcus Rivera", "role": "Investigative Journalist", "voiceId": "voice_2",
+     "personality": "Curious and skeptical", "speakingStyle": "Clear and direct"},
+]
+
+
+def configure_environment(work_dir: str, mock_url: str, prompt_caching: bool = True) -> None:
+    """Point the app at the mocks before its settings are first imported"""
+    os.environ.update({
+        "ANTHROPIC_PROMPT_CACHING": "true" if prompt_caching else "false",
+        "AUDIO_DIR": os.path.join(work_dir, "audio"),
+        "ANTHROPIC_API_KEY": "mock-anthropic-key",
+        "ANTHROPIC_BASE_URL": mock_url,
+        "ELEVENLABS_API_KEY": "mock-elevenlabs-key",
+        "ELEVENLABS_BASE_URL": mock_url,
+        # The mocks are the thing under load; don't let client limits cap them
+        "ANTHROPIC_REQUESTS_PER_MINUTE": "1000000",
+        "ANTHROPIC_TOKENS_PER_MINUTE": "1000000000",
+        "ELEVENLABS_REQUESTS_PER_MINUTE": "1000000",
+        "ELEVENLABS_CHARACTERS_PER_MINUTE": "1000000000",
+        "PROVIDER_BACKOFF_BASE": "0.1",
+        "CANCELLATION_POLL_INTERVAL": "5",
+    })
+    os.makedirs(os.path.join(work_dir, "audio"), exist_ok=True)
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class VoxyBenchmarkRunner:
+    def __init__(self, args):
+        self.args = args
+        self.generator = None
+        self.timings = {}
+
+    async def setup(self):
+        """Create the schema, a project with documents, and an instrumented generator"""
+        from app.database import engine, Base, AsyncSessionLocal
+        from app.models import User, Project, Document
+        from app.services.audio_generator import AudioGenerator
+        from app.services.rate_limiter import RateLimiter
+        from app.redis_client import get_redis
+        from app.config import settings
+
+        engine.echo = False
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with AsyncSessionLocal() as db:
+            user = User(email=f"benchmark-{uuid.uuid4().hex[:8]}@example.com", name="Benchmark", hashed_password="-")
+            db.add(user)
+            await db.flush()
+            project = Project(name="Benchmark project", owner_id=user.id)
+            db.add(project)
+            await db.flush()
+            for i in range(self.args.documents):
+                content = f"Benchmark document {i}. " + " ".join(
+                    f"Sentence {j} discusses topic {j % 17} in document {i}." for j in range(self.args.document_sentences)
+                )
+                db.add(Document(
+                    project_id=project.id,
+                    filename=f"doc_{i}.txt",
+                    original_filename=f"doc_{i}.txt",
+                    file_type="text/plain",
+                    file_size=len(content),
+                    content=content,
+                    content_hash=hashlib.sha256(content.encode()).hexdigest(),
+                    status="ready"
+                ))
+            await db.commit()
+            self.user_id = user.id
+            self.project_id = project.id
+
+        self.generator = AudioGenerator()
+        try:
+            await get_redis().ping()
+            print(f"✅ Using Redis at {settings.redis_url}")
+        except Exception:
+            print("ℹ️  Redis not reachable, using in-process rate limiting")
+            self.generator.rate_limiter = RateLimiter()
+
+        self._instrument()
+
+    def _instrument(self):
+        """Time each pipeline stage by wrapping the generator's stage methods"""
+        for stage, method_name in STAGES.items():
+            self.timings[stage] = []
+            original = getattr(self.generator, method_name)
+
+            async def timed(*args, _original=original, _stage=stage, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await _original(*args, **kwargs)
+                finally:
+                    self.timings[_stage].append(time.perf_counter() - start)
+
+            setattr(self.generator, method_name, timed)
+
+    async def run_level(self, concurrency: int):
+        """Generate a batch of podcasts with at most `concurrency` in flight"""
+        from sqlalchemy import select
+        from app.config import settings
+        from app.database import AsyncSessionLocal
+        from app.models import AudioGeneration
+        from app.services.audio_pool import get_audio_pool
+        from app.services.llm_usage import USAGE_FIELDS
+
+        for values in self.timings.values():
+            values.clear()
+
+        async with AsyncSessionLocal() as db:
+            generations = []
+            batch_id = uuid.uuid4() if self.args.batch else None
+            for i in range(self.args.podcasts):
+                generation = AudioGeneration(
+                    project_id=self.project_id,
+                    batch_id=batch_id,
+                    status="queued",
+                    settings={
+                        "duration": self.args.duration,
+                        "personas": PERSONAS,
+                        # Vary the tone so prompts (and mock replies) differ per podcast
+                        "tone": ["educational", "entertaining", "balanced", "debate"][i % 4],
+                        "focus_areas": [f"run-{concurrency}-{i}"],
+                        "include_intro": True,
+                        "include_outro": True,
+                        "background_music": False,
+                        "citation_style": "inline",
+                    }
+                )
+                db.add(generation)
+                generations.append(generation)
+            await db.commit()
+            generation_ids = [str(generation.id) for generation in generations]
+
+        semaphore = asyncio.Semaphore(concurrency)
+        totals = []
+
+        async def run_one(generation_id):
+            async with semaphore:
+                start = time.perf_counter()
+                ok = await self.generator.generate_podcast(generation_id)
+                totals.append(time.perf_counter() - start)
+                return ok
+
+        peak_rss = current_rss()
+        sampling = True
+
+        async def sample_memory():
+            nonlocal peak_rss
+            while sampling:
+                peak_rss = max(peak_rss, current_rss())
+                await asyncio.sleep(0.05)
+
+        sampler = asyncio.create_task(sample_memory())
+        start = time.perf_counter()
+        if self.args.batch:
+            # The level's podcasts as variants of one batch, as the batch worker task runs them
+            settings.batch_variant_concurrency = concurrency
+            results = await self.generator.generate_batch(generation_ids)
+            totals.append(time.perf_counter() - start)
+        else:
+            results = await asyncio.gather(*(run_one(generation_id) for generation_id in generation_ids))
+        wall = time.perf_counter() - start
+        sampling = False
+        await sampler
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(AudioGeneration.llm_usage).where(AudioGeneration.id.in_([uuid.UUID(generation_id) for generation_id in generation_ids]))
+            )
+            llm_usage = {field: 0 for field in USAGE_FIELDS}
+            for (usage,) in result.all():
+                for field in USAGE_FIELDS:
+                    llm_usage[field] += (usage or {}).get(field, 0)
+
+        completed = sum(1 for ok in results if ok)
+        stages = {
+            stage: {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+            for stage, values in list(self.timings.items()) + [("total", totals)]
+        }
+        return {
+            "concurrency": concurrency,
+            "podcasts": len(generation_ids),
+            "completed": completed,
+            "wall_seconds": wall,
+            "podcasts_per_hour": completed / wall * 3600 if wall else 0.0,
+            "stages": stages,
+            "peak_rss_mb": peak_rss / (1024 * 1024),
+            "llm_usage": llm_usage,
+            # Cumulative for the benchmark process, across all levels so far
+            "audio_pool": get_audio_pool().metrics(),
+        }
+
+    async def cleanup(self):
+        """Delete everything the benchmark seeded"""
+        from sqlalchemy import delete, select
+        from app.database import AsyncSessionLocal
+        from app.models import User, Project, Document, DocumentChunk, AudioGeneration, Citation
+
+        async with AsyncSessionLocal() as db:
+            generation_ids = select(AudioGeneration.id).where(AudioGeneration.project_id == self.project_id)
+            document_ids = select(Document.id).where(Document.project_id == self.project_id)
+            await db.execute(delete(Citation).where(Citation.generation_id.in_(generation_ids)))
+            await db.execute(delete(AudioGeneration).where(AudioGeneration.project_id == self.project_id))
+            await db.execute(delete(DocumentChunk).where(DocumentChunk.document_id.in_(document_ids)))
+            await db.execute(delete(Document).where(Document.project_id == self.project_id))
+            await db.execute(delete(Project).where(Project.id == self.project_id))
+            await db.execute(delete(User).where(User.id == self.user_id))
+            await db.commit()
+
+    def print_report(self, levels):
+        print("\n" + "=" * 60)
+        print("📊 PIPELINE BENCHMARK REPORT")
+        print("=" * 60)
+        for level in levels:
+            print(f"\nConcurrency {level['concurrency']}: "
+                  f"{level['completed']}/{level['podcasts']} completed in {level['wall_seconds']:.1f}s")
+            print(f"  Throughput: {level['podcasts_per_hour']:.0f} podcasts/hour")
+            print(f"  Peak RSS:   {level['peak_rss_mb']:.0f} MB (audio pool workers are separate processes)")
+            usage = level["llm_usage"]
+            input_tokens = (usage["input_tokens"] + usage["cache_creation_input_tokens"]
+                            + usage["cache_read_input_tokens"])
+            cached = usage["cache_read_input_tokens"] / input_tokens if input_tokens else 0.0
+            print(f"  LLM input:  {usage['input_tokens']} uncached, "
+                  f"{usage['cache_creation_input_tokens']} cache write, "
+                  f"{usage['cache_read_input_tokens']} cache read tokens ({cached:.0%} read from cache)")
+            pool = level["audio_pool"]
+            print(f"  Audio pool: {pool['workers']} workers, peak queue {pool['peak_queued']}, "
+                  f"avg wait {pool['avg_queue_wait_ms']:.0f} ms, avg job {pool['avg_run_ms']:.0f} ms")
+            for stage, latency in level["stages"].items():
+                print(f"  {stage:<10} p50 {latency['p50'] * 1000:8.0f} ms   p95 {latency['p95'] * 1000:8.0f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the podcast pipeline against mock providers")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--podcasts", type=int, default=8, help="podcasts per concurrency level")
+    parser.add_argument("--duration", default="5-10", choices=["5-10", "10-15", "15-20"])
+    parser.add_argument("--documents", type=int, default=3)
+    parser.add_argument("--document-sentences", type=int, default=400)
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--llm-ms-per-token", type=float, default=2.0)
+    parser.add_argument("--llm-ms-per-input-token", type=float, default=0.05,
+                        help="prompt processing time per input token not read from the cache")
+    parser.add_argument("--no-prompt-cache", action="store_true", help="send prompts without cache breakpoints")
+    parser.add_argument("--batch", action="store_true",
+                        help="run each level's podcasts as one batch of variants sharing upstream stages")
+    parser.add_argument("--tts-latency-ms", type=float, default=150.0)
+    parser.add_argument("--tts-ms-per-char", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    print("🚀 VOXY PIPELINE BENCHMARK")
+    print("=" * 60)
+
+    mocks = MockProviderServer(
+        anthropic=MockBehaviour(args.llm_latency_ms, args.llm_latency_ms * 0.1, args.llm_ms_per_token,
+                                args.error_rate, seed=args.seed,
+                                per_input_unit_ms=args.llm_ms_per_input_token),
+        elevenlabs=MockBehaviour(args.tts_latency_ms, args.tts_latency_ms * 0.1, args.tts_ms_per_char,
+                                 args.error_rate, seed=args.seed + 1),
+    )
+
+    with tempfile.TemporaryDirectory() as work_dir, mocks:
+        configure_environment(work_dir, mocks.url, prompt_caching=not args.no_prompt_cache)
+        runner = VoxyBenchmarkRunner(args)
+        await runner.setup()
+
+        levels = []
+        try:
+            for concurrency in args.concurrency:
+                print(f"⏳ Running {args.podcasts} podcasts at concurrency {concurrency}...")
+                levels.append(await runner.run_level(concurrency))
+        finally:
+            await runner.cleanup()
+
+        runner.print_report(levels)
+        print(f"\nMock provider requests: anthropic {mocks.anthropic.requests} "
+              f"({mocks.anthropic.errors} injected errors), "
+              f"elevenlabs {mocks.elevenlabs.requests} ({mocks.elevenlabs.errors} injected errors)")
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"arguments": vars(args), "levels": levels}, f, indent=2)
+            print(f"📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN-backed benchmark of the API's hot queries.
+
+Seeds a scratch schema in the PostgreSQL database at DATABASE_URL with
+users, projects, documents, chunks, generations and citations, then runs
+EXPLAIN (ANALYZE, BUFFERS) on each hot query twice: as migrated, and with
+the indexes it relies on dropped inside a transaction that is rolled back.
+Reports each plan's shape, median execution time and buffers touched. The
+scratch schema is dropped afterwards; nothing else in the database is
+touched. Requires PostgreSQL 13+ with pgvector installed (the migrations
+create the extension).
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import uuid
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / "backend"))
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+
+def hot_queries(ids):
+    """(name, statement, indexes it relies on) for each query the API runs per request"""
+    from app.models import AudioGeneration, Citation, Document, DocumentChunk, Persona, Project
+    from app.pagination import encode_cursor, keyset_page
+
+    deep_cursor = encode_cursor(ids["deep_created_at"], uuid.UUID(int=0))
+    project_activity = func.coalesce(Project.updated_at, Project.created_at)
+    projects = select(Project.id, Project.name, project_activity.label("sort_key")).where(
+        Project.owner_id == ids["user_id"]
+    )
+    documents = select(Document.id, Document.filename, Document.created_at).where(
+        Document.project_id == ids["project_id"]
+    )
+    generations = select(AudioGeneration.id, AudioGeneration.status, AudioGeneration.created_at).where(
+        AudioGeneration.owner_id == ids["user_id"]
+    )
+    project_generations = generations.where(AudioGeneration.project_id == ids["project_id"])
+    latest_start = (
+        select(func.max(Citation.timestamp))
+        .where(Citation.generation_id == ids["generation_id"], Citation.timestamp <= 120.0)
+        .scalar_subquery()
+    )
+
+    return [
+        ("projects: first page",
+         keyset_page(projects, project_activity, Project.id, None, 50),
+         ["ix_projects_owner_activity"]),
+        ("documents: first page",
+         keyset_page(documents, Document.created_at, Document.id, None, 50),
+         ["ix_documents_project_created"]),
+        ("documents: deep page",
+         keyset_page(documents, Document.created_at, Document.id, deep_cursor, 50),
+         ["ix_documents_project_created"]),
+        ("generations: first page",
+         keyset_page(project_generations, AudioGeneration.created_at, AudioGeneration.id, None, 50),
+         ["ix_audio_generations_project_created"]),
+        ("generations: first page, all projects",
+         keyset_page(generations, AudioGeneration.created_at, AudioGeneration.id, None, 50),
+         ["ix_audio_generations_owner_created"]),
+        ("generations: one batch",
+         keyset_page(generations.where(AudioGeneration.batch_id == ids["batch_id"]),
+                     AudioGeneration.created_at, AudioGeneration.id, None, 50),
+         ["ix_audio_generations_batch_id"]),
+        ("context selection chunks",
+         select(DocumentChunk.id, DocumentChunk.embedding).join(Document)
+         .where(Document.project_id == ids["project_id"], Document.status == "ready")
+         .order_by(DocumentChunk.document_id, DocumentChunk.chunk_index),
+         ["ix_document_chunks_document_chunk", "ix_documents_project_created"]),
+        ("citation at playback position",
+         select(Citation).where(Citation.generation_id == ids["generation_id"], Citation.timestamp == latest_start),
+         ["ix_citations_generation_timestamp"]),
+        ("citations of a document",
+         select(Citation.id).where(Citation.document_id == ids["document_id"]),
+         ["ix_citations_document_id"]),
+        ("reusable generation by fingerprint",
+         select(AudioGeneration.id).where(
+             AudioGeneration.fingerprint == ids["fingerprint"],
+             AudioGeneration.status.in_(["queued", "processing", "completed"])
+         ).order_by(AudioGeneration.created_at.desc()).limit(1),
+         ["ix_audio_generations_fingerprint"]),
+        ("custom personas",
+         select(Persona).where(Persona.is_custom == True, Persona.user_id == ids["user_id"]),
+         ["ix_personas_user_id"]),
+    ]
+
+
+SEED = [
+    """INSERT INTO users (id, email, name, hashed_password, is_active, created_at)
+       SELECT gen_random_uuid(), 'bench-' || g || '@example.com', 'Bench', '-', true, now()
+       FROM generate_series(1, :users) g""",
+    """INSERT INTO projects (id, name, owner_id, created_at, updated_at)
+       SELECT gen_random_uuid(), 'Project', u.id, now() - random() * interval '365 days',
+              CASE WHEN random() < 0.5 THEN now() - random() * interval '30 days' END
+       FROM users u, generate_series(1, :projects) g""",
+    """INSERT INTO documents (id, project_id, filename, original_filename, file_type, file_size,
+                              content, content_hash, status, upload_progress, created_at)
+       SELECT gen_random_uuid(), p.id, 'doc.txt', 'doc.txt', 'text/plain', 1500,
+              convert_to(repeat('document text ', 100), 'UTF8'), md5(random()::text), 'ready', 100,
+              now() - random() * interval '365 days'
+       FROM projects p, generate_series(1, :documents) g""",
+    """INSERT INTO document_chunks (id, document_id, content, chunk_index)
+       SELECT gen_random_uuid(), d.id, repeat('chunk text ', 40), g
+       FROM documents d, generate_series(0, :chunks - 1) g""",
+    """INSERT INTO audio_generations (id, project_id, owner_id, batch_id, status, progress, current_step, settings,
+                                      fingerprint, created_at)
+       SELECT gen_random_uuid(), p.id, p.owner_id, CASE WHEN g <= 3 THEN md5(p.id::text)::uuid END,
+              'completed', 100, 'Done', '{}'::json,
+              md5(random()::text) || md5(random()::text), now() - random() * interval '365 days'
+       FROM projects p, generate_series(1, :generations) g""",
+    """INSERT INTO citations (id, generation_id, document_id, timestamp, end_timestamp, text, source_text)
+       SELECT gen_random_uuid(), a.id, d.id, g * 15.0, g * 15.0 + 14.0, 'Cited line', 'Source text'
+       FROM audio_generations a
+       CROSS JOIN LATERAL (SELECT id FROM documents WHERE project_id = a.project_id LIMIT 1) d
+       CROSS JOIN generate_series(0, :citations - 1) g""",
+    """INSERT INTO personas (id, name, role, voice_id, personality, speaking_style, avatar, is_custom, user_id)
+       SELECT gen_random_uuid(), 'Persona', 'Host', 'voice', 'Calm', 'Clear', 'a.png', true, u.id
+       FROM users u, generate_series(1, 3) g""",
+]
+
+
+def plan_shape(node) -> str:
+    """Node types of a JSON plan, outermost first, with the index each scan used"""
+    label = node["Node Type"]
+    if node.get("Index Name"):
+        label += f" ({node['Index Name']})"
+    children = [plan_shape(child) for child in node.get("Plans", [])]
+    return label + (" > " + " + ".join(children) if children else "")
+
+
+async def explain(connection, statement, runs: int) -> dict:
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    sql = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + str(compiled)
+    timings = []
+    for _ in range(runs):
+        result = await connection.exec_driver_sql(sql, params)
+        report = result.scalar()
+        report = json.loads(report) if isinstance(report, str) else report
+        timings.append(report[0]["Execution Time"])
+    plan = report[0]["Plan"]
+    return {
+        "plan": plan_shape(plan),
+        "execution_ms": statistics.median(timings),
+        "buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN the API's hot queries with and without their indexes")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--projects", type=int, default=10, help="per user")
+    parser.add_argument("--documents", type=int, default=20, help="per project")
+    parser.add_argument("--chunks", type=int, default=20, help="per document")
+    parser.add_argument("--generations", type=int, default=10, help="per project")
+    parser.add_argument("--citations", type=int, default=40, help="per generation")
+    parser.add_argument("--runs", type=int, default=5, help="EXPLAIN ANALYZE runs per query; the median is reported")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.database import Base
+    from app import models  # noqa: F401
+
+    schema = f"voxy_query_bench_{uuid.uuid4().hex[:8]}"
+    engine = create_async_engine(settings.database_url)
+
+    print("🚀 VOXY QUERY BENCHMARK")
+    print("=" * 60)
+    results = []
+    async with engine.connect() as connection:
+        try:
+            await connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            await connection.execute(text(f"CREATE SCHEMA {schema}"))
+            await connection.execute(text(f"SET search_path TO {schema}, public"))
+            await connection.commit()
+
+            # The models declare the same indexes as the migrations. Without
+            # checkfirst, tables a migrated public schema already has (and
+            # that search_path would show) are still created in the scratch one.
+            await connection.run_sync(Base.metadata.create_all, checkfirst=False)
+            print(f"⏳ Seeding {schema}...")
+            sizes = {key: getattr(args, key) for key in
+                     ("users", "projects", "documents", "chunks", "generations", "citations")}
+            for statement in SEED:
+                await connection.execute(text(statement).bindparams(
+                    **{key: value for key, value in sizes.items() if f":{key}" in statement}
+                ))
+            await connection.commit()
+            for table in Base.metadata.sorted_tables:
+                await connection.execute(text(f"ANALYZE {table.name}"))
+            await connection.commit()
+
+            row = (await connection.execute(text(
+                """SELECT p.owner_id, p.id, a.id, a.fingerprint, a.batch_id, d.id
+                   FROM audio_generations a JOIN projects p ON p.id = a.project_id
+                   JOIN documents d ON d.project_id = p.id
+                   WHERE a.batch_id IS NOT NULL LIMIT 1"""
+            ))).one()
+            ids = dict(zip(("user_id", "project_id", "generation_id", "fingerprint", "batch_id", "document_id"), row))
+            # The last page of the project's documents, to show seeking costs no more than the first
+            ids["deep_created_at"] = (await connection.execute(text(
+                "SELECT created_at FROM documents WHERE project_id = :p ORDER BY created_at OFFSET 2 LIMIT 1"
+            ), {"p": ids["project_id"]})).scalar()
+            await connection.commit()
+
+            for name, statement, indexes in hot_queries(ids):
+                indexed = await explain(connection, statement, args.runs)
+                await connection.commit()
+                for index in indexes:
+                    await connection.execute(text(f"DROP INDEX {index}"))
+                unindexed = await explain(connection, statement, args.runs)
+                await connection.rollback()
+                results.append({"query": name, "indexes": indexes, "indexed": indexed, "unindexed": unindexed})
+        finally:
+            await connection.rollback()
+            await connection.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+            await connection.commit()
+    await engine.dispose()
+
+    print("\n" + "=" * 60)
+    print("📊 QUERY BENCHMARK REPORT")
+    print("=" * 60)
+    for result in results:
+        indexed, unindexed = result["indexed"], result["unindexed"]
+        speedup = unindexed["execution_ms"] / indexed["execution_ms"] if indexed["execution_ms"] else 0.0
+        print(f"\n{result['query']} ({speedup:.0f}x faster with {', '.join(result['indexes'])})")
+        print(f"  indexed    {indexed['execution_ms']:9.2f} ms {indexed['buffers']:7d} buffers   {indexed['plan']}")
+        print(f"  unindexed  {unindexed['execution_ms']:9.2f} ms {unindexed['buffers']:7d} buffers   {unindexed['plan']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"arguments": vars(args), "queries": results}, f, indent=2, default=str)
+        print(f"📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
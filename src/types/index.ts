@@ -35,7 +35,7 @@ export interface GenerationSettings {
 export interface AudioGeneration {
   id: string;
   projectId: string;
-  status: 'queued' | 'processing' | 'completed' | 'failed';
+  status: 'queued' | 'processing' | 'completed' | 'failed' | 'cancelled';
   progress: number;
   currentStep: string;
   estimatedTime?: number;